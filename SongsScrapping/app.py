@@ -1,43 +1,136 @@
 import os
-import json
-import re
 import time
 import logging
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, abort, Response
+from datetime import datetime
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, abort, Response, stream_with_context, send_file
+from flask.json.provider import DefaultJSONProvider
 import simplified_scraper as scraper
+from song_repository import repository
+from scrape_jobs import job_manager, DEFAULT_MAX_SONGS, MAX_SONGS_PER_JOB, REFRESH_INTERVAL
+from song_refresh import REFRESH_MIN_AGE
+from song_export import EXPORT_FORMATS
+from response_cache import ResponseCache
+from history_index import HISTORY_DAYS_PER_PAGE
+from crawl_frontier import DEFAULT_CRAWL_DEPTH, MAX_CRAWL_DEPTH
+from chords import sheet_fields, chord_lines, chord_segments
+import metrics
+from metrics import json_duration
+import profiler
+import json_codec
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+class SongJSONProvider(DefaultJSONProvider):
+    """
+    Encodes responses and decodes request bodies with json_codec (orjson when
+    installed), which serializes the repository's models.Song records like
+    the dicts they stand for. Responses are built from the encoded bytes
+    directly and keep Flask's sorted keys and debug-mode indentation.
+    """
+    def dumps(self, obj, **kwargs):
+        with json_duration.time('dump', 'response'):
+            return json_codec.dumps(obj, indent=bool(kwargs.get('indent')),
+                                    sort_keys=kwargs.get('sort_keys', self.sort_keys))
+
+    def loads(self, s, **kwargs):
+        with json_duration.time('load', 'request'):
+            return json_codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        with json_duration.time('dump', 'response'):
+            body = json_codec.dumps_bytes(obj, indent=indent, sort_keys=self.sort_keys)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
 # Create Flask app
 app = Flask(__name__)
+app.json = SongJSONProvider(app)
+app.add_template_filter(chord_segments)
 app.secret_key = os.environ.get("SESSION_SECRET", "songsofpraise_secret_key")
 
 # Ensure data directory exists
 os.makedirs('data', exist_ok=True)
 
+# Rendered pages and JSON responses, invalidated whenever the catalog changes
+response_cache = ResponseCache(repository.version)
+
+# Request and template timings, plus the cache's counters, served at /metrics
+metrics.init_app(app)
+metrics.registry.add_collector(response_cache.collect_metrics)
+
+# Admins can profile single requests (X-Profile header or ?profile=)
+profiler.init_app(app)
+
+# Periodically re-check known songs for changes on the site
+if REFRESH_INTERVAL > 0:
+    job_manager.schedule_refresh(REFRESH_INTERVAL)
+
+# Fields a client may request with ?fields=
+SONG_FIELDS = ('id', 'url', 'title', 'content', 'content_html', 'lyrics', 'chords', 'categories', 'timestamp')
+MAX_PAGE_SIZE = 1000
+
+# Fields of each song listed in duplicate clusters
+DUPLICATE_FIELDS = ('id', 'url', 'title', 'categories', 'timestamp')
+
+def parse_listing_args():
+    """
+    Read ?after_id=, ?limit= and ?fields= from the request.
+    Returns (after_id, limit, fields); raises ValueError on bad input.
+    """
+    after_id = request.args.get('after_id', type=int)
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    
+    fields = None
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in SONG_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(SONG_FIELDS)}")
+    return after_id, limit, fields
+
+def project(songs, fields):
+    """Keep only the requested fields of each song"""
+    if fields is None:
+        return songs
+    return [{field: song[field] for field in fields if field in song} for song in songs]
+
+def parse_date_arg(name):
+    """A YYYY-MM-DD query argument, or None if missing or malformed"""
+    value = request.args.get(name, '').strip()
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+def duplicate_entries(scored_songs):
+    """Songs of a duplicate cluster or lookup, with their similarity scores"""
+    return [dict({field: song[field] for field in DUPLICATE_FIELDS if field in song}, similarity=round(score, 3))
+            for song, score in scored_songs]
+
+def listing_response(songs, fields, limit):
+    """JSON array of songs; a full page carries the cursor for the next one"""
+    response = jsonify(project(songs, fields))
+    if limit is not None and len(songs) == limit:
+        next_args = request.args.to_dict()
+        next_args['after_id'] = songs[-1]['id']
+        response.headers['X-Next-After-Id'] = str(songs[-1]['id'])
+        response.headers['Link'] = f'<{url_for(request.endpoint, **next_args)}>; rel="next"'
+    return response
+
 # Routes
 @app.route('/')
+@response_cache.cached
 def index():
     """Homepage with categories and recently scraped songs"""
     try:
-        # Load categories if they exist
-        if os.path.exists('data/categories.json'):
-            with open('data/categories.json', 'r', encoding='utf-8') as f:
-                categories = json.load(f)
-        else:
-            categories = []
-        
-        # Load songs if they exist
-        if os.path.exists('data/songs.json'):
-            with open('data/songs.json', 'r', encoding='utf-8') as f:
-                songs = json.load(f)
-                # Sort by most recently added
-                songs.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
-                recent_songs = songs[:10]  # Show only the 10 most recent songs
-        else:
-            recent_songs = []
+        categories = repository.categories()
+        recent_songs = repository.recent(10)  # Show only the 10 most recent songs
             
         return render_template('index.html', categories=categories, recent_songs=recent_songs)
     except Exception as e:
@@ -46,6 +139,7 @@ def index():
         return render_template('index.html', categories=[], recent_songs=[])
 
 @app.route('/search')
+@response_cache.cached
 def search():
     """Search songs by title or content"""
     query = request.args.get('q', '').strip().lower()
@@ -54,15 +148,9 @@ def search():
         return render_template('search.html', songs=[], query='')
     
     try:
-        if os.path.exists('data/songs.json'):
-            with open('data/songs.json', 'r', encoding='utf-8') as f:
-                songs = json.load(f)
-                
-            # Filter songs based on search query
-            results = [song for song in songs if 
-                      query in song.get('title', '').lower() or 
-                      query in song.get('content', '').lower() or
-                      query in song.get('lyrics', '').lower()]
+        if repository.exists():
+            # Ranked full-text search over title, content and lyrics
+            results = repository.search(query)
             
             return render_template('search.html', songs=results, query=query)
         else:
@@ -74,50 +162,26 @@ def search():
         return render_template('search.html', songs=[], query=query)
 
 @app.route('/song/<int:song_id>')
+@response_cache.cached
 def view_song(song_id):
     """View a specific song"""
     try:
-        if os.path.exists('data/songs.json'):
-            with open('data/songs.json', 'r', encoding='utf-8') as f:
-                songs = json.load(f)
-            
+        if repository.exists():
             # Find the song with the given ID
-            song = next((s for s in songs if s.get('id') == song_id), None)
+            song = repository.get(song_id)
             
             if song:
                 # Find next and previous songs based on ID
-                sorted_songs = sorted(songs, key=lambda x: x.get('id', 0))
-                
-                # Find current index in sorted list
-                current_index = None
-                for i, s in enumerate(sorted_songs):
-                    if s.get('id') == song_id:
-                        current_index = i
-                        break
-                
-                next_song = None
-                prev_song = None
+                prev_song, next_song = repository.neighbors(song_id)
                 
-                if current_index is not None:
-                    if current_index < len(sorted_songs) - 1:  # Not the last song
-                        next_song = sorted_songs[current_index + 1]
-                    if current_index > 0:  # Not the first song
-                        prev_song = sorted_songs[current_index - 1]
-                
-                # Find related songs in the same category
-                related_songs = []
-                if song.get('categories'):
-                    for s in songs:
-                        if s.get('id') != song_id and s.get('categories'):  # Skip current song
-                            if any(cat in song.get('categories', []) for cat in s.get('categories', [])):
-                                related_songs.append(s)
-                    
-                    # Limit to 5 related songs and sort by title
-                    related_songs = sorted(related_songs[:5], key=lambda x: x.get('title', '').lower())
+                # Best related songs by shared categories and lyrics, from the
+                # repository's precomputed index
+                related_songs = repository.related(song_id)
                 
                 return render_template(
                     'song.html', 
                     song=song,
+                    lines=chord_lines(song),
                     next_song=next_song,
                     prev_song=prev_song,
                     related_songs=related_songs
@@ -134,15 +198,13 @@ def view_song(song_id):
         return redirect(url_for('index'))
 
 @app.route('/category/<category_name>')
+@response_cache.cached
 def view_category(category_name):
     """View songs in a specific category"""
     try:
-        if os.path.exists('data/songs.json'):
-            with open('data/songs.json', 'r', encoding='utf-8') as f:
-                songs = json.load(f)
-            
+        if repository.exists():
             # Filter songs by category
-            category_songs = [s for s in songs if category_name.lower() in [c.lower() for c in s.get('categories', [])]]
+            category_songs = repository.by_category(category_name)
             
             return render_template('search.html', songs=category_songs, 
                                   query='', category=category_name)
@@ -156,15 +218,13 @@ def view_category(category_name):
 
 # API routes
 @app.route('/results')
+@response_cache.cached
 def results():
     """Show results of the most recent scraping operation"""
     try:
-        if os.path.exists('data/songs.json'):
-            with open('data/songs.json', 'r', encoding='utf-8') as f:
-                songs = json.load(f)
-                
+        if repository.exists():
             # Sort by most recently added
-            songs.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
+            songs = repository.recent()
             return render_template('results.html', songs=songs)
         else:
             flash("No songs data available. Please scrape songs first.", "warning")
@@ -175,39 +235,26 @@ def results():
         return redirect(url_for('index'))
 
 @app.route('/history')
+@response_cache.cached
 def history():
-    """Show history of scraping sessions"""
+    """
+    Show history of scraping sessions, one day per session, paginated
+    (?page=) and optionally limited to a date range (?start=&end=, YYYY-MM-DD)
+    """
     try:
-        if os.path.exists('data/songs.json'):
-            with open('data/songs.json', 'r', encoding='utf-8') as f:
-                songs = json.load(f)
-            
-            # Group songs by timestamp (day)
-            from datetime import datetime
-            history_data = {}
+        if repository.exists():
+            page = max(1, request.args.get('page', 1, type=int))
+            start_date = parse_date_arg('start')
+            end_date = parse_date_arg('end')
             
-            for song in songs:
-                timestamp = song.get('timestamp', 0)
-                if timestamp == 0:
-                    continue
-                    
-                # Convert timestamp to date string
-                date_str = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
-                
-                if date_str not in history_data:
-                    history_data[date_str] = []
-                    
-                history_data[date_str].append(song)
-            
-            # Format the data for the template
-            history_sessions = []
-            for date, session_songs in sorted(history_data.items(), reverse=True):
-                history_sessions.append({
-                    'date': date,
-                    'songs': sorted(session_songs, key=lambda x: x.get('title', '').lower())
-                })
+            # Days come from the repository's daily history buckets
+            history_sessions, total_days = repository.history(
+                start_date, end_date, (page - 1) * HISTORY_DAYS_PER_PAGE, HISTORY_DAYS_PER_PAGE)
+            total_pages = max(1, -(-total_days // HISTORY_DAYS_PER_PAGE))
             
-            return render_template('history.html', history=history_sessions)
+            return render_template('history.html', history=history_sessions, page=page,
+                                   total_pages=total_pages, total_days=total_days,
+                                   start=start_date or '', end=end_date or '')
         else:
             flash("No history data available. Please scrape songs first.", "warning")
             return redirect(url_for('index'))
@@ -236,25 +283,54 @@ def api_scrape():
         # Check if we should follow index links
         follow_links = data.get('follow_links', False)
 
-        # Set a reasonable limit for songs to prevent timeout issues
-        max_songs = 10  # Limit to 10 songs per scrape to avoid timeouts
+        # Number of song pages to fetch in parallel
+        try:
+            concurrency = int(data.get('concurrency', scraper.DEFAULT_CONCURRENCY))
+        except (TypeError, ValueError):
+            concurrency = scraper.DEFAULT_CONCURRENCY
+
+        # Number of new songs to scrape in this job
+        try:
+            max_songs = int(data.get('max_songs', DEFAULT_MAX_SONGS))
+        except (TypeError, ValueError):
+            max_songs = DEFAULT_MAX_SONGS
+        max_songs = max(1, min(max_songs, MAX_SONGS_PER_JOB))
         
-        # Start scraping with timeout protection
-        result = scraper.scrape_site(url, max_songs, follow_links)
+        # Crawl the whole site through the resumable crawl frontier
+        full_site = bool(data.get('full_site', False))
+        try:
+            max_depth = int(data.get('max_depth', DEFAULT_CRAWL_DEPTH))
+        except (TypeError, ValueError):
+            max_depth = DEFAULT_CRAWL_DEPTH
+        max_depth = max(0, min(max_depth, MAX_CRAWL_DEPTH))
         
-        if result['success']:
-            return jsonify({
-                'success': True,
-                'message': f"Scraped {result['songs_count']} songs from {result['categories_count']} categories",
-                'songs_count': result['songs_count'],
-                'categories_count': result['categories_count'],
-                'redirect_url': url_for('results')  # Add redirect URL to results page
-            })
-        else:
+        # Re-check known songs (oldest checked first) instead of scraping new ones
+        refresh = bool(data.get('refresh', False))
+        try:
+            min_age = float(data.get('min_age_days', REFRESH_MIN_AGE / 86400)) * 86400
+        except (TypeError, ValueError):
+            min_age = REFRESH_MIN_AGE
+        min_age = max(0.0, min_age)
+        
+        # Profile the crawl into data/profiles/ (admins only)
+        profile = bool(data.get('profile', False))
+        if profile and not profiler.is_admin(request.headers.get('X-Admin-Token')):
             return jsonify({
                 'success': False,
-                'message': result['message']
-            }), 400
+                'message': "Profiling requires a valid X-Admin-Token header."
+            }), 403
+        
+        # Run the scrape in the background and let the client poll for progress
+        job = job_manager.submit(url, max_songs, follow_links, concurrency, full_site, max_depth, profile,
+                                 refresh, min_age)
+        
+        return jsonify({
+            'success': True,
+            'message': "Scrape started",
+            'job_id': job.id,
+            'status_url': url_for('api_scrape_status', job_id=job.id),
+            'cancel_url': url_for('api_scrape_cancel', job_id=job.id)
+        }), 202
     except Exception as e:
         logger.error(f"API scrape error: {str(e)}")
         return jsonify({
@@ -262,14 +338,60 @@ def api_scrape():
             'message': f"An error occurred during scraping. Please try a more specific URL."
         }), 500
 
+@app.route('/api/scrape/<job_id>', methods=['GET'])
+def api_scrape_status(job_id):
+    """API endpoint to report the progress of a scrape job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': f"Scrape job {job_id} not found"
+        }), 404
+    
+    status = job.to_dict()
+    status['success'] = True
+    if job.finished:
+        status['redirect_url'] = url_for('results')
+    return jsonify(status)
+
+@app.route('/api/scrape/<job_id>/cancel', methods=['POST'])
+def api_scrape_cancel(job_id):
+    """API endpoint to cancel a queued or running scrape job"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': f"Scrape job {job_id} not found"
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'message': "Cancellation requested" if not job.finished else f"Job already {job.status}",
+        'status': job.status
+    })
+
 @app.route('/api/songs', methods=['GET'])
+@response_cache.cached
 def api_songs():
-    """API endpoint to get all songs"""
+    """
+    API endpoint to get songs, optionally paginated by id
+    (?after_id=&limit=) and trimmed to selected fields (?fields=id,title)
+    """
     try:
-        if os.path.exists('data/songs.json'):
-            with open('data/songs.json', 'r', encoding='utf-8') as f:
-                songs = json.load(f)
-            return jsonify(songs)
+        after_id, limit, fields = parse_listing_args()
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    
+    try:
+        if repository.exists():
+            if after_id is None and limit is None:
+                songs = repository.all()
+            else:
+                songs = repository.page(after_id, limit)
+            return listing_response(songs, fields, limit)
         else:
             return jsonify([])
     except Exception as e:
@@ -280,15 +402,11 @@ def api_songs():
         }), 500
 
 @app.route('/api/categories', methods=['GET'])
+@response_cache.cached
 def api_categories():
     """API endpoint to get all categories"""
     try:
-        if os.path.exists('data/categories.json'):
-            with open('data/categories.json', 'r', encoding='utf-8') as f:
-                categories = json.load(f)
-            return jsonify(categories)
-        else:
-            return jsonify([])
+        return jsonify(repository.categories())
     except Exception as e:
         logger.error(f"API get categories error: {str(e)}")
         return jsonify({
@@ -297,62 +415,55 @@ def api_categories():
         }), 500
 
 @app.route('/api/songs/<int:song_id>', methods=['GET', 'PUT'])
+@response_cache.cached
 def api_get_song(song_id):
     """API endpoint to get or update a specific song"""
     try:
-        if not os.path.exists('data/songs.json'):
+        if not repository.exists():
             return jsonify({
                 'success': False,
                 'message': "No songs data available"
             }), 404
             
-        with open('data/songs.json', 'r', encoding='utf-8') as f:
-            songs = json.load(f)
-        
-        # Find the song and its index
-        song_index = None
-        for i, song in enumerate(songs):
-            if song.get('id') == song_id:
-                song_index = i
-                break
+        song = repository.get(song_id)
                 
-        if song_index is None:
+        if song is None:
             return jsonify({
                 'success': False,
                 'message': f"Song with ID {song_id} not found"
             }), 404
         
-        # GET request - return the song
+        # GET request - return the song with its chord/lyric line pairs
         if request.method == 'GET':
-            return jsonify(songs[song_index])
+            return jsonify(dict(song, lines=chord_lines(song)))
         
         # PUT request - update the song
         if request.method == 'PUT':
             data = request.get_json(silent=True) or {}
+            updates = {}
             
             # Update song fields
             if 'title' in data and data['title']:
-                songs[song_index]['title'] = data['title']
+                updates['title'] = data['title']
                 
             if 'content' in data and data['content']:
-                songs[song_index]['content'] = data['content']
-                # Update lyrics by removing chords (simple approach)
-                songs[song_index]['lyrics'] = re.sub(r'\b([A-G][#b]?(?:maj|min|m|sus|aug|dim|add)?(?:\d+)?(?:\/[A-G][#b]?)?)\b', '', data['content'])
+                updates['content'] = data['content']
+                # Lyrics and chords are parsed once here and stored with the song
+                updates.update(sheet_fields(data['content']))
                 
             if 'categories' in data:
-                songs[song_index]['categories'] = data['categories']
+                updates['categories'] = data['categories']
             
             # Update timestamp
-            songs[song_index]['timestamp'] = int(time.time())
+            updates['timestamp'] = int(time.time())
             
             # Save updated songs
-            with open('data/songs.json', 'w', encoding='utf-8') as f:
-                json.dump(songs, f, indent=2)
+            song = repository.update_song(song_id, updates)
             
             return jsonify({
                 'success': True,
                 'message': 'Song updated successfully',
-                'song': songs[song_index]
+                'song': song
             })
             
     except Exception as e:
@@ -363,25 +474,38 @@ def api_get_song(song_id):
         }), 500
 
 @app.route('/api/search', methods=['GET'])
+@response_cache.cached
 def api_search():
-    """API endpoint to search for songs"""
+    """
+    API endpoint to search for songs. Supports the same ?after_id=, ?limit=
+    and ?fields= options as /api/songs; after_id continues the ranking after
+    that song.
+    """
     query = request.args.get('q', '').strip().lower()
     
     if not query:
         return jsonify([])
     
     try:
-        if os.path.exists('data/songs.json'):
-            with open('data/songs.json', 'r', encoding='utf-8') as f:
-                songs = json.load(f)
-                
-            # Filter songs based on search query
-            results = [song for song in songs if 
-                      query in song.get('title', '').lower() or 
-                      query in song.get('content', '').lower() or
-                      query in song.get('lyrics', '').lower()]
+        after_id, limit, fields = parse_listing_args()
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    
+    try:
+        if repository.exists():
+            # Ranked full-text search over title, content and lyrics
+            if after_id is None:
+                results = repository.search(query, limit)
+            else:
+                results = repository.search(query)
+                ids = [song['id'] for song in results]
+                start = ids.index(after_id) + 1 if after_id in ids else len(ids)
+                results = results[start:start + limit] if limit is not None else results[start:]
             
-            return jsonify(results)
+            return listing_response(results, fields, limit)
         else:
             return jsonify([])
     except Exception as e:
@@ -391,36 +515,164 @@ def api_search():
             'message': f"An error occurred: {str(e)}"
         }), 500
 
+@app.route('/api/duplicates', methods=['GET'])
+@response_cache.cached
+def api_duplicates():
+    """
+    API endpoint listing clusters of near-duplicate songs (the same lyrics
+    under several URLs), largest first, paginated with ?offset=&limit=
+    """
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = max(1, min(request.args.get('limit', 100, type=int), MAX_PAGE_SIZE))
+    
+    try:
+        clusters = repository.duplicate_clusters() if repository.exists() else []
+        return jsonify({
+            'total': len(clusters),
+            'offset': offset,
+            'clusters': [{'size': len(cluster), 'songs': duplicate_entries(cluster)}
+                         for cluster in clusters[offset:offset + limit]]
+        })
+    except Exception as e:
+        logger.error(f"API duplicates error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f"An error occurred: {str(e)}"
+        }), 500
+
+@app.route('/api/songs/<int:song_id>/duplicates', methods=['GET'])
+@response_cache.cached
+def api_song_duplicates(song_id):
+    """API endpoint listing the near-duplicates of a song, most similar first"""
+    try:
+        if not repository.exists() or repository.get(song_id) is None:
+            return jsonify({
+                'success': False,
+                'message': f"Song with ID {song_id} not found"
+            }), 404
+        return jsonify(duplicate_entries(repository.duplicates(song_id)))
+    except Exception as e:
+        logger.error(f"API song duplicates error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f"An error occurred: {str(e)}"
+        }), 500
+
+@app.route('/api/duplicates/merge', methods=['POST'])
+def api_merge_duplicates():
+    """
+    API endpoint merging duplicate songs into one: {"song_ids": [...]} and
+    optionally "keep_id" (default: the lowest id). The kept song gains the
+    others' categories and their URLs as aliases, so they aren't scraped
+    again, and the others are deleted.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        song_ids = [int(song_id) for song_id in data.get('song_ids') or []]
+        keep_id = int(data['keep_id']) if data.get('keep_id') is not None else (min(song_ids) if song_ids else None)
+    except (TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'message': "song_ids must be a list of song ids and keep_id a song id"
+        }), 400
+    
+    duplicate_ids = [song_id for song_id in dict.fromkeys(song_ids) if song_id != keep_id]
+    if keep_id is None or not duplicate_ids:
+        return jsonify({
+            'success': False,
+            'message': "Give at least two songs to merge"
+        }), 400
+    
+    try:
+        missing = [song_id for song_id in [keep_id] + duplicate_ids if repository.get(song_id) is None]
+        if missing:
+            return jsonify({
+                'success': False,
+                'message': f"Songs not found: {', '.join(map(str, missing))}"
+            }), 404
+        
+        song = repository.merge_songs(keep_id, duplicate_ids)
+        return jsonify({
+            'success': True,
+            'message': f"Merged {len(duplicate_ids)} songs into song {keep_id}",
+            'song': song
+        })
+    except Exception as e:
+        logger.error(f"API merge duplicates error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f"An error occurred: {str(e)}"
+        }), 500
+
+@app.route('/api/profiles', methods=['GET'])
+def api_profiles():
+    """API endpoint to list saved request and scrape profiles, newest first (admins only)"""
+    if not profiler.is_admin(request.headers.get('X-Admin-Token')):
+        return jsonify({
+            'success': False,
+            'message': "Listing profiles requires a valid X-Admin-Token header."
+        }), 403
+    
+    try:
+        profiles = profiler.list_profiles()
+        for profile in profiles:
+            profile['download_url'] = url_for('api_profile_file', file_name=profile['file'])
+        return jsonify({
+            'success': True,
+            'profiles': profiles
+        })
+    except Exception as e:
+        logger.error(f"API list profiles error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f"An error occurred: {str(e)}"
+        }), 500
+
+@app.route('/api/profiles/<file_name>', methods=['GET'])
+def api_profile_file(file_name):
+    """API endpoint to download a saved profile file (admins only)"""
+    if not profiler.is_admin(request.headers.get('X-Admin-Token')):
+        return jsonify({
+            'success': False,
+            'message': "Downloading profiles requires a valid X-Admin-Token header."
+        }), 403
+    
+    path = profiler.profile_path(file_name)
+    if path is None:
+        return jsonify({
+            'success': False,
+            'message': f"Profile {file_name} not found"
+        }), 404
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=file_name)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics for the web app and the scrapes running in it"""
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
 # Error handlers
 @app.route('/api/download-all', methods=['GET'])
 def api_download_all():
-    """API endpoint to download all songs as a text file"""
+    """API endpoint to download all songs, streamed as txt, jsonl, csv or zip"""
+    export_format = request.args.get('format', 'txt').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'message': f"Unsupported format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}"
+        }), 400
+    
     try:
-        if not os.path.exists('data/songs.json'):
+        if not repository.exists():
             return jsonify({
                 'success': False,
                 'message': "No songs data available"
             }), 404
-            
-        with open('data/songs.json', 'r', encoding='utf-8') as f:
-            songs = json.load(f)
         
-        # Create a text file with all songs
-        all_songs_text = ""
-        
-        for song in songs:
-            all_songs_text += f"Title: {song.get('title', 'Untitled')}\n"
-            all_songs_text += f"URL: {song.get('url', 'No URL')}\n"
-            
-            if song.get('categories'):
-                all_songs_text += f"Categories: {', '.join(song.get('categories', []))}\n"
-                
-            all_songs_text += "\n" + song.get('content', '') + "\n\n"
-            all_songs_text += "-" * 80 + "\n\n"
+        exporter, mimetype, filename = EXPORT_FORMATS[export_format]
         
-        # Return as a downloadable file
-        response = Response(all_songs_text, mimetype='text/plain')
-        response.headers["Content-Disposition"] = "attachment; filename=all_songs.txt"
+        # Stream the export chunk by chunk so memory use doesn't grow with the catalog
+        response = Response(stream_with_context(exporter(repository.iter_songs())), mimetype=mimetype)
+        response.headers["Content-Disposition"] = f"attachment; filename={filename}"
         return response
         
     except Exception as e:
@@ -0,0 +1,416 @@
+import time
+import asyncio
+import logging
+from typing import Dict, List, Any, Callable, Mapping, Optional, Tuple
+from urllib.parse import urlparse
+from song_repository import repository
+from http_cache import http_cache, HttpCache
+from fetcher import (shared_session, fetch_metrics, backoff_delay, retry_after_seconds, RETRY_STATUSES,
+                     RETRY_EXCEPTIONS, MAX_RETRIES, MAX_RETRY_AFTER, DEFAULT_TIMEOUT)
+from parse_pool import get_parse_pool, timed_parse
+from metrics import scrape_stage_duration, http_cache_lookups
+from simplified_scraper import (extract_links, song_from_download, save_new_songs, BASE_URL, USER_AGENT,
+                                REQUEST_DELAY, DEFAULT_CONCURRENCY, MAX_CONCURRENCY)
+
+try:
+    import aiohttp
+except ImportError:  # Optional: without it requests run in worker threads
+    aiohttp = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+REQUESTS_PER_SECOND = 1 / REQUEST_DELAY  # Average request rate to the site
+BURST = 4  # Requests that may go out back to back after an idle period
+SAVE_BATCH = 3  # Songs saved together, as in the blocking scraper
+
+REQUEST_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': 'text/html,application/xhtml+xml,application/xml',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket: `rate` requests per second on average, with bursts
+    of up to `capacity` requests. Waiting callers sleep instead of blocking
+    the event loop.
+    """
+    def __init__(self, rate: float, capacity: int = BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent"""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# Transports: async GET returning (status, headers, text)
+
+class ThreadTransport:
+    """Blocking GETs on the shared pooled requests session, run in worker threads"""
+    retry_errors = RETRY_EXCEPTIONS
+
+    def __init__(self, session=None):
+        self.session = session or shared_session
+
+    async def get(self, url: str, headers: Dict[str, str], timeout: float) -> Tuple[int, Mapping[str, str], str]:
+        response = await asyncio.to_thread(self.session.get, url, headers=headers, timeout=timeout)
+        return response.status_code, response.headers, response.text
+
+    async def close(self) -> None:
+        pass
+
+
+class AiohttpTransport:
+    """Non-blocking GETs with aiohttp, over one keep-alive connection pool per crawl"""
+    retry_errors = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) if aiohttp else ()
+
+    def __init__(self, limit: int = MAX_CONCURRENCY):
+        self.limit = limit
+        self._session = None
+
+    async def get(self, url: str, headers: Dict[str, str], timeout: float) -> Tuple[int, Mapping[str, str], str]:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.limit))
+        async with self._session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            return response.status, response.headers, await response.text()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def default_transport(concurrency: int):
+    return AiohttpTransport(concurrency) if aiohttp else ThreadTransport()
+
+
+class HostRewriteTransport:
+    """
+    Sends requests for songsofpraise.in to another origin, e.g. a local
+    stand-in server (benchmarks/stand_in_server.py). The crawl itself keeps
+    the real URLs, so the domain checks, link filters and stored song URLs
+    are the same as against the site.
+    """
+    def __init__(self, origin: str, transport: Any = None, base_url: str = BASE_URL):
+        self.origin = origin.rstrip('/') + '/'
+        self.base_url = base_url
+        self.transport = transport or ThreadTransport()
+        self.retry_errors = getattr(self.transport, 'retry_errors', ())
+
+    def rewrite(self, url: str) -> str:
+        if url.startswith(self.base_url):
+            return self.origin + url[len(self.base_url):]
+        return url
+
+    async def get(self, url: str, headers: Dict[str, str], timeout: float) -> Tuple[int, Mapping[str, str], str]:
+        return await self.transport.get(self.rewrite(url), headers, timeout)
+
+    async def close(self) -> None:
+        await self.transport.close()
+
+
+class AsyncCrawler:
+    """
+    Fetches pages on an asyncio event loop and parses them in a process pool.
+
+    At most `concurrency` requests are in flight and requests are paced by a
+    token bucket. Pages go through the on-disk HTTP cache with conditional
+    requests, and transient failures are retried with the same policy as
+    fetcher.Fetcher. HTML is parsed in the shared parse pool, so neither
+    parsing nor the blocking cache and repository calls (run in threads)
+    stall the loop.
+    """
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, rate: float = REQUESTS_PER_SECOND,
+                 burst: int = BURST, transport: Any = None, cache: Optional[HttpCache] = None):
+        self.concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+        self.bucket = TokenBucket(rate, burst)
+        self.transport = transport or default_transport(self.concurrency)
+        self.cache = cache or http_cache
+        self.in_flight = asyncio.Semaphore(self.concurrency)
+
+    async def close(self) -> None:
+        await self.transport.close()
+
+    # Parsing
+
+    async def parse(self, func: Callable, *args) -> Any:
+        """
+        Run a parsing function in the parse pool (in a thread when there is
+        a single core and no pool)
+        """
+        seconds, result = await asyncio.get_running_loop().run_in_executor(get_parse_pool(), timed_parse, func, *args)
+        scrape_stage_duration.observe(seconds, 'parse')
+        return result
+
+    # Fetching
+
+    async def fetch(self, url: str) -> Optional[str]:
+        """
+        Body of a page, or None on failure. Fresh cached pages are returned
+        without a request and a stale copy is used if the server fails.
+        """
+        with scrape_stage_duration.time('fetch'):
+            return await self._fetch(url)
+
+    async def _fetch(self, url: str) -> Optional[str]:
+        entry = await asyncio.to_thread(self.cache.get, url)
+        if entry is not None and self.cache.is_fresh(entry):
+            http_cache_lookups.inc('fresh')
+            return entry['body']
+
+        headers = dict(REQUEST_HEADERS)
+        if entry is not None:
+            headers.update(self.cache.conditional_headers(entry))
+
+        response = await self._get(url, headers)
+        if response is None:
+            http_cache_lookups.inc('stale' if entry is not None else 'failed')
+            return entry['body'] if entry is not None else None
+
+        status, response_headers, body = response
+        if status == 304 and entry is not None:
+            await asyncio.to_thread(self.cache.refresh, url, entry)
+            http_cache_lookups.inc('revalidated')
+            return entry['body']
+        if status >= 400:
+            logger.error(f"Error making request to {url}: HTTP {status}")
+            http_cache_lookups.inc('stale' if entry is not None else 'failed')
+            return entry['body'] if entry is not None else None
+
+        await asyncio.to_thread(self.cache.put, url, body, response_headers.get('ETag'),
+                                response_headers.get('Last-Modified'))
+        http_cache_lookups.inc('downloaded')
+        return body
+
+    async def _get(self, url: str, headers: Dict[str, str]) -> Optional[Tuple[int, Mapping[str, str], str]]:
+        """GET with retries; None if the request could not be made"""
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            await self.bucket.acquire()
+            try:
+                status, response_headers, body = await self.transport.get(url, headers, DEFAULT_TIMEOUT)
+            except getattr(self.transport, 'retry_errors', ()) as e:
+                if attempt > MAX_RETRIES:
+                    self._record(url, None, attempt, started, 0, str(e))
+                    logger.error(f"Error making request to {url}: {str(e)}")
+                    return None
+                delay = backoff_delay(attempt)
+                logger.warning(f"Request to {url} failed ({str(e)}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except Exception as e:
+                self._record(url, None, attempt, started, 0, str(e))
+                logger.error(f"Error making request to {url}: {str(e)}")
+                return None
+
+            if status not in RETRY_STATUSES or attempt > MAX_RETRIES:
+                break
+            delay = retry_after_seconds(response_headers)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            elif delay > MAX_RETRY_AFTER:
+                logger.warning(f"{url} asked to retry after {delay:.0f}s, giving up")
+                break
+            logger.warning(f"{url} returned {status}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+        self._record(url, status, attempt, started, len(body.encode('utf-8')))
+        return status, response_headers, body
+
+    @staticmethod
+    def _record(url: str, status: Optional[int], attempts: int, started: float, size: int,
+                error: Optional[str] = None) -> None:
+        fetch_metrics.record(url, status, attempts, time.monotonic() - started, size, error)
+
+    # Songs
+
+    async def song(self, url: str, song_id: int, job: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+        """Fetch and parse one song page; None if the job was cancelled before it started"""
+        async with self.in_flight:
+            # Pages not yet started when the job is cancelled are skipped
+            if job and job.is_cancelled():
+                return None
+            downloaded = await self.fetch(url)
+
+        if downloaded:
+            song_data = await self.parse(song_from_download, url, song_id, downloaded)
+        else:
+            song_data = song_from_download(url, song_id, downloaded)
+        if job:
+            job.record_fetch('error' not in song_data)
+        return song_data
+
+
+def new_song_links(links: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Song links not already stored (or merged into a stored song), without repeats"""
+    new_links = []
+    queued_urls = set()
+    for link in links:
+        if link['url'] not in queued_urls and not repository.has_url(link['url']):
+            queued_urls.add(link['url'])
+            new_links.append(link)
+    return new_links
+
+
+async def scrape_site_async(start_url: str = BASE_URL, max_songs: int = 10, follow_links: bool = False,
+                            concurrency: int = DEFAULT_CONCURRENCY, job: Optional[Any] = None,
+                            transport: Any = None) -> Dict[str, Any]:
+    """Coroutine behind scrape_site(), for callers that already run an event loop"""
+    logger.info(f"Starting async scrape from: {start_url}")
+
+    if "songsofpraise.in" not in start_url:
+        return {
+            'success': False,
+            'message': "URL must be from songsofpraise.in domain for safety reasons."
+        }
+
+    crawler = AsyncCrawler(concurrency, transport=transport)
+    try:
+        existing_categories = await asyncio.to_thread(lambda: list(repository.categories()))
+        existing_category_urls = {cat['url'] for cat in existing_categories}
+
+        html_content = await crawler.fetch(start_url)
+        if not html_content:
+            return {
+                'success': False,
+                'message': f"Failed to access the site: {start_url}"
+            }
+
+        extracted_links = await crawler.parse(extract_links, html_content, start_url)
+
+        # Add new categories
+        new_categories = []
+        for category in extracted_links['categories']:
+            if category['url'] not in existing_category_urls:
+                new_categories.append(category)
+                existing_categories.append(category)
+                existing_category_urls.add(category['url'])
+        if new_categories:
+            await asyncio.to_thread(save_new_songs, [], existing_categories)
+
+        if follow_links and extracted_links['index_links']:
+            logger.info(f"Found {len(extracted_links['index_links'])} songs in the index page. Following these links...")
+            candidates = extracted_links['index_links']
+        else:
+            candidates = extracted_links['songs']
+
+        songs_to_process = (await asyncio.to_thread(new_song_links, candidates))[:max_songs]
+
+        path = urlparse(start_url).path
+        if not songs_to_process and '/category/' not in path and path != '/':
+            # No new songs linked from the page: process it as a song page
+            next_id = await asyncio.to_thread(repository.reserve_ids, 1)
+            if job:
+                job.record_queued(1)
+            song_data = await crawler.song(start_url, next_id, job)
+            if song_data and 'error' not in song_data:
+                await asyncio.to_thread(save_new_songs, [song_data])
+                if job:
+                    job.record_saved(1)
+                return {
+                    'success': True,
+                    'songs_count': await asyncio.to_thread(repository.count),
+                    'categories_count': len(existing_categories),
+                    'message': f"Successfully scraped 1 song from {start_url}"
+                }
+            error = song_data.get('error', 'Unknown error') if song_data else 'Cancelled'
+            return {
+                'success': False,
+                'message': f"Failed to extract song content from {start_url}. Error: {error}"
+            }
+
+        # IDs are reserved up front so results keep the page order no matter
+        # which page finishes first
+        next_id = await asyncio.to_thread(repository.reserve_ids, len(songs_to_process))
+        if job:
+            job.record_queued(len(songs_to_process))
+        tasks = [asyncio.create_task(crawler.song(song['url'], next_id + i, job))
+                 for i, song in enumerate(songs_to_process)]
+
+        new_songs_count = 0
+        unsaved_songs: List[Dict[str, Any]] = []
+        for i, task in enumerate(tasks):
+            song_data = await task
+            if song_data is None:
+                continue
+            logger.info(f"Processed song {i+1}/{len(songs_to_process)}: {songs_to_process[i]['title']}")
+            unsaved_songs.append(song_data)
+            new_songs_count += 1
+
+            # Save periodically to avoid data loss
+            if len(unsaved_songs) >= SAVE_BATCH:
+                await asyncio.to_thread(save_new_songs, unsaved_songs)
+                if job:
+                    job.record_saved(len(unsaved_songs))
+                unsaved_songs = []
+
+        if unsaved_songs:
+            await asyncio.to_thread(save_new_songs, unsaved_songs)
+            if job:
+                job.record_saved(len(unsaved_songs))
+
+        if job and job.is_cancelled():
+            message = f"Scrape cancelled after {new_songs_count} new songs from {start_url}"
+        else:
+            message = f"Successfully scraped {new_songs_count} new songs from {start_url}"
+        return {
+            'success': True,
+            'songs_count': await asyncio.to_thread(repository.count),
+            'categories_count': len(existing_categories),
+            'new_songs_count': new_songs_count,
+            'message': message
+        }
+    finally:
+        await crawler.close()
+
+
+def scrape_site(start_url: str = BASE_URL, max_songs: int = 10, follow_links: bool = False,
+                concurrency: int = DEFAULT_CONCURRENCY, job: Optional[Any] = None,
+                transport: Any = None) -> Dict[str, Any]:
+    """
+    Asyncio counterpart of simplified_scraper.scrape_site with the same
+    arguments and result
+
+    Args:
+        start_url: The URL to start scraping from
+        max_songs: Maximum number of songs to scrape
+        follow_links: Whether to follow links from the index page (for Hindi, English, etc. categories)
+        concurrency: Maximum number of requests in flight
+        job: Optional scrape_jobs.ScrapeJob that receives progress updates and
+             can cancel the scrape between pages
+        transport: Optional object with an async get(url, headers, timeout)
+                   returning (status, headers, text), e.g. a
+                   HostRewriteTransport to crawl a local stand-in server
+    """
+    try:
+        return asyncio.run(scrape_site_async(start_url, max_songs, follow_links, concurrency, job, transport))
+    except Exception as e:
+        logger.error(f"Error during scraping: {str(e)}")
+        return {
+            'success': False,
+            'message': f"An error occurred during scraping: {str(e)}"
+        }
+
+
+if __name__ == "__main__":
+    import json
+    print(json.dumps(scrape_site(max_songs=5), indent=2))
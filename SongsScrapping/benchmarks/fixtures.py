@@ -0,0 +1,167 @@
+"""
+HTML fixtures for the offline benchmarks.
+
+    python benchmarks/fixtures.py --record        # download pages from songsofpraise.in
+    python benchmarks/fixtures.py --from-catalog  # rebuild pages from data/songs.json
+
+Fixtures are saved under benchmarks/fixtures/ together with index.json,
+which lists each file with the URL it was taken from and its kind
+('listing' for the home and language index pages, 'song' for song pages).
+The committed fixtures were built with --from-catalog and are synthetic;
+see README.md.
+"""
+import os
+import sys
+import html
+import json
+import argparse
+from typing import Dict, List, Any
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, APP_DIR)
+
+# Storage paths
+FIXTURES_DIR = os.path.join(BENCHMARKS_DIR, 'fixtures')
+MANIFEST_PATH = os.path.join(FIXTURES_DIR, 'index.json')
+CATALOG_PATH = os.path.join(APP_DIR, 'data', 'songs.json')
+
+# Constants
+BASE_URL = 'https://songsofpraise.in/'
+LISTING_PAGES = {
+    'home.html': BASE_URL,
+    'hindi.html': BASE_URL + 'hindi/',
+    'english.html': BASE_URL + 'english/',
+}
+SONG_PAGES = 5  # Song pages recorded from the songs the listing pages link to
+
+# WordPress page shell matching the markup the scrapers select on
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en-US">
+<head><meta charset="UTF-8"><title>{title} - Songs of Praise</title></head>
+<body>
+<header id="site-header"><nav><ul>
+<li><a href="https://songsofpraise.in/">Home</a></li>
+<li><a href="https://songsofpraise.in/hindi/">Hindi</a></li>
+<li><a href="https://songsofpraise.in/english/">English</a></li>
+<li><a href="https://songsofpraise.in/malayalam/">Malayalam</a></li>
+</ul></nav></header>
+<main id="site-content"><article class="post type-post">
+<header class="entry-header"><h1 class="entry-title">{title}</h1>
+<div class="entry-categories">{categories}</div></header>
+{body}
+</article></main>
+</body>
+</html>
+"""
+
+
+def render_page(title: str, body: str, categories: List[str] = ()) -> str:
+    """A page shaped like songsofpraise.in around an entry-content body"""
+    links = ', '.join(
+        f'<a href="{BASE_URL}category/{html.escape(name.lower())}/" rel="category tag">{html.escape(name)}</a>'
+        for name in categories
+    )
+    return PAGE_TEMPLATE.format(title=html.escape(title), categories=links, body=body)
+
+
+def song_body(content: str) -> str:
+    """entry-content markup for song text: one paragraph per stanza, <br> between lines"""
+    stanzas = [stanza for stanza in content.split('\n\n') if stanza.strip()]
+    paragraphs = ('<p>' + '<br/>\n'.join(html.escape(line) for line in stanza.split('\n')) + '</p>'
+                  for stanza in stanzas)
+    return '<div class="entry-content">\n' + '\n'.join(paragraphs) + '\n</div>'
+
+
+def save_fixtures(pages: List[Dict[str, Any]]) -> None:
+    """Write each {'file', 'url', 'kind', 'html'} page and the manifest"""
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    manifest = []
+    for page in pages:
+        with open(os.path.join(FIXTURES_DIR, page['file']), 'w', encoding='utf-8') as f:
+            f.write(page['html'])
+        manifest.append({'file': page['file'], 'url': page['url'], 'kind': page['kind']})
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"Saved {len(pages)} fixtures to {FIXTURES_DIR}")
+
+
+def load_fixtures() -> List[Dict[str, Any]]:
+    """The recorded pages as {'file', 'url', 'kind', 'html'}"""
+    with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    pages = []
+    for entry in manifest:
+        with open(os.path.join(FIXTURES_DIR, entry['file']), 'r', encoding='utf-8') as f:
+            pages.append(dict(entry, html=f.read()))
+    return pages
+
+
+def record() -> None:
+    """Download the listing pages and the first song pages they link to"""
+    # Through the app's fetcher and HTTP cache, relative to the app directory
+    os.chdir(APP_DIR)
+    from simplified_scraper import get_webpage_content, extract_links
+
+    pages = []
+    song_urls = []
+    for file_name, url in LISTING_PAGES.items():
+        page_html = get_webpage_content(url)
+        if not page_html:
+            sys.exit(f"Failed to download {url}")
+        pages.append({'file': file_name, 'url': url, 'kind': 'listing', 'html': page_html})
+        links = extract_links(page_html, url)
+        for song in links['index_links'] or links['songs']:
+            if song['url'] not in song_urls and song['url'] not in LISTING_PAGES.values():
+                song_urls.append(song['url'])
+
+    for number, url in enumerate(song_urls[:SONG_PAGES], 1):
+        page_html = get_webpage_content(url)
+        if not page_html:
+            sys.exit(f"Failed to download {url}")
+        pages.append({'file': f"song-{number}.html", 'url': url, 'kind': 'song', 'html': page_html})
+    save_fixtures(pages)
+
+
+def from_catalog() -> None:
+    """
+    Rebuild fixtures without network access. The catalog holds the real
+    entry-content markup of the home and language index pages, which is
+    wrapped in a page shell; song pages are rendered from their stored text.
+    """
+    with open(CATALOG_PATH, 'r', encoding='utf-8') as f:
+        songs = json.load(f)
+
+    pages = []
+    for file_name, url in LISTING_PAGES.items():
+        # The home page's entry content was stored under its a-z anchors
+        source = next((song for song in songs if song.get('content_html')
+                       and (song['url'] == url or song['url'].startswith(url + '#a-z-listing'))), None)
+        if source is None:
+            sys.exit(f"No stored markup for {url} in {CATALOG_PATH}")
+        pages.append({'file': file_name, 'url': url, 'kind': 'listing',
+                      'html': render_page('Songs of Praise', source['content_html'])})
+
+    # Song pages are the catalog entries credited with a songwriter, one per URL
+    song_entries = {}
+    for song in songs:
+        if 'Songwriter' in song.get('content', '') and '#' not in song['url']:
+            song_entries.setdefault(song['url'], song)
+    for number, song in enumerate(list(song_entries.values())[:SONG_PAGES], 1):
+        slug = song['url'].rstrip('/').rsplit('/', 1)[-1]
+        title = slug.replace('-', ' ').title()
+        pages.append({'file': f"song-{number}.html", 'url': song['url'], 'kind': 'song',
+                      'html': render_page(title, song_body(song['content']), song.get('categories') or ['Hindi'])})
+    save_fixtures(pages)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record HTML fixtures for the benchmarks')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--record', action='store_true', help='download the pages from songsofpraise.in')
+    source.add_argument('--from-catalog', action='store_true', help='rebuild the pages from data/songs.json')
+    args = parser.parse_args()
+    if args.record:
+        record()
+    else:
+        from_catalog()
@@ -0,0 +1,381 @@
+"""
+Offline benchmarks for the scrapers' parsing, the song repository, JSON
+serialization and the web routes.
+
+    python benchmarks/run.py                      # 1k and 10k song catalogs
+    python benchmarks/run.py --sizes 1000 10000 100000
+    python benchmarks/run.py --engine sqlite
+    python benchmarks/run.py --compare benchmarks/results/<earlier run>.json
+
+Parsing is measured on the HTML fixtures in benchmarks/fixtures/ (see
+fixtures.py). Storage and route timings use synthetic catalogs built from
+the songs in data/songs.json, each in a fresh subprocess working in its own
+temporary data directory, so the real catalog is never touched. Results are
+saved to benchmarks/results/ and compared with the previous run. JSON
+load, dump and response encode times are reported for every available
+json_codec backend (orjson and the standard library).
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Optional
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+# Storage paths
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+CATALOG_PATH = os.path.join(APP_DIR, 'data', 'songs.json')
+
+# Constants
+DEFAULT_SIZES = (1000, 10000)
+DEFAULT_REQUESTS = 50  # Requests timed per route; whole-catalog routes get a tenth of this
+PARSE_SECONDS = 2.0  # Minimum time spent parsing each fixture kind
+EDITED_FRACTION = 0.01  # Share of the catalog edited before the save benchmark
+NEW_SONGS = 10  # Songs added in the save_new_songs benchmark
+CATEGORIES = ('Hindi', 'English', 'Malayalam', 'Worship', 'Praise', 'Christmas', 'Easter', 'Slow Songs',
+              'Fast Songs', 'Holy Spirit', 'Thanksgiving', 'Kids')
+CATALOG_SPAN = 365 * 24 * 60 * 60  # Synthetic songs are spread over a year of timestamps
+SEED = 20240519
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of samples"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """p50/p99/mean of per-request seconds, in milliseconds"""
+    return {
+        'requests': len(samples),
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+    }
+
+
+def timed(function: Callable[[], Any]) -> float:
+    """Seconds one call of function takes"""
+    started = time.perf_counter()
+    function()
+    return round(time.perf_counter() - started, 4)
+
+
+# Synthetic catalogs
+
+def template_songs() -> List[Dict[str, Any]]:
+    """The real song pages in data/songs.json, used as the shape of synthetic songs"""
+    with open(CATALOG_PATH, 'r', encoding='utf-8') as f:
+        songs = json.load(f)
+    templates = {}
+    for song in songs:
+        if song.get('content') and not song.get('content_html') and '#' not in song['url']:
+            templates.setdefault(song['url'], song)
+    return list(templates.values())
+
+
+def build_catalog(size: int, seed: int = SEED) -> List[Dict[str, Any]]:
+    """
+    size songs shaped like the scraped ones: every field the scrapers write,
+    unique ids and URLs, titles and content taken from the real songs,
+    timestamps spread over a year and one to three categories each
+    """
+    from chords import parse_content
+
+    rng = random.Random(seed)
+    templates = template_songs()
+    sheets = [parse_content(template['content']) for template in templates]
+    start = int(datetime(2024, 1, 1).timestamp())
+    songs = []
+    for song_id in range(1, size + 1):
+        number = rng.randrange(len(templates))
+        template = templates[number]
+        lyrics, chords = sheets[number]
+        slug = template['url'].rstrip('/').rsplit('/', 1)[-1]
+        songs.append({
+            'id': song_id,
+            'url': f"https://songsofpraise.in/{slug}-{song_id}/",
+            'title': f"{slug.replace('-', ' ').title()} {song_id}",
+            'content': template['content'],
+            'content_html': '',
+            'lyrics': lyrics,
+            'chords': chords,
+            'categories': rng.sample(CATEGORIES, rng.randint(1, 3)),
+            'timestamp': start + CATALOG_SPAN * song_id // size,
+        })
+    return songs
+
+
+# Worker benchmarks (run in a subprocess, inside a temporary directory)
+
+def bench_parse() -> Dict[str, Any]:
+    """Pages per second for link extraction and song extraction on the fixtures"""
+    from fixtures import load_fixtures
+    from simplified_scraper import extract_links, extract_song_from_html
+
+    pages = load_fixtures()
+    jobs = {
+        'extract_links': (lambda page: extract_links(page['html'], page['url']),
+                          [page for page in pages if page['kind'] == 'listing']),
+        'extract_song_from_html': (lambda page: extract_song_from_html(page['html'], page['url'], 1),
+                                   [page for page in pages if page['kind'] == 'song']),
+    }
+
+    results = {}
+    for name, (parse, fixture_pages) in jobs.items():
+        parsed = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < PARSE_SECONDS:
+            for page in fixture_pages:
+                parse(page)
+            parsed += len(fixture_pages)
+        seconds = time.perf_counter() - started
+        results[name] = {
+            'pages': parsed,
+            'pages_per_sec': round(parsed / seconds, 2),
+            'bytes_per_page': sum(len(page['html'].encode('utf-8')) for page in fixture_pages) // len(fixture_pages),
+        }
+    return results
+
+
+def bench_storage(songs: List[Dict[str, Any]], engine: str) -> Dict[str, Any]:
+    """Writing, loading and saving a catalog through the storage engine"""
+    from song_store import SongStore
+    from song_repository import create_repository, repository
+    import simplified_scraper as scraper
+
+    results = {'append_log_s': timed(lambda: SongStore().append(songs))}
+
+    # Cold: no persisted indexes (and for sqlite, the import from the log)
+    results['cold_load_s'] = timed(lambda: create_repository(engine).count())
+    # Warm: indexes persisted by the cold load are reused
+    results['warm_load_s'] = timed(lambda: create_repository(engine).count())
+    results['first_read_s'] = timed(repository.count)
+
+    rng = random.Random(SEED)
+    edited = [dict(song) for song in repository.all()]
+    for song in rng.sample(edited, max(1, int(len(edited) * EDITED_FRACTION))):
+        song['title'] = song['title'] + ' (edited)'
+    results['save_s'] = timed(lambda: repository.save(edited))
+
+    first_id = repository.reserve_ids(NEW_SONGS)
+    new_songs = [dict(song, id=first_id + i, url=f"{song['url']}new/") for i, song in enumerate(songs[:NEW_SONGS])]
+    results['save_new_songs_s'] = timed(lambda: scraper.save_new_songs(new_songs))
+    return results
+
+
+def bench_json(songs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Catalog load/dump and response encode times for each available JSON backend"""
+    import json_codec
+    from song_store import SongStore
+    from app import app
+
+    backends = ['stdlib'] + (['orjson'] if json_codec.orjson is not None else [])
+    configured = json_codec.BACKEND
+    results = {}
+    try:
+        for backend in backends:
+            json_codec.BACKEND = backend
+            path = f"catalog-{backend}.json"
+            store = SongStore(f"songs-{backend}.jsonl", legacy_path=path)
+
+            def dump(indent: bool) -> None:
+                with open(path, 'wb') as f:
+                    json_codec.dump(songs, f, indent)
+
+            def load() -> None:
+                with open(path, 'rb') as f:
+                    json_codec.load(f)
+
+            results[backend] = {
+                'dump_indented_s': timed(lambda: dump(True)),
+                'dump_s': timed(lambda: dump(False)),
+                'load_s': timed(load),
+                'log_append_s': timed(lambda: store.append(songs)),
+                'log_load_s': timed(store.load),
+            }
+            with app.app_context():
+                results[backend]['response_encode_s'] = timed(lambda: app.json.response(songs))
+    finally:
+        json_codec.BACKEND = configured
+    return results
+
+
+def bench_routes(songs: List[Dict[str, Any]], requests: int) -> Dict[str, Any]:
+    """Latency of the main routes, with and without the response cache"""
+    from app import app, response_cache
+
+    rng = random.Random(SEED)
+    words = [word for song in songs[:200] for word in song['title'].split() if word.isalpha() and len(word) > 3]
+    whole_catalog = max(3, requests // 10)
+    routes = {
+        '/search': [f"/search?q={rng.choice(words)}" for _ in range(requests)],
+        '/song/<id>': [f"/song/{rng.randint(1, len(songs))}" for _ in range(requests)],
+        '/api/songs': ['/api/songs'] * whole_catalog,
+        '/api/download-all': ['/api/download-all'] * whole_catalog,
+    }
+
+    client = app.test_client()
+    results = {}
+    for route, urls in routes.items():
+        results[route] = {}
+        for mode in ('uncached', 'cached'):
+            samples = []
+            for url in urls:
+                if mode == 'uncached':
+                    response_cache.clear()
+                else:
+                    client.get(url).get_data()
+                started = time.perf_counter()
+                response = client.get(url)
+                response.get_data()  # Drain streamed bodies
+                samples.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{url} returned {response.status_code}")
+            results[route][mode] = latency_summary(samples)
+    return results
+
+
+def run_worker(args: argparse.Namespace) -> None:
+    """Benchmark one catalog size (or the parsers) and write the results as JSON"""
+    logging.disable(logging.INFO)
+    if args.worker == 'parse':
+        results = bench_parse()
+    else:
+        songs = build_catalog(int(args.worker))
+        results = {
+            'storage': bench_storage(songs, args.engine),
+            'json': bench_json(songs),
+            'routes': bench_routes(songs, args.requests),
+        }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f)
+
+
+# Orchestration
+
+def run_in_subprocess(worker: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Run one worker in a fresh interpreter inside an empty temporary directory"""
+    workdir = tempfile.mkdtemp(prefix='songs-bench-')
+    output = os.path.join(workdir, 'results.json')
+    env = dict(os.environ, SONG_STORAGE_ENGINE=args.engine, PYTHONPATH=APP_DIR)
+    try:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', worker, '--output', output,
+                        '--engine', args.engine, '--requests', str(args.requests)],
+                       cwd=workdir, env=env, check=True)
+        with open(output, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def json_backend() -> str:
+    import json_codec
+    return json_codec.BACKEND
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results: Dict[str, Any], prefix: str = '') -> Dict[str, float]:
+    """Numeric leaves of nested results keyed by their dotted path"""
+    values = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, path + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+
+def latest_result() -> Optional[str]:
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    names = sorted(name for name in os.listdir(RESULTS_DIR) if name.endswith('.json'))
+    return os.path.join(RESULTS_DIR, names[-1]) if names else None
+
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    """One line per measurement, with the change from the baseline run if there is one"""
+    current = flatten({'parse': results['parse'], 'catalogs': results['catalogs']})
+    previous = flatten({'parse': baseline['parse'], 'catalogs': baseline['catalogs']}) if baseline else {}
+    width = max(len(key) for key in current)
+    for key, value in current.items():
+        line = f"{key:<{width}}  {value:>12}"
+        old = previous.get(key)
+        if old:
+            line += f"  {old:>12}  {(value - old) / old * 100:+7.1f}%"
+        print(line)
+
+
+def run(args: argparse.Namespace) -> None:
+    baseline_path = args.compare or latest_result()
+
+    print("Benchmarking parsers...", file=sys.stderr)
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'engine': args.engine,
+            'json_backend': json_backend(),
+            'requests': args.requests,
+        },
+        'parse': run_in_subprocess('parse', args),
+        'catalogs': {},
+    }
+    for size in args.sizes:
+        print(f"Benchmarking a {size} song catalog...", file=sys.stderr)
+        results['catalogs'][str(size)] = run_in_subprocess(str(size), args)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        meta = baseline.get('meta', {})
+        print(f"Compared with {baseline_path} (commit {meta.get('commit')}); "
+              f"latencies and seconds: lower is better, pages_per_sec: higher is better")
+    print_report(results, baseline)
+    print(f"Saved results to {path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the scrapers, storage and web routes')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='synthetic catalog sizes (default: 1000 10000)')
+    parser.add_argument('--engine', choices=('jsonl', 'sqlite'), default=os.environ.get('SONG_STORAGE_ENGINE', 'jsonl'),
+                        help='song storage engine')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help='requests timed per route')
+    parser.add_argument('--compare', help='results file to compare with (default: the latest in benchmarks/results)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args)
+    else:
+        run(args)
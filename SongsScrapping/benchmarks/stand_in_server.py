@@ -0,0 +1,71 @@
+"""
+Local stand-in for songsofpraise.in serving the HTML fixtures, so scrapers
+can be exercised end to end without touching the real site.
+
+    python benchmarks/stand_in_server.py --port 8000
+
+Each fixture is served at the path of the URL it was taken from (see
+fixtures.py); other paths get a 404. The fixtures link to songsofpraise.in,
+so crawl against the stand-in with async_scraper.HostRewriteTransport, which
+sends those URLs here.
+"""
+import os
+import sys
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Tuple
+from urllib.parse import urlparse
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from fixtures import load_fixtures
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serves the fixture pages by URL path"""
+    protocol_version = 'HTTP/1.1'
+    pages: Dict[str, bytes] = {}
+
+    def do_GET(self):
+        body = self.pages.get(urlparse(self.path).path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Quiet by default; the scrapers log their own requests
+        pass
+
+
+def create_server(host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """A server for the fixtures; port 0 picks a free port"""
+    pages = {urlparse(page['url']).path: page['html'].encode('utf-8') for page in load_fixtures()}
+    handler = type('Handler', (FixtureHandler,), {'pages': pages})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def start_server(host: str = '127.0.0.1', port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """Serve the fixtures from a background thread; returns the server and its origin URL"""
+    server = create_server(host, port)
+    threading.Thread(target=server.serve_forever, name='stand-in-server', daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the benchmark fixtures as a stand-in for songsofpraise.in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+    server = create_server(args.host, args.port)
+    print(f"Serving {len(server.RequestHandlerClass.pages)} fixture pages on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
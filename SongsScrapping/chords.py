@@ -0,0 +1,104 @@
+import re
+from typing import Dict, List, Any, Optional, Tuple
+
+# A single chord name, e.g. C, F#m, Bbmaj7, Gsus4, D/F#
+CHORD = r'[A-G][#b]?(?:maj|min|m|sus|aug|dim|add)?\d*(?:/[A-G][#b]?)?'
+
+# Lines made only of chord names; lyrics are the content without them
+CHORD_LINE_PATTERN = re.compile(rf'^\s*{CHORD}(?:\s+{CHORD})*\s*$')
+
+# Chords on a chord line are its whitespace-separated tokens
+CHORD_TOKEN_PATTERN = re.compile(r'\S+')
+
+
+def parse_content(content: str) -> Tuple[str, List[List[Any]]]:
+    """
+    Split song content into its lyrics and chords in one pass.
+
+    Returns (lyrics, chords): lyrics is the content without its chord-only
+    lines, and chords lists every chord line as [line number in the
+    content, [[column, chord name], ...]].
+    """
+    if not content:
+        return '', []
+
+    lyric_lines = []
+    chords = []
+    for number, line in enumerate(content.split('\n')):
+        if CHORD_LINE_PATTERN.match(line):
+            chords.append([number, [[match.start(), match.group()] for match in CHORD_TOKEN_PATTERN.finditer(line)]])
+        else:
+            lyric_lines.append(line)
+    return '\n'.join(lyric_lines), chords
+
+
+def lyrics_from_content(content: str) -> str:
+    """Song content without the lines that hold only chords"""
+    return parse_content(content)[0]
+
+
+def sheet_fields(content: str) -> Dict[str, Any]:
+    """The lyrics and chords fields stored with a song whose content is `content`"""
+    lyrics, chords = parse_content(content)
+    return {'lyrics': lyrics, 'chords': chords}
+
+
+def _stored_chords(song: Dict[str, Any], lines: List[str]) -> Optional[List[List[Any]]]:
+    """The song's stored chords, or None if it has none or they no longer match its content"""
+    chords = song.get('chords')
+    if chords is None:
+        return None
+    for number, line_chords in chords:
+        if number >= len(lines) or lines[number].split() != [name for _, name in line_chords]:
+            return None
+    return chords
+
+
+def chord_lines(song: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    The song as chord/lyric line pairs: each chord line is paired with the
+    lyric line under it, as {'chords': [[column, chord name], ...],
+    'lyrics': str}. Lyric lines without chords have no chords, and a chord
+    line with no lyric line under it has lyrics None.
+
+    Uses the chords stored when the song was saved; songs saved before
+    chords were stored are parsed on the fly.
+    """
+    content = song.get('content', '')
+    if not content:
+        return []
+
+    lines = content.split('\n')
+    chords = _stored_chords(song, lines)
+    if chords is None:
+        chords = parse_content(content)[1]
+    chords_by_line = {number: line_chords for number, line_chords in chords}
+
+    pairs = []
+    pending = None
+    for number, line in enumerate(lines):
+        line_chords = chords_by_line.get(number)
+        if line_chords is not None:
+            if pending is not None:
+                pairs.append({'chords': pending, 'lyrics': None})
+            pending = line_chords
+        else:
+            pairs.append({'chords': pending or [], 'lyrics': line})
+            pending = None
+    if pending is not None:
+        pairs.append({'chords': pending, 'lyrics': None})
+    return pairs
+
+
+def chord_segments(chords: List[List[Any]]) -> List[Tuple[str, str]]:
+    """
+    (padding, chord name) pairs that lay a chord line out again: the spaces
+    before each chord put it back in its column
+    """
+    segments = []
+    column = 0
+    for position, name in chords:
+        padding = ' ' * max(position - column, 1 if segments else 0)
+        segments.append((padding, name))
+        column += len(padding) + len(name)
+    return segments
@@ -0,0 +1,181 @@
+import os
+import re
+import time
+import heapq
+import hashlib
+import logging
+from typing import Dict, List, Any, Optional
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+from song_store import atomic_write_json
+from metrics import json_duration
+import json_codec
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Storage paths
+CHECKPOINT_DIR = 'data/crawl_checkpoints'
+
+# Constants
+DEFAULT_CRAWL_DEPTH = 4  # Link hops from the start page; pagination doesn't count as a hop
+MAX_CRAWL_DEPTH = 10
+CHECKPOINT_INTERVAL = 25  # Pages processed between checkpoint writes
+
+# Kinds of pages in the frontier; songs are fetched before listing pages
+SONG = 'song'
+LISTING = 'listing'
+KIND_PRIORITY = {SONG: 0, LISTING: 1}
+
+# Query parameters that never change the page content
+IGNORED_QUERY_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|replytocom|amp)$')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str, base_url: Optional[str] = None) -> Optional[str]:
+    """
+    Canonical form of a URL used for deduplication: resolved against
+    base_url, fragment dropped, scheme and host lowercased, default port and
+    duplicate slashes removed, tracking parameters dropped and the remaining
+    query sorted. Returns None for non-HTTP links (mailto:, javascript:, ...).
+    """
+    if base_url:
+        url = urljoin(base_url, url)
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    netloc = parts.hostname.lower()
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+
+    path = re.sub(r'/{2,}', '/', parts.path) or '/'
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not IGNORED_QUERY_PARAMS.match(key)
+    ))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def checkpoint_path_for(start_url: str) -> str:
+    """Checkpoint file of the crawl that starts at start_url"""
+    key = hashlib.sha1((normalize_url(start_url) or start_url).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(CHECKPOINT_DIR, f"{key}.json")
+
+
+class CrawlFrontier:
+    """
+    Priority queue of pages still to be crawled.
+
+    Every URL is normalized and admitted at most once, so a page linked from
+    many listings is fetched once and the crawl is linear in the size of the
+    site. Song pages are popped before listing pages, and listing pages in
+    breadth-first order. URLs deeper than max_depth, or beyond
+    max_pages_per_depth pages at their depth, are not admitted.
+
+    The pending queue and the set of admitted URLs can be written to a
+    checkpoint file, so an interrupted crawl resumes without fetching pages
+    it has already processed.
+    """
+    def __init__(self, start_url: str, max_depth: int = DEFAULT_CRAWL_DEPTH,
+                 max_pages_per_depth: Optional[int] = None, checkpoint_path: Optional[str] = None):
+        self.start_url = normalize_url(start_url) or start_url
+        self.max_depth = max_depth
+        self.max_pages_per_depth = max_pages_per_depth
+        self.checkpoint_path = checkpoint_path or checkpoint_path_for(start_url)
+
+        self._heap: List[tuple] = []
+        self._seen: set = set()
+        self._pages_per_depth: Dict[int, int] = {}
+        self._counter = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def seen(self, url: str) -> bool:
+        return (normalize_url(url) or url) in self._seen
+
+    # Queue
+
+    def add(self, url: str, depth: int, kind: str = SONG, title: str = '') -> bool:
+        """
+        Admit a URL to the frontier; returns False if it was already seen,
+        isn't an HTTP URL or is outside the depth limits
+        """
+        url = normalize_url(url)
+        if url is None or url in self._seen or depth > self.max_depth:
+            return False
+        if self.max_pages_per_depth is not None and self._pages_per_depth.get(depth, 0) >= self.max_pages_per_depth:
+            return False
+
+        self._seen.add(url)
+        self._pages_per_depth[depth] = self._pages_per_depth.get(depth, 0) + 1
+        self._push({'url': url, 'depth': depth, 'kind': kind, 'title': title})
+        return True
+
+    def pop(self) -> Optional[Dict[str, Any]]:
+        """Next page to crawl, or None when the frontier is empty"""
+        if not self._heap:
+            return None
+        return heapq.heappop(self._heap)[-1]
+
+    def requeue(self, item: Dict[str, Any]) -> None:
+        """Put back a popped page that was not processed (e.g. on cancellation)"""
+        self._push(item)
+
+    def _push(self, item: Dict[str, Any]) -> None:
+        # The counter keeps insertion order within a priority and means the
+        # item dicts themselves are never compared
+        self._counter += 1
+        heapq.heappush(self._heap, (KIND_PRIORITY.get(item['kind'], 1), item['depth'], self._counter, item))
+
+    # Checkpoints
+
+    def save_checkpoint(self) -> None:
+        """Atomically write the pending queue and seen URLs to the checkpoint file"""
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        atomic_write_json(self.checkpoint_path, {
+            'start_url': self.start_url,
+            'max_depth': self.max_depth,
+            'pending': [entry[-1] for entry in sorted(self._heap)],
+            'seen': sorted(self._seen),
+            'pages_per_depth': self._pages_per_depth,
+            'updated_at': int(time.time()),
+        }, target='crawl_checkpoint')
+
+    def load_checkpoint(self) -> bool:
+        """
+        Restore the frontier from a checkpoint of the same start URL.
+        Returns True if a checkpoint was found.
+        """
+        try:
+            with open(self.checkpoint_path, 'rb') as f, json_duration.time('load', 'crawl_checkpoint'):
+                checkpoint = json_codec.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.error(f"Ignoring unreadable crawl checkpoint {self.checkpoint_path}: {str(e)}")
+            return False
+
+        if checkpoint.get('start_url') != self.start_url:
+            return False
+
+        self._heap = []
+        self._seen = set(checkpoint.get('seen', []))
+        self._pages_per_depth = {int(depth): count for depth, count in checkpoint.get('pages_per_depth', {}).items()}
+        for item in checkpoint.get('pending', []):
+            self._push(item)
+        logger.info(f"Resuming crawl of {self.start_url}: {len(self._heap)} pages pending, {len(self._seen)} seen")
+        return True
+
+    def discard_checkpoint(self) -> None:
+        """Remove the checkpoint once the crawl has finished"""
+        try:
+            os.remove(self.checkpoint_path)
+        except FileNotFoundError:
+            pass
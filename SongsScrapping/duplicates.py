@@ -0,0 +1,316 @@
+import os
+import base64
+import random
+import struct
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+from search_index import tokenize
+from metrics import json_duration
+import json_codec
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Storage paths
+DUPLICATE_INDEX_PATH = 'data/duplicate_index.json'
+
+# Constants
+SHINGLE_SIZE = 3  # Consecutive lyric words per shingle
+MIN_SHINGLES = 5  # Songs with fewer shingles are too short to compare and are not indexed
+MINHASH_SIZE = 64  # Values per MinHash signature
+LSH_BANDS = 16  # Songs whose signatures agree on all rows of any band are candidates
+LSH_ROWS = MINHASH_SIZE // LSH_BANDS
+DUPLICATE_THRESHOLD = 0.7  # Estimated Jaccard similarity of two songs' shingles to count as near-duplicates
+
+# Signatures are packed into bytes: compact in memory, on disk and in SQLite
+SIGNATURE_FORMAT = struct.Struct(f'<{MINHASH_SIZE}I')
+BAND_FORMAT = struct.Struct(f'<{LSH_ROWS}I')
+
+# For each signature position, the order in which other positions are
+# borrowed from when no shingle hashed into it; fixed, so that every song
+# fills its empty positions the same way
+DENSIFY_ORDER = [random.Random(position).sample(range(MINHASH_SIZE), MINHASH_SIZE) for position in range(MINHASH_SIZE)]
+
+
+def shingles(song: Dict[str, Any]) -> set:
+    """
+    64-bit hashes of the overlapping SHINGLE_SIZE-word runs of a song's
+    lyrics (or content when it has no lyrics), lowercased and stripped of
+    punctuation, so formatting and chord lines don't matter
+    """
+    words = tokenize(song.get('lyrics') or song.get('content', ''))
+    return {
+        int.from_bytes(hashlib.blake2b(' '.join(words[i:i + SHINGLE_SIZE]).encode('utf-8'), digest_size=8).digest(), 'little')
+        for i in range(max(len(words) - SHINGLE_SIZE + 1, 0))
+    }
+
+
+def minhash_signature(song: Dict[str, Any]) -> Optional[bytes]:
+    """
+    The MinHash signature of a song's lyric shingles, or None for songs too
+    short to compare.
+
+    Uses one-permutation hashing: each shingle is hashed once, its low bits
+    pick a signature position and the high bits compete for that position's
+    minimum. Positions no shingle landed in borrow a filled one's value
+    (optimal densification), so the share of equal positions of two
+    signatures still estimates the Jaccard similarity of their shingle sets,
+    at one hash per shingle rather than one per shingle and position.
+    """
+    hashes = shingles(song)
+    if len(hashes) < MIN_SHINGLES:
+        return None
+
+    minimums: List[Optional[int]] = [None] * MINHASH_SIZE
+    for value in hashes:
+        position = value % MINHASH_SIZE
+        value >>= 32
+        if minimums[position] is None or value < minimums[position]:
+            minimums[position] = value
+
+    signature = list(minimums)
+    for position, value in enumerate(minimums):
+        if value is None:
+            signature[position] = next(minimums[other] for other in DENSIFY_ORDER[position]
+                                       if minimums[other] is not None)
+    return SIGNATURE_FORMAT.pack(*signature)
+
+
+def similarity(a: bytes, b: bytes) -> float:
+    """Estimated Jaccard similarity of the songs behind two signatures"""
+    return sum(x == y for x, y in zip(SIGNATURE_FORMAT.unpack(a), SIGNATURE_FORMAT.unpack(b))) / MINHASH_SIZE
+
+
+def band_keys(signature: bytes) -> List[int]:
+    """
+    One LSH bucket key per band of a signature, as signed 64-bit integers so
+    they fit SQLite's INTEGER; the band number is hashed in, so keys of
+    different bands never meet
+    """
+    band_size = BAND_FORMAT.size
+    return [
+        int.from_bytes(hashlib.blake2b(bytes([band]) + signature[band * band_size:(band + 1) * band_size],
+                                       digest_size=8).digest(), 'little', signed=True)
+        for band in range(LSH_BANDS)
+    ]
+
+
+def encode_signature(signature: bytes) -> str:
+    return base64.b64encode(signature).decode('ascii')
+
+
+def decode_signature(text: str) -> bytes:
+    return base64.b64decode(text)
+
+
+def cluster_candidates(groups: Iterable[Iterable[int]], signatures: Dict[int, bytes],
+                       threshold: float = DUPLICATE_THRESHOLD) -> List[List[Tuple[int, float]]]:
+    """
+    Group songs into near-duplicate clusters.
+
+    `groups` are the songs sharing an LSH bucket; only pairs within a group
+    are compared, and pairs already in the same cluster are skipped. Each
+    cluster lists (song id, similarity to the cluster's first song) by id,
+    and clusters are ordered largest first.
+    """
+    parent: Dict[int, int] = {}
+
+    def find(song_id: int) -> int:
+        parent.setdefault(song_id, song_id)
+        while parent[song_id] != song_id:
+            parent[song_id] = parent[parent[song_id]]
+            song_id = parent[song_id]
+        return song_id
+
+    for group in groups:
+        # Each song is compared with one representative per cluster seen in
+        # the group so far, so a bucket of near-duplicates costs a linear pass
+        representatives: List[int] = []
+        for song_id in sorted(group):
+            matched = False
+            for representative in representatives:
+                root, other_root = find(song_id), find(representative)
+                if root == other_root:
+                    matched = True
+                elif similarity(signatures[song_id], signatures[representative]) >= threshold:
+                    parent[max(root, other_root)] = min(root, other_root)
+                    matched = True
+            if not matched:
+                representatives.append(song_id)
+
+    clusters: Dict[int, List[int]] = {}
+    for song_id in parent:
+        clusters.setdefault(find(song_id), []).append(song_id)
+
+    result = []
+    for members in clusters.values():
+        if len(members) < 2:
+            continue
+        members.sort()
+        first = signatures[members[0]]
+        result.append([(song_id, similarity(first, signatures[song_id])) for song_id in members])
+    result.sort(key=lambda cluster: (-len(cluster), cluster[0][0]))
+    return result
+
+
+def merged_fields(keep: Dict[str, Any], duplicates: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Fields of the song kept when merging duplicates into it: the union of
+    their categories, and their URLs as aliases, so scrapes that come across
+    those URLs again know the song is already stored
+    """
+    categories = list(keep.get('categories') or [])
+    seen = {category.lower() for category in categories}
+    aliases = list(keep.get('aliases') or [])
+    for song in duplicates:
+        for category in song.get('categories') or []:
+            if category.lower() not in seen:
+                seen.add(category.lower())
+                categories.append(category)
+        for url in [song.get('url')] + list(song.get('aliases') or []):
+            if url and url != keep.get('url') and url not in aliases:
+                aliases.append(url)
+    return {'categories': categories, 'aliases': aliases}
+
+
+class DuplicateIndex:
+    """
+    MinHash signatures of every song's lyrics in an LSH index.
+
+    Each signature is split into LSH_BANDS bands, and each band is hashed
+    into a bucket; near-duplicates land in a shared bucket with high
+    probability, so finding a song's duplicates only compares it with the
+    songs in its buckets, and listing every cluster only compares songs
+    within buckets, never all pairs. Signatures are persisted alongside the
+    catalog and tagged with its file signature, like the search index; the
+    buckets are rebuilt from them on load.
+    """
+    def __init__(self):
+        self.signature: Optional[Tuple[int, int]] = None
+        self._lock = threading.RLock()
+        self._signatures: Dict[int, bytes] = {}
+        # Bucket key -> song id, or a set of ids once several songs share it;
+        # most buckets hold one song, and a bare int is much smaller than a set
+        self._buckets: Dict[int, Any] = {}
+        self._clusters: Optional[List[List[Tuple[int, float]]]] = None
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    # Building
+
+    def add(self, song: Dict[str, Any]) -> None:
+        """Index a song, replacing any previous entry with the same id"""
+        song_id = song.get('id')
+        if song_id is None:
+            return
+        signature = minhash_signature(song)
+
+        with self._lock:
+            self.remove(song_id)
+            if signature is not None:
+                self._insert(song_id, signature)
+            self._clusters = None
+
+    def remove(self, song_id: int) -> None:
+        """Drop a song from the index"""
+        with self._lock:
+            signature = self._signatures.pop(song_id, None)
+            if signature is None:
+                return
+            for key in band_keys(signature):
+                members = self._buckets.get(key)
+                if isinstance(members, set):
+                    members.discard(song_id)
+                    if len(members) == 1:
+                        self._buckets[key] = members.pop()
+                elif members == song_id:
+                    del self._buckets[key]
+            self._clusters = None
+
+    def rebuild(self, songs: Iterable[Dict[str, Any]]) -> None:
+        """Replace the index contents with the given songs"""
+        with self._lock:
+            self._signatures = {}
+            self._buckets = {}
+            self._clusters = None
+            for song in songs:
+                song_id = song.get('id')
+                signature = minhash_signature(song) if song_id is not None else None
+                if signature is not None:
+                    self._insert(song_id, signature)
+
+    def _insert(self, song_id: int, signature: bytes) -> None:
+        self._signatures[song_id] = signature
+        for key in band_keys(signature):
+            members = self._buckets.get(key)
+            if members is None:
+                self._buckets[key] = song_id
+            elif isinstance(members, set):
+                members.add(song_id)
+            elif members != song_id:
+                self._buckets[key] = {members, song_id}
+
+    # Lookups
+
+    def duplicates_of(self, song_id: int, threshold: float = DUPLICATE_THRESHOLD) -> List[Tuple[int, float]]:
+        """(song id, similarity) of a song's near-duplicates, most similar first"""
+        with self._lock:
+            signature = self._signatures.get(song_id)
+            if signature is None:
+                return []
+            candidates = set()
+            for key in band_keys(signature):
+                members = self._buckets.get(key)
+                if isinstance(members, set):
+                    candidates |= members
+            candidates.discard(song_id)
+            scored = [(other_id, similarity(signature, self._signatures[other_id])) for other_id in candidates]
+        return sorted((entry for entry in scored if entry[1] >= threshold), key=lambda entry: (-entry[1], entry[0]))
+
+    def clusters(self) -> List[List[Tuple[int, float]]]:
+        """
+        Every cluster of near-duplicates, largest first; computed on first
+        use after a change and cached
+        """
+        with self._lock:
+            if self._clusters is None:
+                groups = [members for members in self._buckets.values() if isinstance(members, set)]
+                self._clusters = cluster_candidates(groups, self._signatures)
+            return self._clusters
+
+    # Persistence
+
+    def save(self, path: str = DUPLICATE_INDEX_PATH) -> None:
+        """Write the signatures to disk atomically"""
+        with self._lock:
+            data = {
+                'signature': list(self.signature) if self.signature else None,
+                'signatures': {song_id: encode_signature(signature) for song_id, signature in self._signatures.items()},
+            }
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f, json_duration.time('dump', 'duplicate_index'):
+                json_codec.dump(data, f, indent=False)
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = DUPLICATE_INDEX_PATH) -> Optional['DuplicateIndex']:
+        """Read an index previously written with save(), or None if unavailable"""
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'rb') as f, json_duration.time('load', 'duplicate_index'):
+                data = json_codec.load(f)
+        except Exception as e:
+            logger.error(f"Error loading duplicate index: {str(e)}")
+            return None
+
+        index = cls()
+        index.signature = tuple(data['signature']) if data.get('signature') else None
+        # JSON object keys are strings; song ids are ints
+        for song_id, signature in data['signatures'].items():
+            index._insert(int(song_id), decode_signature(signature))
+        return index
@@ -0,0 +1,112 @@
+import os
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator
+from metrics import json_duration
+import json_codec
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Storage paths
+FETCH_LOG_PATH = 'data/song_fetches.jsonl'
+
+# Compact once the log holds this many more records than songs
+COMPACTION_MIN_GARBAGE = 1000
+
+
+class FetchLog:
+    """
+    Append-only JSON Lines log of what refreshes learned about song pages.
+
+    Each line is {"id": ..., "fetch": {...}} with the fetch metadata of one
+    check (checked_at, status, ETag/Last-Modified, page hash), the last
+    record for an id winning. It is kept apart from the catalog so checking
+    a page that didn't change costs one short line here, rather than a new
+    version of the song that would be re-indexed and empty the response
+    cache. Superseded records are dropped by rewriting the log once they
+    outnumber the live ones.
+
+    Writes hold an exclusive flock shared by all processes; reads don't,
+    and skip an unterminated final line.
+    """
+    def __init__(self, path: str = FETCH_LOG_PATH):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.record_count = 0
+        self.live_count = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """Hold the log's write lock, against other threads and other processes"""
+        with self._lock, open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def load(self) -> Dict[Any, Dict[str, Any]]:
+        """Fetch metadata by song id"""
+        fetches: Dict[Any, Dict[str, Any]] = {}
+        record_count = 0
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            self.record_count = self.live_count = 0
+            return fetches
+        with f, json_duration.time('load', 'fetch_log'):
+            for raw_line in f:
+                # An append in progress, or one cut short by a crash
+                if not raw_line.endswith(b'\n'):
+                    break
+                record_count += 1
+                try:
+                    record = json_codec.loads(raw_line)
+                except ValueError:
+                    logger.warning(f"Skipping corrupt record {record_count} of {self.path}")
+                    continue
+                fetches[record.get('id')] = record.get('fetch') or {}
+        self.record_count = record_count
+        self.live_count = len(fetches)
+        return fetches
+
+    def update(self, fetches: Dict[Any, Dict[str, Any]]) -> None:
+        """Append fetch metadata for songs, compacting the log once mostly superseded"""
+        if not fetches:
+            return
+        with json_duration.time('dump', 'fetch_log'):
+            data = b''.join(json_codec.dumps_bytes({'id': song_id, 'fetch': fetch}) + b'\n'
+                            for song_id, fetch in fetches.items())
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        with self._exclusive():
+            with open(self.path, 'a+b') as f:
+                end = f.seek(0, os.SEEK_END)
+                # A record cut short by a crash stays a (corrupt) line of its own
+                if end and os.pread(f.fileno(), 1, end - 1) != b'\n':
+                    data = b'\n' + data
+                f.write(data)
+            self.record_count += len(fetches)
+            if self.record_count - self.live_count >= max(self.live_count, COMPACTION_MIN_GARBAGE):
+                self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the log with only the last record for each id; called under the write lock"""
+        fetches = self.load()
+        tmp_path = f"{self.path}.compact"
+        with open(tmp_path, 'wb') as f, json_duration.time('dump', 'fetch_log'):
+            for song_id, fetch in fetches.items():
+                f.write(json_codec.dumps_bytes({'id': song_id, 'fetch': fetch}) + b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.record_count = self.live_count
+        logger.info(f"Compacted {self.path} to {self.live_count} songs")
+
+
+# Shared log used by song refreshes
+fetch_log = FetchLog()
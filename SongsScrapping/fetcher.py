@@ -0,0 +1,218 @@
+import time
+import random
+import logging
+import threading
+import requests
+from collections import deque
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, Mapping, Optional
+from rate_limiter import HostRateLimiter
+from metrics import registry
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+DEFAULT_TIMEOUT = 10  # Seconds to connect and between bytes of the response
+MAX_RETRIES = 3  # Retries after the first attempt
+BACKOFF_BASE = 0.5  # Seconds before the first retry, doubled for each one after
+BACKOFF_MAX = 30  # Longest backoff between two attempts
+MAX_RETRY_AFTER = 120  # A server asking to wait longer than this is not retried
+POOL_SIZE = 16  # Keep-alive connections kept per host; matches the scrapers' max concurrency
+RECENT_REQUESTS = 200  # Per-request records kept for inspection
+
+# Transient statuses worth another attempt
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Network errors worth another attempt
+RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError)
+
+
+def create_session(pool_size: int = POOL_SIZE) -> requests.Session:
+    """
+    A requests session with a keep-alive connection pool. Retries are done by
+    Fetcher, so the adapter itself never retries. The session's default
+    Accept-Encoding asks for gzip and deflate, plus br/zstd when the brotli or
+    zstandard packages are installed.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def backoff_delay(retry: int, base: float = BACKOFF_BASE, maximum: float = BACKOFF_MAX) -> float:
+    """Seconds to wait before the given retry (1-based): half fixed, half random"""
+    delay = min(maximum, base * 2 ** (retry - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds a Retry-After header (delta-seconds or HTTP date) asks to wait, or None"""
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class FetchMetrics:
+    """
+    Thread-safe counters for every page fetched over the network, plus the
+    most recent requests (URL, status, attempts, seconds, bytes, error)
+    """
+    def __init__(self, recent: int = RECENT_REQUESTS):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.attempts = 0
+        self.retries = 0
+        self.failures = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.statuses: Dict[int, int] = {}
+        self.recent: deque = deque(maxlen=recent)
+
+    def record(self, url: str, status: Optional[int], attempts: int, seconds: float, size: int,
+               error: Optional[str] = None) -> None:
+        with self._lock:
+            self.requests += 1
+            self.attempts += attempts
+            self.retries += attempts - 1
+            self.bytes += size
+            self.seconds += seconds
+            if status is not None:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+            if error is not None or status is None or status >= 400:
+                self.failures += 1
+            self.recent.append({
+                'url': url,
+                'status': status,
+                'attempts': attempts,
+                'seconds': round(seconds, 4),
+                'bytes': size,
+                'error': error,
+            })
+
+    def totals(self) -> Dict[str, Any]:
+        """Current totals as plain data"""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'attempts': self.attempts,
+                'retries': self.retries,
+                'failures': self.failures,
+                'bytes': self.bytes,
+                'seconds': round(self.seconds, 4),
+                'statuses': dict(self.statuses),
+            }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current totals and recent requests as plain data"""
+        with self._lock:
+            recent = list(self.recent)
+        return dict(self.totals(), recent=recent)
+
+
+class Fetcher:
+    """
+    HTTP GETs over a shared keep-alive session, so a crawl reuses pooled
+    connections instead of paying a TLS handshake per page.
+
+    Connection errors, timeouts and transient statuses (429, 5xx) are retried
+    with exponential backoff and jitter; a Retry-After header from the server
+    takes precedence over the computed backoff. Every attempt goes through
+    the rate limiter, if one is given, and every request is recorded in the
+    metrics. get() takes the same arguments as requests.get, so it can stand
+    in for it (e.g. in http_cache.cached_fetch).
+    """
+    def __init__(self, rate_limiter: Optional[HostRateLimiter] = None, session: Optional[requests.Session] = None,
+                 max_retries: int = MAX_RETRIES, backoff_base: float = BACKOFF_BASE, backoff_max: float = BACKOFF_MAX,
+                 metrics: Optional['FetchMetrics'] = None):
+        self.rate_limiter = rate_limiter
+        self.session = session or shared_session
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics = metrics or fetch_metrics
+
+    def backoff(self, retry: int) -> float:
+        return backoff_delay(retry, self.backoff_base, self.backoff_max)
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: float = DEFAULT_TIMEOUT) -> requests.Response:
+        """
+        GET a URL, retrying transient failures. Returns the last response
+        (which may still be an error status) or raises the last network error.
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait(url)
+
+            try:
+                response = self.session.get(url, headers=headers, timeout=timeout)
+            except RETRY_EXCEPTIONS as e:
+                if attempt > self.max_retries:
+                    self._record(url, None, attempt, started, 0, str(e))
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(f"Request to {url} failed ({str(e)}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            except requests.exceptions.RequestException as e:
+                self._record(url, None, attempt, started, 0, str(e))
+                raise
+
+            if response.status_code not in RETRY_STATUSES or attempt > self.max_retries:
+                break
+
+            delay = retry_after_seconds(response.headers)
+            if delay is None:
+                delay = self.backoff(attempt)
+            elif delay > MAX_RETRY_AFTER:
+                logger.warning(f"{url} asked to retry after {delay:.0f}s, giving up")
+                break
+            logger.warning(f"{url} returned {response.status_code}, retrying in {delay:.2f}s")
+            response.close()
+            time.sleep(delay)
+
+        self._record(url, response.status_code, attempt, started, len(response.content))
+        return response
+
+    def _record(self, url: str, status: Optional[int], attempts: int, started: float, size: int,
+                error: Optional[str] = None) -> None:
+        seconds = time.monotonic() - started
+        self.metrics.record(url, status, attempts, seconds, size, error)
+        logger.debug(f"GET {url} -> {status or error} in {seconds:.3f}s ({attempts} attempt(s), {size} bytes)")
+
+
+def collect_fetch_metrics():
+    """The shared fetch totals as Prometheus counters, read when /metrics is scraped"""
+    totals = fetch_metrics.totals()
+    return [
+        ('songs_fetch_requests_total', 'counter', 'Pages fetched over the network', [({}, totals['requests'])]),
+        ('songs_fetch_attempts_total', 'counter', 'HTTP attempts, including retries', [({}, totals['attempts'])]),
+        ('songs_fetch_retries_total', 'counter', 'HTTP attempts that were retries', [({}, totals['retries'])]),
+        ('songs_fetch_failures_total', 'counter', 'Fetches that ended in an error or error status',
+         [({}, totals['failures'])]),
+        ('songs_fetch_bytes_total', 'counter', 'Response bytes downloaded', [({}, totals['bytes'])]),
+        ('songs_fetch_seconds_total', 'counter', 'Seconds spent fetching, including retries and backoff',
+         [({}, totals['seconds'])]),
+        ('songs_fetch_responses_total', 'counter', 'Final HTTP responses by status code',
+         [({'status': status}, count) for status, count in sorted(totals['statuses'].items())]),
+    ]
+
+
+# Shared by every Fetcher, so both scrapers draw on one connection pool
+shared_session = create_session()
+fetch_metrics = FetchMetrics()
+registry.add_collector(collect_fetch_metrics)
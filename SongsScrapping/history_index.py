@@ -0,0 +1,151 @@
+import os
+import bisect
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+from metrics import json_duration
+import json_codec
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Storage paths
+HISTORY_INDEX_PATH = 'data/history_index.json'
+
+# Days shown per page of the history view
+HISTORY_DAYS_PER_PAGE = 10
+
+
+def song_day(song: Dict[str, Any]) -> Optional[str]:
+    """The day (YYYY-MM-DD, local time) a song was scraped, or None if unknown"""
+    timestamp = song.get('timestamp', 0)
+    if not timestamp:
+        return None
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+
+
+def title_key(song: Dict[str, Any]) -> str:
+    return song.get('title', '').lower()
+
+
+class HistoryIndex:
+    """
+    Songs grouped into daily buckets by scrape date.
+
+    Each bucket is kept sorted by (lowercase title, id) and the days are kept
+    sorted, so adding or editing a song is a bisect insert and a page of the
+    history view only touches the days it shows. The index is persisted
+    alongside the catalog and tagged with its file signature, like the
+    search index.
+    """
+    def __init__(self):
+        self.signature: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, List[Tuple[str, int]]] = {}
+        self._days: List[str] = []  # ascending
+        self._entries: Dict[int, Tuple[str, Tuple[str, int]]] = {}  # song id -> (day, bucket entry)
+
+    def rebuild(self, songs: List[Dict[str, Any]]) -> None:
+        """Group a full catalog into daily buckets"""
+        buckets: Dict[str, List[Tuple[str, int]]] = {}
+        entries = {}
+        for song in songs:
+            day = song_day(song)
+            if day is None:
+                continue
+            entry = (title_key(song), song.get('id'))
+            buckets.setdefault(day, []).append(entry)
+            entries[song.get('id')] = (day, entry)
+        for bucket in buckets.values():
+            bucket.sort()
+
+        with self._lock:
+            self._buckets = buckets
+            self._days = sorted(buckets)
+            self._entries = entries
+
+    # Updates
+
+    def add(self, song: Dict[str, Any]) -> None:
+        """Index a new song, or move an edited one to its new day and position"""
+        with self._lock:
+            self._remove(song.get('id'))
+            day = song_day(song)
+            if day is None:
+                return
+            entry = (title_key(song), song.get('id'))
+            bucket = self._buckets.get(day)
+            if bucket is None:
+                bucket = self._buckets[day] = []
+                bisect.insort(self._days, day)
+            bisect.insort(bucket, entry)
+            self._entries[song.get('id')] = (day, entry)
+
+    def remove(self, song_id: int) -> None:
+        with self._lock:
+            self._remove(song_id)
+
+    def _remove(self, song_id: int) -> None:
+        located = self._entries.pop(song_id, None)
+        if located is None:
+            return
+        day, entry = located
+        bucket = self._buckets[day]
+        position = bisect.bisect_left(bucket, entry)
+        if position < len(bucket) and bucket[position] == entry:
+            del bucket[position]
+        if not bucket:
+            del self._buckets[day]
+            del self._days[bisect.bisect_left(self._days, day)]
+
+    # Lookups
+
+    def days(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[Tuple[str, int]]:
+        """(day, song count) for days in the inclusive range, newest first"""
+        with self._lock:
+            low = 0 if start_date is None else bisect.bisect_left(self._days, start_date)
+            high = len(self._days) if end_date is None else bisect.bisect_right(self._days, end_date)
+            return [(day, len(self._buckets[day])) for day in reversed(self._days[low:high])]
+
+    def song_ids(self, day: str) -> List[int]:
+        """Ids of the songs scraped on a day, sorted by title"""
+        with self._lock:
+            return [song_id for _, song_id in self._buckets.get(day, [])]
+
+    # Persistence
+
+    def save(self, path: str = HISTORY_INDEX_PATH) -> None:
+        """Write the index to disk atomically"""
+        with self._lock:
+            data = {
+                'signature': list(self.signature) if self.signature else None,
+                'buckets': self._buckets,
+            }
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f, json_duration.time('dump', 'history_index'):
+                json_codec.dump(data, f, indent=False)
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = HISTORY_INDEX_PATH) -> Optional['HistoryIndex']:
+        """Read an index previously written with save(), or None if unavailable"""
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'rb') as f, json_duration.time('load', 'history_index'):
+                data = json_codec.load(f)
+        except Exception as e:
+            logger.error(f"Error loading history index: {str(e)}")
+            return None
+
+        index = cls()
+        index.signature = tuple(data['signature']) if data.get('signature') else None
+        for day, bucket in data['buckets'].items():
+            entries = [(title, song_id) for title, song_id in bucket]
+            index._buckets[day] = entries
+            for entry in entries:
+                index._entries[entry[1]] = (day, entry)
+        index._days = sorted(index._buckets)
+        return index
@@ -0,0 +1,207 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+import requests
+from typing import Dict, Any, Optional
+from metrics import json_duration, http_cache_lookups
+import json_codec
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Storage paths
+HTTP_CACHE_DIR = 'data/http_cache'
+
+# Constants
+CACHE_TTL = 6 * 60 * 60  # Seconds a cached page is served without revalidating
+MAX_CACHE_BYTES = 200 * 1024 * 1024  # Oldest entries are evicted beyond this size
+EVICTION_TARGET = 0.9  # Evict down to this fraction of MAX_CACHE_BYTES
+
+
+class HttpCache:
+    """
+    Persistent on-disk HTTP cache keyed by URL.
+
+    Each entry is a JSON file holding the body together with its ETag,
+    Last-Modified and fetch time. Entries younger than the TTL are served
+    without touching the network; older ones are revalidated with a
+    conditional request, and a 304 response just refreshes the fetch time.
+    The file mtime records the last use, and the least recently used entries
+    are evicted once the cache grows past max_bytes.
+    """
+    def __init__(self, directory: str = HTTP_CACHE_DIR, ttl: float = CACHE_TTL, max_bytes: int = MAX_CACHE_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes: Optional[Dict[str, int]] = None
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    # Entries
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry for a URL, or None"""
+        path = self._path(url)
+        try:
+            with open(path, 'rb') as f, json_duration.time('load', 'http_cache'):
+                entry = json_codec.load(f)
+            os.utime(path)  # Mark as recently used for eviction
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('url') == url else None
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get('fetched_at', 0) < self.ttl
+
+    def put(self, url: str, body: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> Dict[str, Any]:
+        """Store a response body and its validators"""
+        entry = {
+            'url': url,
+            'body': body,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': time.time(),
+        }
+        self._write(url, entry)
+        return entry
+
+    def refresh(self, url: str, entry: Dict[str, Any]) -> None:
+        """Record a successful revalidation (304) of an entry"""
+        entry['fetched_at'] = time.time()
+        self._write(url, entry)
+
+    @staticmethod
+    def conditional_headers(entry: Dict[str, Any]) -> Dict[str, str]:
+        """Headers that ask the server to reply 304 if the page is unchanged"""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    # Storage
+
+    def _write(self, url: str, entry: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f, json_duration.time('dump', 'http_cache'):
+                json_codec.dump(entry, f, indent=False)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.error(f"Error writing HTTP cache entry for {url}: {str(e)}")
+            return
+
+        with self._lock:
+            sizes = self._load_sizes()
+            sizes[path] = size
+            if sum(sizes.values()) > self.max_bytes:
+                self._evict(sizes)
+
+    def _load_sizes(self) -> Dict[str, int]:
+        """Sizes of all entries, scanned from disk once per process"""
+        if self._sizes is None:
+            self._sizes = {}
+            if os.path.isdir(self.directory):
+                for name in os.listdir(self.directory):
+                    if name.endswith('.json'):
+                        path = os.path.join(self.directory, name)
+                        try:
+                            self._sizes[path] = os.path.getsize(path)
+                        except OSError:
+                            pass
+        return self._sizes
+
+    def _evict(self, sizes: Dict[str, int]) -> None:
+        """Delete least recently used entries until under the target size"""
+        def last_used(path: str) -> float:
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return 0
+
+        total = sum(sizes.values())
+        target = self.max_bytes * EVICTION_TARGET
+        evicted = 0
+        for path in sorted(sizes, key=last_used):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= sizes.pop(path)
+            evicted += 1
+        logger.info(f"Evicted {evicted} HTTP cache entries")
+
+
+def response_text(response: requests.Response) -> str:
+    """
+    The decoded body of a response. Without a charset in Content-Type,
+    requests decodes HTML as ISO-8859-1, which mangles UTF-8 pages such as
+    the site's Hindi songs: those are decoded as UTF-8, or if that fails,
+    with the encoding detected from the content.
+    """
+    if 'charset=' in response.headers.get('Content-Type', '').lower():
+        return response.text
+    try:
+        return response.content.decode('utf-8')
+    except UnicodeDecodeError:
+        response.encoding = response.apparent_encoding
+        return response.text
+
+
+def cached_fetch(url: str, headers: Dict[str, str], timeout: float = 10, cache: Optional[HttpCache] = None,
+                 session: Any = requests) -> Optional[str]:
+    """
+    GET a page through the HTTP cache and return its body, or None on failure.
+
+    Fresh entries are returned without a request, stale ones are revalidated
+    with If-None-Match/If-Modified-Since, and if the server is unreachable a
+    stale copy is still better than nothing.
+    """
+    if cache is None:
+        cache = http_cache
+
+    entry = cache.get(url)
+    if entry is not None and cache.is_fresh(entry):
+        http_cache_lookups.inc('fresh')
+        return entry['body']
+
+    request_headers = dict(headers)
+    if entry is not None:
+        request_headers.update(cache.conditional_headers(entry))
+
+    try:
+        response = session.get(url, headers=request_headers, timeout=timeout)
+        if response.status_code == 304:
+            if entry is None:
+                # Nothing cached that it could refer to; its empty body isn't the page
+                logger.error(f"Unexpected 304 Not Modified for uncached {url}")
+                http_cache_lookups.inc('failed')
+                return None
+            cache.refresh(url, entry)
+            http_cache_lookups.inc('revalidated')
+            return entry['body']
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error making request to {url}: {str(e)}")
+        http_cache_lookups.inc('stale' if entry is not None else 'failed')
+        return entry['body'] if entry is not None else None
+
+    body = response_text(response)
+    cache.put(url, body, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    http_cache_lookups.inc('downloaded')
+    return body
+
+
+# Shared cache used by both scrapers
+http_cache = HttpCache()
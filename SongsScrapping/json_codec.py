@@ -0,0 +1,65 @@
+import os
+import json
+from collections.abc import Mapping
+from typing import Any, BinaryIO, Union
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard library json module is used instead
+    orjson = None
+
+# JSON backend for files and API responses: 'orjson' (used when installed) or 'stdlib'
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'orjson')
+
+# Files are written compact; set JSON_PRETTY=1 to indent them for reading by hand
+PRETTY_ON_DISK = os.environ.get('JSON_PRETTY', '0').lower() in ('1', 'true', 'yes')
+
+BACKEND = 'orjson' if orjson is not None and JSON_BACKEND == 'orjson' else 'stdlib'
+
+
+def _default(o: Any) -> Any:
+    # models.Song records serialize like the dicts they stand for
+    if isinstance(o, Mapping):
+        return dict(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """
+    Serialize to UTF-8 JSON bytes: compact unless indent, non-ASCII text
+    unescaped and non-string keys (e.g. song ids) written as strings, with
+    either backend
+    """
+    if BACKEND == 'orjson':
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_default, option=option)
+    return dumps(obj, indent, sort_keys).encode('utf-8')
+
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> str:
+    """Serialize to a JSON string; see dumps_bytes()"""
+    if BACKEND == 'orjson':
+        return dumps_bytes(obj, indent, sort_keys).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, default=_default, sort_keys=sort_keys,
+                      indent=2 if indent else None, separators=None if indent else (',', ':'))
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse JSON text or UTF-8 bytes"""
+    if BACKEND == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump(obj: Any, f: BinaryIO, indent: bool = PRETTY_ON_DISK) -> None:
+    """Write JSON to a file opened in binary mode, compact unless JSON_PRETTY is set"""
+    f.write(dumps_bytes(obj, indent))
+
+
+def load(f: BinaryIO) -> Any:
+    """Read JSON from a file opened in binary mode"""
+    return loads(f.read())
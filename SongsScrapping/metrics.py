@@ -0,0 +1,250 @@
+import os
+import time
+import bisect
+import logging
+import threading
+from typing import Dict, List, Any, Callable, Iterable, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Set METRICS_ENABLED=0 to turn instrumentation off: timers and counters
+# then return immediately and the request hooks are not installed
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+# Constants
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'  # Prometheus text exposition format
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _NullTimer:
+    """Timer handed out while metrics are disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('_histogram', '_labels', '_started')
+
+    def __init__(self, histogram: 'Histogram', labels: Tuple[Any, ...]):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._started, *self._labels)
+        return False
+
+
+class Counter:
+    """A monotonically increasing count per combination of label values"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[Any, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: Any, amount: float = 1) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """
+    Observed values (seconds) counted into cumulative buckets, with their
+    sum and count, per combination of label values
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: [per-bucket counts (last is +Inf), sum, count]
+        self._values: Dict[Tuple[Any, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: Any) -> None:
+        if not METRICS_ENABLED:
+            return
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][position] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels: Any):
+        """Context manager observing the seconds its block takes"""
+        if not METRICS_ENABLED:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items()]
+        for labels, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}"
+
+
+class Registry:
+    """
+    The metrics of the process, rendered in the Prometheus text format.
+
+    Besides counters and histograms updated on the hot paths, collectors
+    report values other components already keep (e.g. the fetcher's totals
+    or the response cache's hits and misses) when the metrics are scraped.
+    A collector returns (name, type, help, [(labels dict, value), ...]).
+    """
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collector in collectors:
+            try:
+                collected = list(collector())
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {str(e)}")
+                continue
+            for name, kind, documentation, samples in collected:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    names = tuple(labels)
+                    lines.append(f"{name}{_format_labels(names, tuple(labels[key] for key in names))} "
+                                 f"{_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by the web app and the scrapers
+registry = Registry()
+
+request_duration = registry.histogram(
+    'songs_http_request_duration_seconds', 'Time to handle a web request, by route, method and status',
+    ('route', 'method', 'status'))
+json_duration = registry.histogram(
+    'songs_json_duration_seconds', 'Time spent reading (load) or writing (dump) JSON, by file or payload',
+    ('operation', 'target'))
+search_duration = registry.histogram(
+    'songs_search_duration_seconds', 'Time to run a catalog search')
+template_duration = registry.histogram(
+    'songs_template_render_duration_seconds', 'Time to render a template', ('template',))
+scrape_stage_duration = registry.histogram(
+    'songs_scrape_stage_duration_seconds',
+    'Time spent per scrape stage: fetch is one page, parse one batch of pages, save one repository write',
+    ('stage',))
+http_cache_lookups = registry.counter(
+    'songs_http_cache_lookups_total',
+    'Pages requested through the HTTP cache, by how they were served: fresh, revalidated (304), '
+    'downloaded, stale (server unreachable) or failed',
+    ('result',))
+
+
+def init_app(app) -> None:
+    """Time every request and template render of a Flask app"""
+    if not METRICS_ENABLED:
+        return
+
+    from flask import g, request, before_render_template, template_rendered
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('metrics_request_started', None)
+        if started is not None:
+            # Streamed bodies are timed up to their first byte
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            request_duration.observe(time.perf_counter() - started, route, request.method, response.status_code)
+        return response
+
+    def start_render_timer(sender, template, context, **extra):
+        g.metrics_render_started = time.perf_counter()
+
+    def observe_render(sender, template, context, **extra):
+        started = g.pop('metrics_render_started', None)
+        if started is not None:
+            template_duration.observe(time.perf_counter() - started, template.name)
+
+    # Strong references: the handlers only live in this closure
+    before_render_template.connect(start_render_timer, app, weak=False)
+    template_rendered.connect(observe_render, app, weak=False)
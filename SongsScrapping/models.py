@@ -1,71 +1,290 @@
+import sys
+import zlib
+import hashlib
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from collections.abc import MutableMapping
+from typing import Dict, List, Any, Iterator, Optional
+from chords import lyrics_from_content
 
-class Song:
+# content_html strings at least this long are kept zlib-compressed in memory
+COMPRESS_MIN_CHARS = 1024
+
+# Song fields in their serialization order
+SONG_FIELDS = ('id', 'url', 'title', 'content', 'content_html', 'lyrics', 'chords', 'categories', 'timestamp')
+
+# Marks lyrics that equal lyrics_from_content(content)
+_DERIVED = object()
+
+_FIELD_BITS = {field: 1 << i for i, field in enumerate(SONG_FIELDS)}
+
+# Prefixes content hashes; bumped whenever content_hash changes what it hashes
+CONTENT_HASH_VERSION = 'v2'
+
+
+def content_hash(song: Dict[str, Any]) -> str:
+    """
+    Hash of what a scrape extracts from a song page (title, lyrics and
+    categories), used to tell whether a re-fetched page changed the song.
+
+    The lyrics are taken from the content without chord-only lines and all
+    whitespace is collapsed, so scraper.py's BeautifulSoup text and
+    simplified_scraper.py's trafilatura text of the same page hash alike.
+    """
+    digest = hashlib.sha256()
+    lyrics = lyrics_from_content(song.get('content') or '')
+    for part in (song.get('title') or '', lyrics, *(song.get('categories') or ())):
+        digest.update(' '.join(part.split()).encode('utf-8'))
+        digest.update(b'\0')
+    return f"{CONTENT_HASH_VERSION}:{digest.hexdigest()}"
+
+
+def stored_content_hash(song: Dict[str, Any]) -> str:
+    """
+    The song's stored content hash, or a fresh one if it has none or it was
+    stored by an older content_hash
+    """
+    stored = song.get('content_hash')
+    if stored and stored.startswith(f"{CONTENT_HASH_VERSION}:"):
+        return stored
+    return content_hash(song)
+
+
+class _Compressed(bytes):
+    """UTF-8 text stored zlib-compressed"""
+    __slots__ = ()
+
+
+def _pack(value: Any) -> Any:
+    if isinstance(value, str) and len(value) >= COMPRESS_MIN_CHARS:
+        return _Compressed(zlib.compress(value.encode('utf-8')))
+    return value
+
+
+def _unpack(value: Any) -> Any:
+    if isinstance(value, _Compressed):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+
+class Song(MutableMapping):
     """
-    Represents a song with lyrics and chords
+    Represents a song with lyrics and chords.
+
+    The record is compact enough to hold a whole catalog in each web worker:
+    it has no per-instance __dict__, category names are interned and stored
+    as a shared tuple, lyrics that can be derived from the content aren't
+    stored (song.lyrics caches them once read, song['lyrics'] doesn't),
+    long content_html is kept compressed until read, and chord positions
+    are held in tuples sharing interned chord names.
+
+    It also behaves like the song dict it was built from (song['title'],
+    song.get('lyrics'), dict(song), ...), so code written against plain
+    dicts keeps working. Fields missing from the source dict stay missing.
     """
+    __slots__ = ('id', 'url', 'title', '_content', '_content_html', '_lyrics', '_derived_lyrics', '_chords',
+                 '_categories', 'timestamp', 'extra', '_absent')
+
     def __init__(self, 
                  id: int, 
                  url: str, 
                  title: str, 
                  content: str,
                  content_html: str = "",
-                 lyrics: str = "",
+                 lyrics: Optional[str] = None,
+                 chords: Optional[List[List[Any]]] = None,
                  categories: List[str] = None,
                  timestamp: int = None):
+        self._absent = 0
+        self.extra: Optional[Dict[str, Any]] = None
         self.id = id
         self.url = url
         self.title = title
-        self.content = content
+        self._content = content or ''
+        self._lyrics = _DERIVED
+        self._derived_lyrics = None
         self.content_html = content_html
-        self.lyrics = lyrics
+        if lyrics is not None:
+            self.lyrics = lyrics
+        self.chords = chords or []
         self.categories = categories or []
         self.timestamp = timestamp or int(datetime.now().timestamp())
-    
+
+    # Fields
+
+    @property
+    def content(self) -> str:
+        return self._content
+
+    @content.setter
+    def content(self, value: str) -> None:
+        # Lyrics don't follow the content: keep the current text, re-checking
+        # whether it is still derivable from the new content
+        lyrics = self._peek_lyrics()
+        self._content = value
+        self._derived_lyrics = None
+        self._absent &= ~_FIELD_BITS['content']
+        if self._has('lyrics'):
+            self._lyrics = _DERIVED if lyrics == lyrics_from_content(value) else lyrics
+
+    @property
+    def content_html(self) -> str:
+        return _unpack(self._content_html)
+
+    @content_html.setter
+    def content_html(self, value: str) -> None:
+        self._content_html = _pack(value)
+        self._absent &= ~_FIELD_BITS['content_html']
+
+    def _derive_lyrics(self) -> str:
+        # Parsed from the content once, on first read of song.lyrics; the
+        # content setter clears it
+        if self._derived_lyrics is None:
+            self._derived_lyrics = lyrics_from_content(self._content)
+        return self._derived_lyrics
+
+    def _peek_lyrics(self) -> str:
+        # The lyrics without filling the cache
+        if self._lyrics is not _DERIVED:
+            return self._lyrics
+        if self._derived_lyrics is not None:
+            return self._derived_lyrics
+        return lyrics_from_content(self._content)
+
+    @property
+    def lyrics(self) -> str:
+        if self._lyrics is _DERIVED:
+            return self._derive_lyrics()
+        return self._lyrics
+
+    @lyrics.setter
+    def lyrics(self, value: str) -> None:
+        # Compared without caching, so loading a catalog doesn't keep every
+        # song's lyrics alive
+        derived = self._derived_lyrics if self._derived_lyrics is not None else lyrics_from_content(self._content)
+        self._lyrics = _DERIVED if value == derived else value
+        self._absent &= ~_FIELD_BITS['lyrics']
+
+    @property
+    def chords(self) -> List[List[Any]]:
+        return [[number, [[position, name] for position, name in line]] for number, line in self._chords]
+
+    @chords.setter
+    def chords(self, value: List[List[Any]]) -> None:
+        self._chords = tuple(
+            (number, tuple((position, sys.intern(name)) for position, name in line)) for number, line in value or ()
+        )
+        self._absent &= ~_FIELD_BITS['chords']
+
+    @property
+    def categories(self) -> List[str]:
+        return list(self._categories)
+
+    @categories.setter
+    def categories(self, value: List[str]) -> None:
+        # Interned so every song in a category shares the same string
+        self._categories = tuple(sys.intern(name) if isinstance(name, str) else name for name in value or ())
+        self._absent &= ~_FIELD_BITS['categories']
+
+    # Mapping interface
+
+    def _has(self, key: str) -> bool:
+        return not self._absent & _FIELD_BITS[key]
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _FIELD_BITS:
+            if not self._has(key):
+                raise KeyError(key)
+            if key == 'lyrics':
+                # Mapping reads are how whole-catalog passes see songs (index
+                # builds, saves, serialization), so they don't fill the cache;
+                # only song.lyrics, e.g. in templates, does
+                return self._peek_lyrics()
+            return getattr(self, key)
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in _FIELD_BITS:
+            setattr(self, key, value)
+            self._absent &= ~_FIELD_BITS[key]
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key in _FIELD_BITS:
+            if not self._has(key):
+                raise KeyError(key)
+            self._absent |= _FIELD_BITS[key]
+        elif self.extra is not None and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for key in SONG_FIELDS:
+            if self._has(key):
+                yield key
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"Song(id={self.id!r}, title={self.title!r})"
+
     def to_dict(self) -> Dict[str, Any]:
         """Convert the song to a dictionary for JSON serialization"""
-        return {
-            'id': self.id,
-            'url': self.url,
-            'title': self.title,
-            'content': self.content,
-            'content_html': self.content_html,
-            'lyrics': self.lyrics,
-            'categories': self.categories,
-            'timestamp': self.timestamp
-        }
-    
+        return dict(self)
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Song':
-        """Create a song instance from a dictionary"""
-        return cls(
-            id=data.get('id', 0),
-            url=data.get('url', ''),
-            title=data.get('title', 'Unknown'),
-            content=data.get('content', ''),
-            content_html=data.get('content_html', ''),
-            lyrics=data.get('lyrics', ''),
-            categories=data.get('categories', []),
-            timestamp=data.get('timestamp', int(datetime.now().timestamp()))
-        )
+        """
+        Create a song instance from a dictionary, keeping exactly the keys it
+        has (including ones that aren't song fields, e.g. 'error')
+        """
+        song = cls.__new__(cls)
+        song._absent = 0
+        song.id = data.get('id')
+        song.url = data.get('url', '')
+        song.title = data.get('title', '')
+        song._content = data.get('content', '')
+        song._content_html = _pack(data.get('content_html', ''))
+        song._lyrics = _DERIVED
+        song._derived_lyrics = None
+        if 'lyrics' in data:
+            song.lyrics = data['lyrics']
+        song.chords = data.get('chords', ())
+        song.categories = data.get('categories', ())
+        song.timestamp = data.get('timestamp', 0)
+        extra = {key: value for key, value in data.items() if key not in _FIELD_BITS}
+        song.extra = extra or None
+        for field in SONG_FIELDS:
+            if field not in data:
+                song._absent |= _FIELD_BITS[field]
+        return song
 
 
 class Category:
     """
     Represents a song category
     """
+    __slots__ = ('name', 'url')
+
     def __init__(self, name: str, url: str):
-        self.name = name
+        self.name = sys.intern(name)
         self.url = url
-    
+
     def to_dict(self) -> Dict[str, str]:
         """Convert the category to a dictionary for JSON serialization"""
         return {
             'name': self.name,
             'url': self.url
         }
-    
+
     @classmethod
     def from_dict(cls, data: Dict[str, str]) -> 'Category':
         """Create a category instance from a dictionary"""
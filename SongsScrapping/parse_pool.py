@@ -0,0 +1,137 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Any, Callable, Iterable, Iterator, Optional, Tuple
+from metrics import scrape_stage_duration
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+PARSE_WORKERS = os.cpu_count() or 1  # Worker processes; with one core pages are parsed in-process
+PARSE_CHUNK_SIZE = 4  # Pages sent to a worker process per task
+
+# Worker processes are started from a clean server process rather than
+# forked from the (threaded) web app
+PARSE_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    The process pool shared by all crawls, started on first use so worker
+    start-up is paid once per process. None when there is a single worker,
+    since parsing in-process is then cheaper than shipping pages around.
+    """
+    global _pool
+    if PARSE_WORKERS <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS,
+                                        mp_context=multiprocessing.get_context(PARSE_START_METHOD))
+        return _pool
+
+
+def _reset_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a pool whose worker died so the next call starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def chunks(items: List[Any], size: int) -> List[List[Any]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def timed_parse(func: Callable, *args) -> Tuple[float, Any]:
+    """
+    (seconds, result) of func(*args). Wraps work sent to a worker process so
+    the parent can record how long parsing took there.
+    """
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def _submit(parse_batch: Callable[[List[Any]], List[Any]], batch: List[Any]) -> Future:
+    pool = get_parse_pool()
+    if pool is not None:
+        try:
+            return pool.submit(timed_parse, parse_batch, batch)
+        except (BrokenProcessPool, RuntimeError) as e:
+            logger.error(f"Parse pool unavailable, parsing in-process: {str(e)}")
+            _reset_pool(pool)
+    future = Future()
+    try:
+        future.set_result(timed_parse(parse_batch, batch))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _result(future: Future, parse_batch: Callable[[List[Any]], List[Any]], batch: List[Any]) -> List[Any]:
+    try:
+        seconds, results = future.result()
+    except BrokenProcessPool as e:
+        # A worker was killed (e.g. out of memory); parse this batch here
+        logger.error(f"Parse worker died, parsing in-process: {str(e)}")
+        pool = get_parse_pool()
+        if pool is not None:
+            _reset_pool(pool)
+        seconds, results = timed_parse(parse_batch, batch)
+    scrape_stage_duration.observe(seconds, 'parse')
+    return results
+
+
+def map_batches(parse_batch: Callable[[List[Any]], List[Any]], items: List[Any],
+                chunk_size: int = PARSE_CHUNK_SIZE) -> List[Any]:
+    """
+    Run parse_batch over items chunk_size at a time in the parse pool and
+    return all results in input order. parse_batch takes a list of items and
+    returns one result per item; it must be a module-level function so it
+    can be sent to a worker process.
+    """
+    batches = chunks(items, chunk_size)
+    futures = [_submit(parse_batch, batch) for batch in batches]
+    results = []
+    for future, batch in zip(futures, batches):
+        results.extend(_result(future, parse_batch, batch))
+    return results
+
+
+def fetch_and_parse(items: Iterable[Any], fetch: Callable[[Any], Any], parse_batch: Callable[[List[Any]], List[Any]],
+                    fetch_workers: int, chunk_size: int = PARSE_CHUNK_SIZE) -> Iterator[Any]:
+    """
+    Two-stage pipeline: fetch(item) runs in a pool of fetch_workers I/O
+    threads, and as soon as chunk_size fetched pages are ready they are
+    handed to parse_batch in the parse pool. Fetching and parsing overlap, so
+    throughput scales with the number of cores rather than being bound by one
+    thread holding the GIL. Results are yielded in input order.
+    """
+    with ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+        pending = deque()
+        batch = []
+        # map() fetches ahead in the background and yields in submission order
+        for fetched in executor.map(fetch, items):
+            batch.append(fetched)
+            if len(batch) >= chunk_size:
+                pending.append((_submit(parse_batch, batch), batch))
+                batch = []
+            while pending and pending[0][0].done():
+                future, parsed_batch = pending.popleft()
+                yield from _result(future, parse_batch, parsed_batch)
+        if batch:
+            pending.append((_submit(parse_batch, batch), batch))
+        while pending:
+            future, parsed_batch = pending.popleft()
+            yield from _result(future, parse_batch, parsed_batch)
@@ -0,0 +1,264 @@
+import os
+import re
+import sys
+import hmac
+import time
+import pstats
+import logging
+import cProfile
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Storage paths
+PROFILES_DIR = 'data/profiles'
+
+# Profiling is only offered to requests carrying this token in the
+# X-Admin-Token header; without it set, profiling is disabled
+ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN')
+
+# Constants
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples of all threads
+MAX_STACK_DEPTH = 128  # Frames kept per sampled stack, innermost first
+MAX_PROFILES = 200  # Oldest profiles are deleted beyond this
+SUMMARY_LINES = 40  # Functions listed in the text summary next to a cProfile dump
+
+# Profile modes: deterministic cProfile of one thread, or periodic samples of all threads
+CPROFILE = 'cprofile'
+SAMPLE = 'sample'
+
+# Output formats by file extension
+PROFILE_FORMATS = {
+    '.prof': 'pstats',  # cProfile stats: python -m pstats, snakeviz, gprof2dot, flameprof
+    '.txt': 'summary',  # Top functions by cumulative time
+    '.folded': 'folded',  # Collapsed stacks: flamegraph.pl, speedscope, inferno
+}
+
+
+def is_admin(token: Optional[str]) -> bool:
+    """Whether a token grants access to profiling"""
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def profile_name(kind: str, label: str) -> str:
+    """A unique, sortable file name stem for a profile, e.g. 20240519-101500-123456-request-get-song-41"""
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', label).strip('-').lower()[:60] or 'root'
+    return f"{datetime.now():%Y%m%d-%H%M%S-%f}-{kind}-{slug}"
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_name}:{frame.f_lineno}"
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread in the process at a fixed interval
+    from a background thread, so work spread over thread pools (fetch
+    workers, asyncio.to_thread, ...) shows up, unlike with cProfile which
+    only follows the thread that enabled it. The output is in the collapsed
+    stack format read by flame graph tools: one line per distinct stack,
+    root first, followed by its sample count.
+    """
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self._stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+
+class Profile:
+    """
+    One profiling session: start(), run the code, stop(). stop() writes the
+    output to PROFILES_DIR and returns the file names.
+
+    cprofile mode writes <name>.prof (pstats) and a <name>.txt summary;
+    sample mode writes <name>.folded. Profiling a scrape uses both, since
+    its work is spread over threads.
+    """
+    def __init__(self, kind: str, label: str, modes: Tuple[str, ...] = (CPROFILE,)):
+        self.name = profile_name(kind, label)
+        self.label = label
+        self.modes = modes
+        self._profiler: Optional[cProfile.Profile] = cProfile.Profile() if CPROFILE in modes else None
+        self._sampler: Optional[SamplingProfiler] = SamplingProfiler() if SAMPLE in modes else None
+        self._started = 0.0
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        if self._sampler is not None:
+            self._sampler.start()
+        if self._profiler is not None:
+            self._profiler.enable()
+
+    def stop(self) -> List[str]:
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        seconds = time.perf_counter() - self._started
+
+        files = []
+        try:
+            os.makedirs(PROFILES_DIR, exist_ok=True)
+            if self._profiler is not None:
+                files.append(self._write_pstats())
+                files.append(self._write_summary(seconds))
+            if self._sampler is not None:
+                files.append(self._write_folded())
+            prune_profiles()
+        except Exception as e:
+            logger.error(f"Error saving profile {self.name}: {str(e)}")
+        logger.info(f"Profiled {self.label} in {seconds:.3f}s: {', '.join(files)}")
+        return files
+
+    def _write_pstats(self) -> str:
+        file_name = f"{self.name}.prof"
+        self._profiler.dump_stats(os.path.join(PROFILES_DIR, file_name))
+        return file_name
+
+    def _write_summary(self, seconds: float) -> str:
+        file_name = f"{self.name}.txt"
+        with open(os.path.join(PROFILES_DIR, file_name), 'w', encoding='utf-8') as f:
+            f.write(f"{self.label}\nWall time: {seconds:.4f}s\n\n")
+            stats = pstats.Stats(self._profiler, stream=f)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(SUMMARY_LINES)
+        return file_name
+
+    def _write_folded(self) -> str:
+        file_name = f"{self.name}.folded"
+        with open(os.path.join(PROFILES_DIR, file_name), 'w', encoding='utf-8') as f:
+            f.write(self._sampler.folded())
+        return file_name
+
+
+def profile_call(kind: str, label: str, func: Callable, *args, modes: Tuple[str, ...] = (CPROFILE,),
+                 **kwargs) -> Tuple[Any, List[str]]:
+    """Run func(*args, **kwargs) under a profile; returns (its result, profile files)"""
+    profile = Profile(kind, label, modes)
+    profile.start()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        files = profile.stop()
+    return result, files
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Saved profile files, newest first"""
+    if not os.path.isdir(PROFILES_DIR):
+        return []
+    profiles = []
+    for file_name in os.listdir(PROFILES_DIR):
+        stem, extension = os.path.splitext(file_name)
+        if extension not in PROFILE_FORMATS:
+            continue
+        try:
+            stat = os.stat(os.path.join(PROFILES_DIR, file_name))
+        except OSError:
+            continue
+        parts = stem.split('-', 4)
+        profiles.append({
+            'file': file_name,
+            'name': stem,
+            'kind': parts[3] if len(parts) > 3 else None,
+            'format': PROFILE_FORMATS[extension],
+            'bytes': stat.st_size,
+            'created_at': stat.st_mtime,
+        })
+    profiles.sort(key=lambda profile: profile['file'], reverse=True)
+    return profiles
+
+
+def profile_path(file_name: str) -> Optional[str]:
+    """Path of a saved profile file, or None if the name isn't one"""
+    if os.path.basename(file_name) != file_name or os.path.splitext(file_name)[1] not in PROFILE_FORMATS:
+        return None
+    path = os.path.join(PROFILES_DIR, file_name)
+    return path if os.path.isfile(path) else None
+
+
+def prune_profiles(max_profiles: int = MAX_PROFILES) -> None:
+    """Delete the oldest profile files beyond max_profiles"""
+    files = sorted(name for name in os.listdir(PROFILES_DIR) if os.path.splitext(name)[1] in PROFILE_FORMATS)
+    for file_name in files[:max(len(files) - max_profiles, 0)]:
+        try:
+            os.remove(os.path.join(PROFILES_DIR, file_name))
+        except OSError:
+            pass
+
+
+def init_app(app) -> None:
+    """
+    Let admins profile single requests of a Flask app: a request with the
+    X-Admin-Token header and either an X-Profile header or a ?profile= query
+    flag ('1'/'true' or 'cprofile' for cProfile, 'sample' for the sampling
+    profiler) runs under the profiler, bypasses the response cache and gets
+    the saved files' names back in X-Profile-Files.
+    """
+    from flask import g, request
+
+    def requested_modes() -> Optional[Tuple[str, ...]]:
+        flag = (request.headers.get('X-Profile') or request.args.get('profile') or '').lower()
+        if not flag or flag in ('0', 'false', 'no'):
+            return None
+        if not is_admin(request.headers.get('X-Admin-Token')):
+            return None
+        return (SAMPLE,) if flag == SAMPLE else (CPROFILE,)
+
+    @app.before_request
+    def start_profile():
+        if not ADMIN_TOKEN:
+            return
+        modes = requested_modes()
+        if modes is not None:
+            g.bypass_response_cache = True
+            g.profile = Profile('request', f"{request.method} {request.path}", modes)
+            g.profile.start()
+
+    @app.after_request
+    def stop_profile(response):
+        profile = g.pop('profile', None)
+        if profile is not None:
+            response.headers['X-Profile-Files'] = ','.join(profile.stop())
+        return response
+
+    @app.teardown_request
+    def discard_profile(exc):
+        # The request failed before after_request ran
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile.stop()
@@ -0,0 +1,33 @@
+import time
+import threading
+from typing import Dict
+from urllib.parse import urlparse
+
+
+class HostRateLimiter:
+    """
+    Thread-safe limiter that spaces out requests to the same host.
+
+    Each call to wait() reserves the next free slot for the URL's host and
+    sleeps until it arrives, so concurrent workers share one request budget
+    per host while requests to different hosts don't hold each other up.
+    """
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot: Dict[str, float] = {}
+
+    def wait(self, url: str) -> None:
+        """Block until a request to the URL's host is allowed"""
+        if self.min_interval <= 0:
+            return
+
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,170 @@
+import threading
+from typing import Dict, List, Any, Iterable, Optional, Tuple, FrozenSet
+from search_index import tokenize
+
+# Constants
+RELATED_LIMIT = 5  # Related songs kept per song
+MAX_RELATED_CANDIDATES = 200  # Category matches re-ranked by lyrics when there is no cached index
+
+
+def lyric_terms(song: Dict[str, Any]) -> FrozenSet[str]:
+    """Distinct words of a song's lyrics (or content when it has no lyrics)"""
+    return frozenset(tokenize(song.get('lyrics') or song.get('content', '')))
+
+
+def lyric_similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Jaccard similarity of two word sets"""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def rank_related(song: Dict[str, Any], candidates: Iterable[Dict[str, Any]], limit: int = RELATED_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Rank candidate songs against a song by shared categories, then lyric
+    similarity, best first
+    """
+    categories = frozenset(category.lower() for category in song.get('categories', []))
+    terms = lyric_terms(song)
+
+    def sort_key(candidate: Dict[str, Any]) -> Tuple[int, float, int]:
+        overlap = len(categories & {category.lower() for category in candidate.get('categories', [])})
+        return -overlap, -lyric_similarity(terms, lyric_terms(candidate)), candidate.get('id', 0)
+
+    return sorted((candidate for candidate in candidates if candidate.get('id') != song.get('id')), key=sort_key)[:limit]
+
+
+class RelatedSongsIndex:
+    """
+    Ranked related songs for every song.
+
+    Candidates are the songs sharing at least one category, ranked by the
+    number of shared categories and then by lyric similarity. A song's list
+    is computed the first time it is asked for and cached; when songs are
+    added or edited, cached lists are patched with the new scores instead of
+    being recomputed, so a song page only pays for a dictionary lookup.
+    """
+    def __init__(self, limit: int = RELATED_LIMIT):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._categories: Dict[int, FrozenSet[str]] = {}
+        self._terms: Dict[int, FrozenSet[str]] = {}
+        self._by_category: Dict[str, set] = {}
+        # song id -> ranked [(score, id)], and the reverse: id -> songs listing it
+        self._related: Dict[int, List[Tuple[Tuple[int, float], int]]] = {}
+        self._listed_by: Dict[int, set] = {}
+
+    def rebuild(self, songs: Iterable[Dict[str, Any]]) -> None:
+        """Index a full catalog, dropping every cached list"""
+        with self._lock:
+            self._categories = {}
+            self._terms = {}
+            self._by_category = {}
+            self._related = {}
+            self._listed_by = {}
+            for song in songs:
+                self._index(song)
+
+    # Updates
+
+    def add(self, song: Dict[str, Any]) -> None:
+        """Index a new or edited song and patch the cached lists it affects"""
+        song_id = song.get('id')
+        with self._lock:
+            stale = set(self._listed_by.get(song_id, ()))
+            self._unindex(song_id)
+            self._index(song)
+
+            # Lists that held the old version may now rank it differently
+            for other_id in stale:
+                self._drop_list(other_id)
+
+            for other_id in self._candidates(song_id):
+                if other_id in self._related:
+                    self._offer(other_id, song_id)
+
+    def remove(self, song_id: int) -> None:
+        """Drop a deleted song; lists that contained it are recomputed on demand"""
+        with self._lock:
+            stale = set(self._listed_by.get(song_id, ()))
+            self._unindex(song_id)
+            for other_id in stale:
+                self._drop_list(other_id)
+
+    # Lookups
+
+    def related(self, song_id: int, limit: Optional[int] = None) -> List[int]:
+        """Ids of the songs most related to a song, best first"""
+        with self._lock:
+            ranked = self._related.get(song_id)
+            if ranked is None:
+                if song_id not in self._categories:
+                    return []
+                ranked = self._compute(song_id)
+            return [other_id for _, other_id in ranked[:limit or self.limit]]
+
+    # Internals
+
+    def _index(self, song: Dict[str, Any]) -> None:
+        song_id = song.get('id')
+        categories = frozenset(category.lower() for category in song.get('categories', []))
+        self._categories[song_id] = categories
+        self._terms[song_id] = lyric_terms(song)
+        for category in categories:
+            self._by_category.setdefault(category, set()).add(song_id)
+
+    def _unindex(self, song_id: int) -> None:
+        for category in self._categories.pop(song_id, ()):
+            members = self._by_category.get(category)
+            if members is not None:
+                members.discard(song_id)
+                if not members:
+                    del self._by_category[category]
+        self._terms.pop(song_id, None)
+        self._drop_list(song_id)
+        self._listed_by.pop(song_id, None)
+
+    def _drop_list(self, song_id: int) -> None:
+        """Forget a cached list and its reverse entries"""
+        for _, other_id in self._related.pop(song_id, ()):
+            listers = self._listed_by.get(other_id)
+            if listers is not None:
+                listers.discard(song_id)
+
+    def _candidates(self, song_id: int) -> set:
+        candidates = set()
+        for category in self._categories.get(song_id, ()):
+            candidates |= self._by_category.get(category, set())
+        candidates.discard(song_id)
+        return candidates
+
+    def _score(self, song_id: int, other_id: int) -> Tuple[int, float]:
+        overlap = len(self._categories[song_id] & self._categories[other_id])
+        return overlap, lyric_similarity(self._terms[song_id], self._terms[other_id])
+
+    @staticmethod
+    def _sort_key(entry: Tuple[Tuple[int, float], int]) -> Tuple[int, float, int]:
+        (overlap, similarity), other_id = entry
+        return -overlap, -similarity, other_id
+
+    def _compute(self, song_id: int) -> List[Tuple[Tuple[int, float], int]]:
+        ranked = sorted(((self._score(song_id, other_id), other_id) for other_id in self._candidates(song_id)),
+                        key=self._sort_key)[:self.limit]
+        self._related[song_id] = ranked
+        for _, other_id in ranked:
+            self._listed_by.setdefault(other_id, set()).add(song_id)
+        return ranked
+
+    def _offer(self, song_id: int, candidate_id: int) -> None:
+        """Insert a new or edited song into a cached list if it ranks high enough"""
+        ranked = self._related[song_id]
+        entry = (self._score(song_id, candidate_id), candidate_id)
+        if len(ranked) >= self.limit and self._sort_key(entry) >= self._sort_key(ranked[-1]):
+            return
+        ranked.append(entry)
+        ranked.sort(key=self._sort_key)
+        self._listed_by.setdefault(candidate_id, set()).add(song_id)
+        for _, dropped_id in ranked[self.limit:]:
+            self._listed_by.get(dropped_id, set()).discard(song_id)
+        del ranked[self.limit:]
@@ -0,0 +1,126 @@
+import hashlib
+import logging
+import functools
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional, Tuple
+from flask import g, request, session, make_response, current_app
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+MAX_CACHED_RESPONSES = 256  # Least recently used responses are evicted beyond this
+MAX_CACHED_BODY_BYTES = 8 * 1024 * 1024  # Larger responses are not cached
+
+# Headers that belong to a single response and are never replayed from the cache
+UNCACHED_HEADERS = ('Content-Length', 'Set-Cookie', 'ETag', 'Cache-Control', 'Vary')
+
+
+class ResponseCache:
+    """
+    LRU cache of rendered GET responses for the Flask app.
+
+    Entries are keyed on the endpoint, view arguments and query string and
+    tagged with the catalog version they were rendered from. Every write to
+    the catalog moves the version, which empties the cache, so a stale page
+    is never served. Each response carries an ETag (a hash of its body) and
+    Cache-Control: no-cache, so browsers revalidate and get a 304 without the
+    page being rendered or sent again.
+    """
+    def __init__(self, version: Callable[[], Any], max_entries: int = MAX_CACHED_RESPONSES,
+                 max_body_bytes: int = MAX_CACHED_BODY_BYTES):
+        self._version = version
+        self.max_entries = max_entries
+        self.max_body_bytes = max_body_bytes
+        self._entries: 'OrderedDict[Tuple, Dict[str, Any]]' = OrderedDict()
+        self._entries_version: Any = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self, view: Callable) -> Callable:
+        """Decorator for GET views whose output depends only on the catalog and request"""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            # Pending flash messages are rendered into the page once, so those
+            # requests are served fresh, as are requests being profiled
+            if request.method != 'GET' or session.get('_flashes') or g.get('bypass_response_cache'):
+                return view(*args, **kwargs)
+
+            try:
+                version = self._version()
+            except Exception as e:
+                logger.error(f"Error reading catalog version: {str(e)}")
+                return view(*args, **kwargs)
+
+            key = (request.endpoint, tuple(sorted(kwargs.items())), tuple(sorted(request.args.items(multi=True))))
+            entry = self._get(key, version)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if not self._cacheable(response):
+                    return response
+                entry = self._put(key, version, response)
+            return self._respond(entry)
+        return wrapper
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def collect_metrics(self):
+        """Hits, misses and cached entries as Prometheus metrics, read when /metrics is scraped"""
+        with self._lock:
+            hits, misses, entries = self.hits, self.misses, len(self._entries)
+        return [
+            ('songs_response_cache_hits_total', 'counter', 'Responses served from the response cache',
+             [({}, hits)]),
+            ('songs_response_cache_misses_total', 'counter', 'Cacheable responses that had to be rendered',
+             [({}, misses)]),
+            ('songs_response_cache_entries', 'gauge', 'Responses currently cached', [({}, entries)]),
+        ]
+
+    # Entries
+
+    def _get(self, key: Tuple, version: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if version != self._entries_version:
+                # The catalog changed: nothing cached so far is valid
+                self._entries.clear()
+                self._entries_version = version
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _cacheable(self, response) -> bool:
+        # A view that flashed a message or touched the session rendered
+        # something specific to this visitor
+        return (response.status_code == 200 and not response.is_streamed and not session.modified
+                and response.content_length is not None and response.content_length <= self.max_body_bytes)
+
+    def _put(self, key: Tuple, version: Any, response) -> Dict[str, Any]:
+        body = response.get_data()
+        entry = {
+            'body': body,
+            'headers': [(name, value) for name, value in response.headers.items() if name not in UNCACHED_HEADERS],
+            'etag': hashlib.sha1(body).hexdigest(),
+        }
+        with self._lock:
+            # Only keep it if the catalog didn't move while the view was rendering
+            if version == self._entries_version:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _respond(entry: Dict[str, Any]):
+        response = current_app.response_class(entry['body'], headers=entry['headers'])
+        response.set_etag(entry['etag'])
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
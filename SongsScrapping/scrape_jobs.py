@@ -0,0 +1,356 @@
+import os
+import re
+import time
+import uuid
+import fcntl
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+import simplified_scraper as scraper
+import async_scraper
+from crawl_frontier import DEFAULT_CRAWL_DEPTH
+from profiler import profile_call, CPROFILE, SAMPLE
+import song_refresh
+from song_refresh import REFRESH_MIN_AGE, DEFAULT_REFRESH_SONGS
+from song_store import atomic_write_json
+import json_codec
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Storage paths
+SCRAPE_JOBS_DIR = 'data/scrape_jobs'  # A status file per job, shared by all web workers
+REFRESH_LOCK_PATH = 'data/refresh_scheduler.lock'
+
+# Constants
+MAX_RUNNING_JOBS = 2  # Crawls executed at the same time; the rest wait in the queue
+MAX_TRACKED_JOBS = 50  # Finished jobs kept around for status queries
+DEFAULT_MAX_SONGS = 100  # New songs per job when the request doesn't say
+MAX_SONGS_PER_JOB = 5000
+JOB_SAVE_INTERVAL = 1.0  # Seconds between saves of a running job's progress
+JOB_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+# Engine for page scrapes: 'threads' (simplified_scraper) or 'async' (async_scraper)
+SCRAPER_ENGINE = os.environ.get('SCRAPER_ENGINE', 'threads')
+
+# Seconds between scheduled refresh runs of known songs; 0 disables the schedule
+REFRESH_INTERVAL = float(os.environ.get('SONG_REFRESH_INTERVAL', 0))
+
+
+class ScrapeJob:
+    """
+    A scrape running in the background and its progress counters.
+
+    scrape_site(), crawl_site() and refresh_songs() report progress through
+    the record_* methods and poll is_cancelled() between pages.
+
+    The job's status is saved to a JSON file (on each state change, and at
+    most every JOB_SAVE_INTERVAL seconds while it makes progress), and it is
+    cancelled by creating a marker file next to it, so a web worker other
+    than the one running it can report on it and cancel it.
+    """
+    def __init__(self, url: str, max_songs: int, follow_links: bool, concurrency: int,
+                 full_site: bool = False, max_depth: int = DEFAULT_CRAWL_DEPTH, profile: bool = False,
+                 refresh: bool = False, min_age: float = REFRESH_MIN_AGE):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.max_songs = max_songs
+        self.follow_links = follow_links
+        self.concurrency = concurrency
+        self.full_site = full_site
+        self.max_depth = max_depth
+        self.profile = profile
+        self.profile_files: List[str] = []
+        self.refresh = refresh
+        self.min_age = min_age
+
+        self.status = QUEUED
+        self.message = 'Waiting to start'
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        self.urls_queued = 0
+        self.urls_fetched = 0
+        self.urls_failed = 0
+        self.songs_saved = 0
+
+        # Status file and cancel marker, set by the job manager
+        self.path: Optional[str] = None
+        self.cancel_path: Optional[str] = None
+        self._saved_at = 0.0
+
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._cancel_event = threading.Event()
+
+    @classmethod
+    def load(cls, path: str, cancel_path: str) -> Optional['ScrapeJob']:
+        """A job as last saved by the worker running it, or None if there is no such job"""
+        try:
+            with open(path, 'rb') as f:
+                data = json_codec.load(f)
+        except (OSError, ValueError):
+            return None
+        job = cls(data['url'], data['max_songs'], data['follow_links'], data['concurrency'], data['full_site'],
+                  data['max_depth'], data['profile'], data['refresh'], data['min_age'])
+        for field in ('id', 'status', 'message', 'profile_files', 'created_at', 'started_at', 'finished_at',
+                      'urls_queued', 'urls_fetched', 'urls_failed', 'songs_saved'):
+            setattr(job, field, data[field])
+        job.path = path
+        job.cancel_path = cancel_path
+        return job
+
+    def save(self) -> None:
+        """Write the job's status file, if it has one"""
+        if self.path is None:
+            return
+        with self._save_lock:
+            self._saved_at = time.time()
+            try:
+                atomic_write_json(self.path, self.to_dict(), target='scrape_job', indent=False)
+            except OSError as e:
+                logger.error(f"Error saving scrape job {self.id}: {str(e)}")
+
+    def _save_progress(self) -> None:
+        if time.time() - self._saved_at >= JOB_SAVE_INTERVAL:
+            self.save()
+
+    # Progress reporting
+
+    def record_queued(self, count: int) -> None:
+        """Song URLs added to the fetch queue"""
+        with self._lock:
+            self.urls_queued += count
+        self._save_progress()
+
+    def record_fetch(self, success: bool) -> None:
+        """A song page finished downloading"""
+        with self._lock:
+            if success:
+                self.urls_fetched += 1
+            else:
+                self.urls_failed += 1
+        self._save_progress()
+
+    def record_saved(self, count: int) -> None:
+        """New songs written to the catalog"""
+        with self._lock:
+            self.songs_saved += count
+        self._save_progress()
+
+    # Cancellation
+
+    def cancel(self) -> None:
+        """Ask the running scrape to stop after the pages in flight"""
+        self._cancel_event.set()
+        if self.cancel_path is not None:
+            # Seen by the worker running the job when that is another process
+            try:
+                open(self.cancel_path, 'a').close()
+            except OSError as e:
+                logger.error(f"Error cancelling scrape job {self.id}: {str(e)}")
+
+    def is_cancelled(self) -> bool:
+        if not self._cancel_event.is_set() and self.cancel_path is not None and os.path.exists(self.cancel_path):
+            self._cancel_event.set()
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the job to a dictionary for JSON serialization"""
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0
+            return {
+                'id': self.id,
+                'url': self.url,
+                'status': self.status,
+                'message': self.message,
+                'max_songs': self.max_songs,
+                'follow_links': self.follow_links,
+                'concurrency': self.concurrency,
+                'full_site': self.full_site,
+                'max_depth': self.max_depth,
+                'refresh': self.refresh,
+                'min_age': self.min_age,
+                'profile': self.profile,
+                'profile_files': list(self.profile_files),
+                'urls_queued': self.urls_queued,
+                'urls_fetched': self.urls_fetched,
+                'urls_failed': self.urls_failed,
+                'songs_saved': self.songs_saved,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'elapsed_seconds': round(elapsed, 2),
+                'pages_per_second': round((self.urls_fetched + self.urls_failed) / elapsed, 2) if elapsed else 0,
+            }
+
+
+class ScrapeJobManager:
+    """
+    Runs scrape jobs on a bounded background executor and keeps their status.
+
+    Jobs run in the process that queued them, but their status files under
+    `directory` let every web worker answer status queries and cancel
+    requests for jobs running in any of them.
+    """
+    def __init__(self, max_workers: int = MAX_RUNNING_JOBS, directory: str = SCRAPE_JOBS_DIR):
+        self.directory = directory
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scrape-job')
+        self._jobs: 'OrderedDict[str, ScrapeJob]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _paths(self, job_id: str) -> Tuple[str, str]:
+        """A job's status file and cancel marker"""
+        return os.path.join(self.directory, f"{job_id}.json"), os.path.join(self.directory, f"{job_id}.cancel")
+
+    def submit(self, url: str, max_songs: int, follow_links: bool = False,
+               concurrency: int = scraper.DEFAULT_CONCURRENCY, full_site: bool = False,
+               max_depth: int = DEFAULT_CRAWL_DEPTH, profile: bool = False, refresh: bool = False,
+               min_age: float = REFRESH_MIN_AGE) -> ScrapeJob:
+        """
+        Queue a scrape (a resumable full-site crawl, or with refresh a re-check
+        of up to max_songs known songs not checked for min_age seconds) and
+        return its job immediately. With profile, the run is profiled into
+        data/profiles/.
+        """
+        job = ScrapeJob(url, max_songs, follow_links, concurrency, full_site, max_depth, profile, refresh, min_age)
+        job.path, job.cancel_path = self._paths(job.id)
+        os.makedirs(self.directory, exist_ok=True)
+        job.save()
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        logger.info(f"Queued scrape job {job.id} for {url}")
+        return job
+
+    def get(self, job_id: str) -> Optional[ScrapeJob]:
+        """A job of this process, or as last saved by the worker running it"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and JOB_ID_PATTERN.fullmatch(job_id):
+            job = ScrapeJob.load(*self._paths(job_id))
+        return job
+
+    def cancel(self, job_id: str) -> Optional[ScrapeJob]:
+        """Cancel a job; queued jobs never start, running ones stop early"""
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel()
+        return job
+
+    def _prune(self) -> None:
+        """Forget the oldest finished jobs beyond MAX_TRACKED_JOBS, with their files"""
+        excess = len(self._jobs) - MAX_TRACKED_JOBS
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][:max(excess, 0)]:
+            del self._jobs[job_id]
+
+        # Including those of other workers; jobs still running are kept
+        try:
+            paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                     if name.endswith('.json')]
+            paths.sort(key=os.path.getmtime)
+        except OSError:
+            return
+        for path in paths[:max(len(paths) - MAX_TRACKED_JOBS, 0)]:
+            job = ScrapeJob.load(path, os.path.splitext(path)[0] + '.cancel')
+            if job is not None and not job.finished:
+                continue
+            for stale_path in (path, os.path.splitext(path)[0] + '.cancel'):
+                try:
+                    os.remove(stale_path)
+                except OSError:
+                    pass
+
+    def _run(self, job: ScrapeJob) -> None:
+        if job.is_cancelled():
+            job.status = CANCELLED
+            job.message = 'Cancelled before starting'
+            job.finished_at = time.time()
+            job.save()
+            return
+
+        job.status = RUNNING
+        job.message = 'Scraping in progress'
+        job.started_at = time.time()
+        job.save()
+        try:
+            if job.profile:
+                # cProfile follows the job's own thread; the sampler also
+                # catches the fetch workers
+                result, job.profile_files = profile_call('scrape', job.url, self._scrape, job,
+                                                         modes=(CPROFILE, SAMPLE))
+            else:
+                result = self._scrape(job)
+            job.result = result
+            job.message = result.get('message', '')
+            if job.is_cancelled():
+                job.status = CANCELLED
+            elif result.get('success'):
+                job.status = COMPLETED
+            else:
+                job.status = FAILED
+        except Exception as e:
+            logger.error(f"Scrape job {job.id} failed: {str(e)}")
+            job.status = FAILED
+            job.message = f"An error occurred during scraping: {str(e)}"
+        finally:
+            job.finished_at = time.time()
+            job.save()
+
+    @staticmethod
+    def _scrape(job: ScrapeJob) -> Dict[str, Any]:
+        if job.refresh:
+            return song_refresh.refresh_songs(job.max_songs, job.min_age, job.concurrency, job=job)
+        if job.full_site:
+            return scraper.crawl_site(job.url, job.max_songs, job.max_depth, job.concurrency, job=job)
+        if SCRAPER_ENGINE == 'async':
+            return async_scraper.scrape_site(job.url, job.max_songs, job.follow_links, job.concurrency, job=job)
+        return scraper.scrape_site(job.url, job.max_songs, job.follow_links, job.concurrency, job=job)
+
+    def schedule_refresh(self, interval: float, max_songs: int = DEFAULT_REFRESH_SONGS,
+                         lock_path: str = REFRESH_LOCK_PATH) -> None:
+        """
+        Queue a refresh of the songs due for one every `interval` seconds, in
+        a background thread; a run is skipped while the previous one is
+        still queued or running.
+
+        Every web worker starts the schedule, but only the one holding an
+        flock on lock_path queues refreshes. It keeps the lock until its
+        process exits, after which another worker takes over.
+        """
+        def run_schedule():
+            job = None
+            with open(lock_path, 'a') as lock_file:
+                while True:
+                    time.sleep(interval)
+                    try:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # Another worker runs the schedule
+                    if job is None or job.finished:
+                        job = self.submit(scraper.BASE_URL, max_songs, refresh=True)
+
+        threading.Thread(target=run_schedule, name='refresh-scheduler', daemon=True).start()
+        logger.info(f"Refreshing up to {max_songs} due songs every {interval:.0f}s")
+
+
+# Shared job manager used by the web app
+job_manager = ScrapeJobManager()
@@ -1,14 +1,17 @@
 import os
-import re
 import json
-import time
 import logging
-import requests
-import trafilatura
 from bs4 import BeautifulSoup
 from datetime import datetime
-from typing import Dict, List, Tuple, Any, Optional
-from urllib.parse import urljoin, urlparse
+from typing import Dict, List, Any, Optional
+from urllib.parse import urljoin
+from song_repository import repository
+from rate_limiter import HostRateLimiter
+from http_cache import cached_fetch
+from fetcher import Fetcher
+from chords import parse_content
+from models import content_hash
+from crawl_frontier import CrawlFrontier, SONG, LISTING, DEFAULT_CRAWL_DEPTH, CHECKPOINT_INTERVAL
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -22,14 +25,17 @@ BASE_URL = 'https://songsofpraise.in/'
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 REQUEST_DELAY = 1  # Delay between requests in seconds to avoid overloading the server
 
-# Storage paths
-SONGS_PATH = 'data/songs.json'
-CATEGORIES_PATH = 'data/categories.json'
+# Spaces requests to the same host by REQUEST_DELAY
+rate_limiter = HostRateLimiter(REQUEST_DELAY)
 
+# Pooled keep-alive client that retries transient failures
+fetcher = Fetcher(rate_limiter)
 
-def make_request(url: str) -> Optional[requests.Response]:
+
+def make_request(url: str) -> Optional[str]:
     """
-    Make a request to the target URL with proper headers and error handling
+    Fetch the HTML of a URL with proper headers and error handling, going
+    through the on-disk HTTP cache so unchanged pages aren't downloaded again
     """
     headers = {
         'User-Agent': USER_AGENT,
@@ -37,13 +43,7 @@ def make_request(url: str) -> Optional[requests.Response]:
         'Accept-Language': 'en-US,en;q=0.9',
     }
     
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()  # Raise exception for 4XX/5XX status codes
-        return response
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error making request to {url}: {str(e)}")
-        return None
+    return cached_fetch(url, headers, timeout=10, session=fetcher)
 
 
 def parse_song_page(url: str, song_id: int) -> Dict[str, Any]:
@@ -51,9 +51,9 @@ def parse_song_page(url: str, song_id: int) -> Dict[str, Any]:
     Parse a song page to extract title, lyrics, chords, etc.
     """
     logger.info(f"Parsing song page: {url}")
-    response = make_request(url)
+    html = make_request(url)
     
-    if not response:
+    if not html:
         return {
             'id': song_id,
             'url': url,
@@ -62,7 +62,7 @@ def parse_song_page(url: str, song_id: int) -> Dict[str, Any]:
             'timestamp': int(datetime.now().timestamp())
         }
     
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = BeautifulSoup(html, 'html.parser')
     
     # Extract song title
     title_element = soup.select_one('h1.entry-title')
@@ -84,16 +84,8 @@ def parse_song_page(url: str, song_id: int) -> Dict[str, Any]:
     content_html = str(content_element)
     content_text = content_element.get_text('\n', strip=True)
     
-    # Extract lyrics (text without chords)
-    # This is a simplified approach - might need refinement based on site structure
-    lyrics_lines = []
-    for line in content_text.split('\n'):
-        # Skip lines that are likely to be chord lines (contain mostly chord names)
-        chord_pattern = r'^[A-G][m#b]?(\s+[A-G][m#b]?)*$'
-        if not re.match(chord_pattern, line.strip()):
-            lyrics_lines.append(line)
-    
-    lyrics = '\n'.join(lyrics_lines)
+    # Separate lyrics (text without chord-only lines) and chords
+    lyrics, chords = parse_content(content_text)
     
     # Extract categories if available
     categories = []
@@ -101,16 +93,20 @@ def parse_song_page(url: str, song_id: int) -> Dict[str, Any]:
     for cat_elem in category_elements:
         categories.append(cat_elem.text.strip())
     
-    return {
+    song = {
         'id': song_id,
         'url': url,
         'title': title,
         'content': content_text,
         'content_html': content_html,
         'lyrics': lyrics,
+        'chords': chords,
         'categories': categories,
         'timestamp': int(datetime.now().timestamp())
     }
+    # Lets a later refresh tell whether the page's song changed
+    song['content_hash'] = content_hash(song)
+    return song
 
 
 def extract_song_links(soup: BeautifulSoup, base_url: str) -> List[Dict[str, str]]:
@@ -162,67 +158,52 @@ def extract_categories(soup: BeautifulSoup, base_url: str) -> List[Dict[str, str
     return categories
 
 
-def load_existing_data() -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
-    """
-    Load existing songs and categories from JSON files
-    """
-    songs = []
-    if os.path.exists(SONGS_PATH):
-        try:
-            with open(SONGS_PATH, 'r', encoding='utf-8') as f:
-                songs = json.load(f)
-            logger.info(f"Loaded {len(songs)} existing songs")
-        except Exception as e:
-            logger.error(f"Error loading songs data: {str(e)}")
-    
-    categories = []
-    if os.path.exists(CATEGORIES_PATH):
-        try:
-            with open(CATEGORIES_PATH, 'r', encoding='utf-8') as f:
-                categories = json.load(f)
-            logger.info(f"Loaded {len(categories)} existing categories")
-        except Exception as e:
-            logger.error(f"Error loading categories data: {str(e)}")
-    
-    return songs, categories
-
-
-def save_data(songs: List[Dict[str, Any]], categories: List[Dict[str, Any]]) -> None:
+def save_new_songs(songs: List[Dict[str, Any]], categories: List[Dict[str, Any]]) -> None:
     """
-    Save songs and categories to JSON files
+    Add newly scraped songs and save the category list, writing only the new
+    records so songs stored meanwhile by other scrapes are left alone
     """
     try:
-        with open(SONGS_PATH, 'w', encoding='utf-8') as f:
-            json.dump(songs, f, ensure_ascii=False, indent=2)
-        logger.info(f"Saved {len(songs)} songs to {SONGS_PATH}")
+        repository.add_songs(songs)
     except Exception as e:
         logger.error(f"Error saving songs data: {str(e)}")
     
     try:
-        with open(CATEGORIES_PATH, 'w', encoding='utf-8') as f:
-            json.dump(categories, f, ensure_ascii=False, indent=2)
-        logger.info(f"Saved {len(categories)} categories to {CATEGORIES_PATH}")
+        repository.save_categories(categories)
     except Exception as e:
         logger.error(f"Error saving categories data: {str(e)}")
 
 
-def scrape_site(start_url: str = BASE_URL, max_songs: int = 20) -> Dict[str, Any]:
+def extract_pagination_links(soup: BeautifulSoup, base_url: str) -> List[str]:
+    """
+    Extract numbered pagination links from a listing page
+    """
+    pages = []
+    for page_link in soup.select('.pagination a, .page-numbers a'):
+        if 'href' in page_link.attrs and page_link.text.strip().isdigit():
+            pages.append(urljoin(base_url, str(page_link['href'])))
+    return pages
+
+
+def scrape_site(start_url: str = BASE_URL, max_songs: int = 20, max_depth: int = DEFAULT_CRAWL_DEPTH,
+                resume: bool = True) -> Dict[str, Any]:
     """
     Main function to scrape the site
     
+    Pages are taken from a crawl frontier that deduplicates URLs, follows
+    categories up to max_depth hops and pagination at the same depth, and
+    checkpoints its progress so an interrupted crawl resumes where it stopped.
+    
     Args:
         start_url: The URL to start scraping from
         max_songs: Maximum number of songs to scrape (prevents timeout issues)
+        max_depth: Maximum number of link hops from start_url
+        resume: Continue from the checkpoint of an earlier crawl of start_url
     """
     logger.info(f"Starting scrape from: {start_url}")
     
-    # Load existing data
-    existing_songs, existing_categories = load_existing_data()
-    
-    # Track URLs to avoid duplicates
-    processed_urls = set(song['url'] for song in existing_songs)
-    songs_to_process = []
-    categories = []
+    # URLs handled by this crawl; stored URLs (and aliases of merged duplicates) via has_url
+    processed_urls = set()
     
     try:
         # Validate the URL to ensure it's from the expected domain
@@ -231,113 +212,100 @@ def scrape_site(start_url: str = BASE_URL, max_songs: int = 20) -> Dict[str, Any
                 'success': False,
                 'message': f"URL must be from songsofpraise.in domain for safety reasons."
             }
-            
-        # Start with the main page
-        response = make_request(start_url)
-        if not response:
-            return {
-                'success': False,
-                'message': f"Failed to access the site: {start_url}"
-            }
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
         
-        # Extract category links
-        new_categories = extract_categories(soup, BASE_URL)
-        
-        # Add categories that don't exist yet
+        # Known categories, copied so new ones can be added; stored songs are
+        # checked through the repository
+        existing_categories = list(repository.categories())
         existing_category_urls = set(cat['url'] for cat in existing_categories)
-        for category in new_categories:
-            if category['url'] not in existing_category_urls:
-                categories.append(category)
-                existing_categories.append(category)
-                existing_category_urls.add(category['url'])
-        
-        # First pass: collect song links from the main page
-        song_links = extract_song_links(soup, BASE_URL)
+        frontier = CrawlFrontier(start_url, max_depth)
         
-        # Second pass: visit category pages to collect more song links
-        for category in categories:
-            logger.info(f"Processing category: {category['name']}")
+        def queue_links(html: str, depth: int) -> None:
+            """Add the categories, pagination and songs of a listing page to the frontier"""
+            soup = BeautifulSoup(html, 'html.parser')
             
-            cat_response = make_request(category['url'])
-            if not cat_response:
-                logger.warning(f"Failed to access category: {category['url']}")
-                continue
+            # Categories are one hop deeper, pagination stays at the same depth
+            for category in extract_categories(soup, BASE_URL):
+                if category['url'] not in existing_category_urls:
+                    existing_categories.append(category)
+                    existing_category_urls.add(category['url'])
+                frontier.add(category['url'], depth + 1, LISTING, category['name'])
             
-            time.sleep(REQUEST_DELAY)  # Respect rate limiting
+            for page_url in extract_pagination_links(soup, BASE_URL):
+                frontier.add(page_url, depth, LISTING)
             
-            cat_soup = BeautifulSoup(cat_response.text, 'html.parser')
-            cat_song_links = extract_song_links(cat_soup, BASE_URL)
-            
-            for link in cat_song_links:
-                song_links.append(link)
-            
-            # Check for pagination and process additional pages
-            pagination = cat_soup.select('.pagination a, .page-numbers a')
-            for page_link in pagination:
-                if 'href' in page_link.attrs and page_link.text.strip().isdigit():
-                    page_url = urljoin(BASE_URL, str(page_link['href']))
-                    
-                    logger.info(f"Processing pagination page: {page_url}")
-                    time.sleep(REQUEST_DELAY)  # Respect rate limiting
-                    
-                    page_response = make_request(page_url)
-                    if not page_response:
-                        logger.warning(f"Failed to access page: {page_url}")
-                        continue
-                    
-                    page_soup = BeautifulSoup(page_response.text, 'html.parser')
-                    page_song_links = extract_song_links(page_soup, BASE_URL)
-                    
-                    for link in page_song_links:
-                        song_links.append(link)
-        
-        # Remove duplicates from song links
-        unique_songs = {}
-        for link in song_links:
-            if link['url'] not in unique_songs and link['url'] not in processed_urls:
-                unique_songs[link['url']] = link
+            for link in extract_song_links(soup, BASE_URL):
+                if link['url'] not in processed_urls and not repository.has_url(link['url']):
+                    frontier.add(link['url'], depth + 1, SONG, link['title'])
         
-        songs_to_process = list(unique_songs.values())
+        if not (resume and frontier.load_checkpoint()):
+            # Start with the main page
+            html = make_request(start_url)
+            if not html:
+                return {
+                    'success': False,
+                    'message': f"Failed to access the site: {start_url}"
+                }
+            frontier.add(start_url, 0, LISTING)
+            frontier.pop()
+            queue_links(html, 0)
         
-        # Generate a new ID for each song
-        next_id = 1
-        if existing_songs:
-            next_id = max(song.get('id', 0) for song in existing_songs) + 1
-        
-        # Process each song page (up to max_songs limit)
         processed_songs = []
-        songs_to_process = songs_to_process[:max_songs]  # Limit to max_songs
+        scraped_count = 0
+        pages_crawled = 0
         
-        for i, song in enumerate(songs_to_process):
-            logger.info(f"Processing song {i+1}/{len(songs_to_process)}: {song['title']}")
-            
-            song_data = parse_song_page(song['url'], next_id)
-            processed_songs.append(song_data)
-            processed_urls.add(song['url'])
-            next_id += 1
+        # Song pages are popped before listing pages, so the crawl stops as
+        # soon as max_songs songs have been scraped
+        while len(frontier) and scraped_count < max_songs:
+            item = frontier.pop()
+            pages_crawled += 1
             
-            time.sleep(REQUEST_DELAY)  # Respect rate limiting
-            
-            # Save periodically
-            if (i + 1) % 5 == 0 or i == len(songs_to_process) - 1:  # Save more frequently
-                all_songs = existing_songs + processed_songs
-                save_data(all_songs, existing_categories)
+            if item['kind'] == SONG:
+                if item['url'] in processed_urls or repository.has_url(item['url']):
+                    continue
+                
+                logger.info(f"Processing song {scraped_count + 1}/{max_songs}: {item['title']}")
+                
+                # Ids are reserved through the repository, so concurrent scrapes never share one
+                song_data = parse_song_page(item['url'], repository.reserve_ids(1))
+                processed_songs.append(song_data)
+                processed_urls.add(item['url'])
+                scraped_count += 1
+                
+                # Save periodically
+                if len(processed_songs) >= 5:
+                    save_new_songs(processed_songs, existing_categories)
+                    processed_songs = []
+            else:
+                logger.info(f"Processing listing page: {item['url']}")
                 
-                # Update processed songs to avoid memory issues with large datasets
-                existing_songs = all_songs
+                html = make_request(item['url'])
+                if not html:
+                    logger.warning(f"Failed to access page: {item['url']}")
+                    continue
+                
+                queue_links(html, item['depth'])
+            
+            if pages_crawled % CHECKPOINT_INTERVAL == 0:
+                # Songs are saved before the checkpoint that marks their pages done
+                save_new_songs(processed_songs, existing_categories)
                 processed_songs = []
+                frontier.save_checkpoint()
         
         # Save final data
-        all_songs = existing_songs
-        save_data(all_songs, existing_categories)
+        save_new_songs(processed_songs, existing_categories)
+        songs_count = repository.count()
+        
+        if len(frontier):
+            frontier.save_checkpoint()
+        else:
+            frontier.discard_checkpoint()
         
         return {
             'success': True,
-            'songs_count': len(all_songs),
+            'songs_count': songs_count,
             'categories_count': len(existing_categories),
-            'message': f"Successfully scraped {len(all_songs)} songs from {len(existing_categories)} categories"
+            'pages_pending': len(frontier),
+            'message': f"Successfully scraped {scraped_count} new songs ({songs_count} in total) from {len(existing_categories)} categories"
         }
     
     except Exception as e:
@@ -0,0 +1,245 @@
+import os
+import re
+import math
+import bisect
+import logging
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+from metrics import json_duration
+import json_codec
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Storage paths
+SEARCH_INDEX_PATH = 'data/search_index.json'
+
+# Word characters plus the combining marks used by Indic scripts
+# (Devanagari through Malayalam), so "आदर" stays a single token.
+TOKEN_PATTERN = re.compile(r'[\w\u0900-\u0d7f]+')
+
+# Indexed fields and how much a term occurrence in each counts towards tf
+FIELD_WEIGHTS = {
+    'title': 3,
+    'content': 1,
+    'lyrics': 1,
+}
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Upper bound on vocabulary terms a single query token may expand to
+MAX_PREFIX_EXPANSIONS = 50
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase search tokens
+    """
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def term_frequencies(song: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Weighted term frequencies for the indexed fields of a song
+    """
+    frequencies: Dict[str, int] = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(song.get(field, '')):
+            frequencies[token] = frequencies.get(token, 0) + weight
+    return frequencies
+
+
+class SearchIndex:
+    """
+    Inverted index over song title, content and lyrics with BM25 ranking.
+
+    Postings map each term to {song_id: weighted term frequency}. Query
+    tokens are matched as prefixes against a sorted vocabulary, so lookups
+    cost O(log V + matches) rather than a scan over every song.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_lengths: Dict[int, int] = {}
+        self.doc_terms: Dict[int, List[str]] = {}
+        self.vocabulary: List[str] = []
+        self.total_length = 0
+        self.signature: Optional[Tuple[int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, song_id: int) -> bool:
+        return song_id in self.doc_lengths
+
+    # Building
+
+    def add(self, song: Dict[str, Any]) -> None:
+        """Index a song, replacing any previous entry with the same id"""
+        song_id = song.get('id')
+        if song_id is None:
+            return
+
+        frequencies = term_frequencies(song)
+
+        with self._lock:
+            self.remove(song_id)
+            for term, tf in frequencies.items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = {}
+                    bisect.insort(self.vocabulary, term)
+                postings[song_id] = tf
+
+            length = sum(frequencies.values())
+            self.doc_lengths[song_id] = length
+            self.doc_terms[song_id] = list(frequencies)
+            self.total_length += length
+
+    def remove(self, song_id: int) -> None:
+        """Drop a song from the index"""
+        with self._lock:
+            terms = self.doc_terms.pop(song_id, None)
+            if terms is None:
+                return
+
+            for term in terms:
+                postings = self.postings.get(term)
+                if postings is None:
+                    continue
+                postings.pop(song_id, None)
+                if not postings:
+                    del self.postings[term]
+                    position = bisect.bisect_left(self.vocabulary, term)
+                    if position < len(self.vocabulary) and self.vocabulary[position] == term:
+                        del self.vocabulary[position]
+
+            self.total_length -= self.doc_lengths.pop(song_id, 0)
+
+    def rebuild(self, songs: List[Dict[str, Any]]) -> None:
+        """Replace the index contents with the given songs"""
+        with self._lock:
+            self.postings = {}
+            self.doc_lengths = {}
+            self.doc_terms = {}
+            self.vocabulary = []
+            self.total_length = 0
+
+            # Insert without keeping the vocabulary sorted, then sort once
+            for song in songs:
+                song_id = song.get('id')
+                if song_id is None:
+                    continue
+                frequencies = term_frequencies(song)
+                for term, tf in frequencies.items():
+                    self.postings.setdefault(term, {})[song_id] = tf
+                length = sum(frequencies.values())
+                self.doc_lengths[song_id] = length
+                self.doc_terms[song_id] = list(frequencies)
+                self.total_length += length
+
+            self.vocabulary = sorted(self.postings)
+
+    # Querying
+
+    def _expand(self, token: str) -> List[str]:
+        """Vocabulary terms starting with a query token"""
+        terms = []
+        position = bisect.bisect_left(self.vocabulary, token)
+        while position < len(self.vocabulary) and len(terms) < MAX_PREFIX_EXPANSIONS:
+            term = self.vocabulary[position]
+            if not term.startswith(token):
+                break
+            terms.append(term)
+            position += 1
+        return terms
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Return (song_id, score) pairs for songs matching every query token,
+        best match first
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            doc_count = len(self.doc_lengths)
+            if not doc_count:
+                return []
+            average_length = self.total_length / doc_count
+
+            scores: Optional[Dict[int, float]] = None
+            for token in dict.fromkeys(tokens):
+                token_scores: Dict[int, float] = {}
+                for term in self._expand(token):
+                    postings = self.postings[term]
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    # Exact matches rank above prefix expansions
+                    if term != token:
+                        idf *= 0.5
+                    for song_id, tf in postings.items():
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[song_id] / average_length)
+                        token_scores[song_id] = token_scores.get(song_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {song_id: score + token_scores[song_id]
+                              for song_id, score in scores.items() if song_id in token_scores}
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return ranked
+
+    # Persistence
+
+    def save(self, path: str = SEARCH_INDEX_PATH) -> None:
+        """Write the index to disk atomically"""
+        with self._lock:
+            data = {
+                'signature': list(self.signature) if self.signature else None,
+                'doc_lengths': self.doc_lengths,
+                'postings': self.postings,
+            }
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f, json_duration.time('dump', 'search_index'):
+                json_codec.dump(data, f, indent=False)
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = SEARCH_INDEX_PATH) -> Optional['SearchIndex']:
+        """Read an index previously written with save(), or None if unavailable"""
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'rb') as f, json_duration.time('load', 'search_index'):
+                data = json_codec.load(f)
+        except Exception as e:
+            logger.error(f"Error loading search index: {str(e)}")
+            return None
+
+        index = cls()
+        index.signature = tuple(data['signature']) if data.get('signature') else None
+        # JSON object keys are strings; song ids are ints
+        index.doc_lengths = {int(song_id): length for song_id, length in data['doc_lengths'].items()}
+        index.total_length = sum(index.doc_lengths.values())
+        doc_terms: Dict[int, List[str]] = {song_id: [] for song_id in index.doc_lengths}
+        for term, postings in data['postings'].items():
+            converted = {}
+            for song_id, tf in postings.items():
+                song_id = int(song_id)
+                converted[song_id] = tf
+                doc_terms[song_id].append(term)
+            index.postings[term] = converted
+        index.doc_terms = doc_terms
+        index.vocabulary = sorted(index.postings)
+        return index
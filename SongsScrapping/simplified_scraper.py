@@ -1,13 +1,22 @@
 import os
-import re
 import json
 import logging
 import trafilatura
-import requests
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+import lxml.html
+from lxml import etree
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Tuple, Any, Optional, Union
 from urllib.parse import urlparse, urljoin
+from song_repository import repository
+from rate_limiter import HostRateLimiter
+from http_cache import cached_fetch
+from fetcher import Fetcher
+from parse_pool import fetch_and_parse, map_batches
+from chords import parse_content
+from models import content_hash
+from metrics import scrape_stage_duration
+from crawl_frontier import CrawlFrontier, SONG, LISTING, DEFAULT_CRAWL_DEPTH, CHECKPOINT_INTERVAL
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -19,17 +28,30 @@ os.makedirs('data', exist_ok=True)
 # Constants
 BASE_URL = 'https://songsofpraise.in/'
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+REQUEST_DELAY = 0.25  # Minimum seconds between requests to the same host
+DEFAULT_CONCURRENCY = 4  # Song pages fetched in parallel
+MAX_CONCURRENCY = 16
+INDEX_PATHS = ('/hindi/', '/english/', '/malayalam/')  # Song index pages
 
-# Storage paths
-SONGS_PATH = 'data/songs.json'
-CATEGORIES_PATH = 'data/categories.json'
+# Shared by all fetch workers so concurrency never exceeds the per-host rate
+rate_limiter = HostRateLimiter(REQUEST_DELAY)
+
+# Pooled keep-alive client that retries transient failures
+fetcher = Fetcher(rate_limiter)
 
 def get_webpage_content(url: str) -> Optional[str]:
     """
-    Get the HTML content of a webpage using trafilatura
+    Get the HTML content of a webpage, using conditional requests against the
+    on-disk HTTP cache so unchanged pages aren't downloaded again
     """
+    headers = {
+        'User-Agent': USER_AGENT,
+        'Accept': 'text/html,application/xhtml+xml,application/xml',
+        'Accept-Language': 'en-US,en;q=0.9',
+    }
     try:
-        downloaded = trafilatura.fetch_url(url)
+        with scrape_stage_duration.time('fetch'):
+            downloaded = cached_fetch(url, headers, timeout=10, session=fetcher)
         if downloaded:
             return downloaded
         return None
@@ -37,45 +59,76 @@ def get_webpage_content(url: str) -> Optional[str]:
         logger.error(f"Error downloading {url}: {str(e)}")
         return None
 
-def extract_links(html_content: str, base_url: str) -> Dict[str, List[Dict[str, str]]]:
+def has_class(class_name: str) -> str:
+    """XPath predicate matching elements with a CSS class"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+# XPath equivalents of the CSS selectors used on songsofpraise.in pages
+TITLE_XPATH = f"//h1[{has_class('entry-title')}]"
+CONTENT_XPATH = f"//div[{has_class('entry-content')}]"
+ENTRY_CONTENT_XPATH = f"//*[{has_class('entry-content')}]"
+CATEGORY_TAG_XPATH = "//a[@rel='category tag']"
+
+def parse_html(html_content: str) -> Optional[lxml.html.HtmlElement]:
+    """
+    Parse a page once with lxml; the tree is shared by trafilatura, the
+    title/category lookups and link classification
+    """
+    try:
+        return lxml.html.fromstring(html_content)
+    except (etree.ParserError, ValueError) as e:
+        logger.error(f"Error parsing HTML: {str(e)}")
+        return None
+
+def element_text(element: lxml.html.HtmlElement) -> str:
+    """Text of an element's strings, stripped and joined by newlines"""
+    return '\n'.join(text.strip() for text in element.itertext() if text.strip())
+
+def extract_links(html_content: Union[str, lxml.html.HtmlElement], base_url: str) -> Dict[str, List[Dict[str, str]]]:
     """
-    Extract songs and category links from HTML content
+    Extract songs and category links from HTML content (or an already
+    parsed tree)
     """
     result = {
         'songs': [],
         'categories': [],
-        'index_links': []  # For links in index pages like Hindi songs list
+        'index_links': [],  # For links in index pages like Hindi songs list
+        'pagination': []  # Further pages of the same listing
     }
     
-    if not html_content:
+    if html_content is None or (isinstance(html_content, str) and not html_content):
         return result
     
-    # Parse with BeautifulSoup for link extraction
-    soup = BeautifulSoup(html_content, 'html.parser')
+    tree = html_content if isinstance(html_content, lxml.html.HtmlElement) else parse_html(html_content)
+    if tree is None:
+        return result
     
     # Check if this is an index page (like Hindi songs index)
-    is_index_page = False
-    if '/hindi/' in base_url or '/english/' in base_url or '/malayalam/' in base_url:
-        is_index_page = True
+    is_index_page = any(index_path in base_url for index_path in INDEX_PATHS)
     
     # Look for song links in the entry content (typically where song lists appear)
-    entry_content = soup.select_one('.entry-content')
+    entry_contents = tree.xpath(ENTRY_CONTENT_XPATH)
+    entry_content = entry_contents[0] if entry_contents else None
     
     # Extract song links - looking for links in articles, content blocks, etc.
-    links_to_check = soup.find_all('a')
+    links_to_check = tree.xpath('//a')
+    
+    # Links inside the entry content, computed once for membership checks
+    entry_links = entry_content.xpath('.//a') if entry_content is not None else []
+    entry_link_set = set(entry_links)
     
     # If we have entry content and this is an index page, prioritize links there
-    if entry_content and is_index_page:
-        links_to_check = entry_content.find_all('a') + links_to_check
+    if entry_content is not None and is_index_page:
+        links_to_check = entry_links + links_to_check
     
     for link in links_to_check:
-        # Skip links without href (fix for type checking)
+        # Skip links without href
         href = link.get('href')
         if not href:
             continue
             
         url = urljoin(base_url, str(href))
-        title = link.get_text().strip()
+        title = link.text_content().strip()
         
         # Skip empty titles
         if not title:
@@ -87,11 +140,16 @@ def extract_links(html_content: str, base_url: str) -> Dict[str, List[Dict[str,
                 'name': title,
                 'url': url
             })
+        elif url.startswith(BASE_URL) and '/page/' in url:
+            result['pagination'].append({
+                'title': title,
+                'url': url
+            })
         elif url.startswith(BASE_URL) and not any(x in url for x in ['/tag/', '/author/', '/page/', 'comments', 'wp-content']):
             # Likely a song link if it's on the same domain and not a tag, author, etc.
             
             # If this is a song in an index page, add to index_links
-            if is_index_page and entry_content and link in entry_content.find_all('a'):
+            if is_index_page and link in entry_link_set:
                 result['index_links'].append({
                     'title': title,
                     'url': url
@@ -105,70 +163,72 @@ def extract_links(html_content: str, base_url: str) -> Dict[str, List[Dict[str,
     
     return result
 
-def extract_song_content(url: str, song_id: int) -> Dict[str, Any]:
+def extract_song_from_html(downloaded: Union[str, lxml.html.HtmlElement], url: str, song_id: int) -> Dict[str, Any]:
     """
-    Extract song content using trafilatura which is more reliable for content extraction
+    Build a song record from a downloaded page (or an already parsed tree),
+    parsing the HTML only once
     """
-    logger.info(f"Extracting content from: {url}")
+    tree = downloaded if isinstance(downloaded, lxml.html.HtmlElement) else parse_html(downloaded)
+    if tree is None:
+        return {
+            'id': song_id,
+            'url': url,
+            'title': 'Unknown',
+            'error': 'Failed to parse page',
+            'timestamp': int(datetime.now().timestamp())
+        }
     
-    try:
-        downloaded = get_webpage_content(url)
-        if not downloaded:
-            return {
-                'id': song_id,
-                'url': url,
-                'title': 'Unknown',
-                'error': 'Failed to download page',
-                'timestamp': int(datetime.now().timestamp())
-            }
-        
-        # Extract full text content
-        content = trafilatura.extract(downloaded)
-        if not content:
-            # Fallback to standard HTML extraction
-            soup = BeautifulSoup(downloaded, 'html.parser')
-            title_element = soup.select_one('h1.entry-title')
-            title = title_element.text.strip() if title_element else 'Unknown Title'
-            
-            content_element = soup.select_one('div.entry-content')
-            content = content_element.get_text('\n', strip=True) if content_element else ''
-            content_html = str(content_element) if content_element else ''
-        else:
-            # Try to extract title from HTML
-            soup = BeautifulSoup(downloaded, 'html.parser')
-            title_element = soup.select_one('h1.entry-title')
-            title = title_element.text.strip() if title_element else 'Unknown Title'
-            content_html = ''  # We don't have HTML when using trafilatura extraction
-        
-        # Extract categories if available
-        categories = []
-        soup = soup or BeautifulSoup(downloaded, 'html.parser')
-        category_elements = soup.select('a[rel="category tag"]')
-        for cat_elem in category_elements:
-            categories.append(cat_elem.text.strip())
-        
-        # Separate lyrics from content (simple heuristic)
-        lines = content.split('\n') if content else []
-        lyrics_lines = []
-        for line in lines:
-            # Skip lines that are likely chord lines (contain mostly chord names)
-            chord_pattern = r'^[A-G][m#b]?(\s+[A-G][m#b]?)*$'
-            if not re.match(chord_pattern, line.strip()):
-                lyrics_lines.append(line)
-        
-        lyrics = '\n'.join(lyrics_lines)
-        
+    title_elements = tree.xpath(TITLE_XPATH)
+    title = title_elements[0].text_content().strip() if title_elements else 'Unknown Title'
+    
+    # Extract categories if available
+    categories = [cat_elem.text_content().strip() for cat_elem in tree.xpath(CATEGORY_TAG_XPATH)]
+    
+    # Extract full text content; trafilatura works on a copy of the tree
+    content = trafilatura.extract(tree)
+    if not content:
+        # Fallback to standard HTML extraction
+        content_elements = tree.xpath(CONTENT_XPATH)
+        content_element = content_elements[0] if content_elements else None
+        content = element_text(content_element) if content_element is not None else ''
+        content_html = lxml.html.tostring(content_element, encoding='unicode') if content_element is not None else ''
+    else:
+        content_html = ''  # We don't have HTML when using trafilatura extraction
+    
+    # Separate lyrics and chords from content
+    lyrics, chords = parse_content(content)
+    
+    song = {
+        'id': song_id,
+        'url': url,
+        'title': title,
+        'content': content or '',
+        'content_html': content_html,
+        'lyrics': lyrics,
+        'chords': chords,
+        'categories': categories,
+        'timestamp': int(datetime.now().timestamp())
+    }
+    # Lets a later refresh tell whether the page's song changed
+    song['content_hash'] = content_hash(song)
+    return song
+
+def song_from_download(url: str, song_id: int, downloaded: Optional[str]) -> Dict[str, Any]:
+    """
+    Build a song record from a downloaded page, or an error record if the
+    download failed or the page couldn't be parsed
+    """
+    if not downloaded:
         return {
             'id': song_id,
             'url': url,
-            'title': title,
-            'content': content or '',
-            'content_html': content_html,
-            'lyrics': lyrics,
-            'categories': categories,
+            'title': 'Unknown',
+            'error': 'Failed to download page',
             'timestamp': int(datetime.now().timestamp())
         }
-        
+    
+    try:
+        return extract_song_from_html(downloaded, url, song_id)
     except Exception as e:
         logger.error(f"Error extracting content from {url}: {str(e)}")
         return {
@@ -179,49 +239,55 @@ def extract_song_content(url: str, song_id: int) -> Dict[str, Any]:
             'timestamp': int(datetime.now().timestamp())
         }
 
-def load_existing_data() -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+def extract_song_content(url: str, song_id: int) -> Dict[str, Any]:
+    """
+    Download a song page and extract its content
+    """
+    logger.info(f"Extracting content from: {url}")
+    return song_from_download(url, song_id, get_webpage_content(url))
+
+def extract_songs(pages: List[Optional[Tuple[str, int, str]]]) -> List[Optional[Dict[str, Any]]]:
     """
-    Load existing songs and categories from JSON files
+    Build song records for a batch of downloaded pages, each (url, song id,
+    html) or None for a page skipped by cancellation. Runs in the parse pool.
     """
-    songs = []
-    if os.path.exists(SONGS_PATH):
-        try:
-            with open(SONGS_PATH, 'r', encoding='utf-8') as f:
-                songs = json.load(f)
-            logger.info(f"Loaded {len(songs)} existing songs")
-        except Exception as e:
-            logger.error(f"Error loading songs data: {str(e)}")
-    
-    categories = []
-    if os.path.exists(CATEGORIES_PATH):
-        try:
-            with open(CATEGORIES_PATH, 'r', encoding='utf-8') as f:
-                categories = json.load(f)
-            logger.info(f"Loaded {len(categories)} existing categories")
-        except Exception as e:
-            logger.error(f"Error loading categories data: {str(e)}")
-    
-    return songs, categories
+    return [None if page is None else song_from_download(*page) for page in pages]
 
-def save_data(songs: List[Dict[str, Any]], categories: List[Dict[str, Any]]) -> None:
+def parse_crawl_pages(pages: List[Tuple[Dict[str, Any], str, Optional[int]]]) -> List[Tuple[Optional[Dict[str, List[Dict[str, str]]]], Optional[Dict[str, Any]]]]:
     """
-    Save songs and categories to JSON files
+    Parse a batch of crawled pages, each (frontier item, html, song id or
+    None for listing pages), into (links, song record) pairs; both are None
+    for a page that failed to download or parse. Runs in the parse pool.
+    """
+    results = []
+    for item, html, song_id in pages:
+        tree = parse_html(html) if html else None
+        if tree is None:
+            results.append((None, None))
+            continue
+        song_data = extract_song_from_html(tree, item['url'], song_id) if song_id is not None else None
+        results.append((extract_links(tree, item['url']), song_data))
+    return results
+
+def save_new_songs(songs: List[Dict[str, Any]], categories: Optional[List[Dict[str, Any]]] = None) -> None:
+    """
+    Add newly scraped songs (and optionally the full category list) through the
+    shared song repository, writing only the new records
     """
     try:
-        with open(SONGS_PATH, 'w', encoding='utf-8') as f:
-            json.dump(songs, f, ensure_ascii=False, indent=2)
-        logger.info(f"Saved {len(songs)} songs to {SONGS_PATH}")
+        with scrape_stage_duration.time('save'):
+            repository.add_songs(songs)
     except Exception as e:
         logger.error(f"Error saving songs data: {str(e)}")
     
-    try:
-        with open(CATEGORIES_PATH, 'w', encoding='utf-8') as f:
-            json.dump(categories, f, ensure_ascii=False, indent=2)
-        logger.info(f"Saved {len(categories)} categories to {CATEGORIES_PATH}")
-    except Exception as e:
-        logger.error(f"Error saving categories data: {str(e)}")
+    if categories is not None:
+        try:
+            repository.save_categories(categories)
+        except Exception as e:
+            logger.error(f"Error saving categories data: {str(e)}")
 
-def scrape_site(start_url: str = BASE_URL, max_songs: int = 10, follow_links: bool = False) -> Dict[str, Any]:
+def scrape_site(start_url: str = BASE_URL, max_songs: int = 10, follow_links: bool = False,
+                concurrency: int = DEFAULT_CONCURRENCY, job: Optional[Any] = None) -> Dict[str, Any]:
     """
     Main function to scrape the site with improved efficiency using trafilatura
     
@@ -229,6 +295,9 @@ def scrape_site(start_url: str = BASE_URL, max_songs: int = 10, follow_links: bo
         start_url: The URL to start scraping from
         max_songs: Maximum number of songs to scrape
         follow_links: Whether to follow links from the index page (for Hindi, English, etc. categories)
+        concurrency: Number of song pages fetched in parallel (1 fetches sequentially)
+        job: Optional scrape_jobs.ScrapeJob that receives progress updates and
+             can cancel the scrape between pages
     """
     logger.info(f"Starting scrape from: {start_url}")
     
@@ -240,10 +309,11 @@ def scrape_site(start_url: str = BASE_URL, max_songs: int = 10, follow_links: bo
                 'message': "URL must be from songsofpraise.in domain for safety reasons."
             }
         
-        # Load existing data
-        existing_songs, existing_categories = load_existing_data()
-        existing_song_urls = {song['url'] for song in existing_songs}
+        # Existing songs are checked through the repository's url index
+        # instead of loading the whole catalog
+        existing_categories = list(repository.categories())
         existing_category_urls = {cat['url'] for cat in existing_categories}
+        queued_urls = set()
         
         # Get the HTML content of the start URL
         html_content = get_webpage_content(start_url)
@@ -254,7 +324,8 @@ def scrape_site(start_url: str = BASE_URL, max_songs: int = 10, follow_links: bo
             }
         
         # Extract links from the HTML content
-        extracted_links = extract_links(html_content, start_url)
+        with scrape_stage_duration.time('parse'):
+            extracted_links = extract_links(html_content, start_url)
         
         # Add new categories
         new_categories = []
@@ -263,6 +334,8 @@ def scrape_site(start_url: str = BASE_URL, max_songs: int = 10, follow_links: bo
                 new_categories.append(category)
                 existing_categories.append(category)
                 existing_category_urls.add(category['url'])
+        if new_categories:
+            save_new_songs([], existing_categories)
         
         # Prepare song URLs to process
         songs_to_process = []
@@ -271,14 +344,15 @@ def scrape_site(start_url: str = BASE_URL, max_songs: int = 10, follow_links: bo
         # process the links from the index first
         if follow_links and extracted_links['index_links']:
             logger.info(f"Found {len(extracted_links['index_links'])} songs in the index page. Following these links...")
-            for song in extracted_links['index_links']:
-                if song['url'] not in existing_song_urls:
-                    songs_to_process.append(song)
+            candidates = extracted_links['index_links']
         else:
             # Regular processing of songs found on the page
-            for song in extracted_links['songs']:
-                if song['url'] not in existing_song_urls:
-                    songs_to_process.append(song)
+            candidates = extracted_links['songs']
+        
+        for song in candidates:
+            if song['url'] not in queued_urls and not repository.has_url(song['url']):
+                queued_urls.add(song['url'])
+                songs_to_process.append(song)
         
         # Limit the number of songs to process
         songs_to_process = songs_to_process[:max_songs]
@@ -293,17 +367,22 @@ def scrape_site(start_url: str = BASE_URL, max_songs: int = 10, follow_links: bo
             
             if direct_process:
                 # Process the page directly as a song page
-                next_id = max([song.get('id', 0) for song in existing_songs]) + 1 if existing_songs else 1
+                next_id = repository.reserve_ids(1)
+                if job:
+                    job.record_queued(1)
                 song_data = extract_song_content(start_url, next_id)
+                if job:
+                    job.record_fetch('error' not in song_data)
                 
                 # Check if we actually got song content
                 if 'error' not in song_data:
-                    existing_songs.append(song_data)
-                    save_data(existing_songs, existing_categories)
+                    save_new_songs([song_data])
+                    if job:
+                        job.record_saved(1)
                     
                     return {
                         'success': True,
-                        'songs_count': len(existing_songs),
+                        'songs_count': repository.count(),
                         'categories_count': len(existing_categories),
                         'message': f"Successfully scraped 1 song from {start_url}"
                     }
@@ -315,26 +394,63 @@ def scrape_site(start_url: str = BASE_URL, max_songs: int = 10, follow_links: bo
         
         # Process each song
         new_songs_count = 0
-        next_id = max([song.get('id', 0) for song in existing_songs]) + 1 if existing_songs else 1
         
-        for i, song in enumerate(songs_to_process):
-            logger.info(f"Processing song {i+1}/{len(songs_to_process)}: {song['title']}")
+        # IDs are reserved up front so results keep the page order no matter
+        # which worker finishes first
+        next_id = repository.reserve_ids(len(songs_to_process))
+        song_ids = list(range(next_id, next_id + len(songs_to_process)))
+        song_urls = [song['url'] for song in songs_to_process]
+        concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+        if job:
+            job.record_queued(len(song_urls))
+        
+        def fetch_song(page: Tuple[str, int]) -> Optional[Tuple[str, int, str]]:
+            # Pages not yet started when the job is cancelled are skipped
+            if job and job.is_cancelled():
+                return None
+            url, song_id = page
+            logger.info(f"Extracting content from: {url}")
+            return url, song_id, get_webpage_content(url) or ''
+        
+        # Pages are downloaded by I/O threads and parsed in batches by the
+        # parse pool; results come back in page order
+        unsaved_songs = []
+        songs = fetch_and_parse(zip(song_urls, song_ids), fetch_song, extract_songs, concurrency)
+        for i, song_data in enumerate(songs):
+            if song_data is None:
+                continue
+            if job:
+                job.record_fetch('error' not in song_data)
+            logger.info(f"Processed song {i+1}/{len(songs_to_process)}: {songs_to_process[i]['title']}")
             
-            # Extract content from the song page
-            song_data = extract_song_content(song['url'], next_id)
-            existing_songs.append(song_data)
-            existing_song_urls.add(song['url'])
-            next_id += 1
+            unsaved_songs.append(song_data)
             new_songs_count += 1
             
             # Save periodically to avoid data loss
-            if (i + 1) % 3 == 0 or i == len(songs_to_process) - 1:
-                save_data(existing_songs, existing_categories)
+            if len(unsaved_songs) >= 3:
+                save_new_songs(unsaved_songs)
+                if job:
+                    job.record_saved(len(unsaved_songs))
+                unsaved_songs = []
+        
+        if unsaved_songs:
+            save_new_songs(unsaved_songs)
+            if job:
+                job.record_saved(len(unsaved_songs))
+        
+        if job and job.is_cancelled():
+            return {
+                'success': True,
+                'songs_count': repository.count(),
+                'categories_count': len(existing_categories),
+                'new_songs_count': new_songs_count,
+                'message': f"Scrape cancelled after {new_songs_count} new songs from {start_url}"
+            }
         
         # Success message
         return {
             'success': True,
-            'songs_count': len(existing_songs),
+            'songs_count': repository.count(),
             'categories_count': len(existing_categories),
             'new_songs_count': new_songs_count,
             'message': f"Successfully scraped {new_songs_count} new songs from {start_url}"
@@ -347,6 +463,190 @@ def scrape_site(start_url: str = BASE_URL, max_songs: int = 10, follow_links: bo
             'message': f"An error occurred during scraping: {str(e)}"
         }
 
+def page_kind(url: str) -> str:
+    """Whether a page on the site lists songs (home, index, category, pagination) or is a song"""
+    path = urlparse(url).path
+    if path in ('', '/') or '/category/' in path or '/page/' in path or any(index_path in path for index_path in INDEX_PATHS):
+        return LISTING
+    return SONG
+
+def queue_page_links(frontier: CrawlFrontier, links: Dict[str, List[Dict[str, str]]], depth: int) -> List[Dict[str, str]]:
+    """
+    Add the links found on a page at `depth` to the crawl frontier and return
+    the category links. Pagination stays at the same depth so long listings
+    aren't cut off by the depth limit; songs already in the catalog are skipped.
+    """
+    for page in links['pagination']:
+        frontier.add(page['url'], depth, LISTING, page['title'])
+    for category in links['categories']:
+        frontier.add(category['url'], depth + 1, LISTING, category['name'])
+    for link in links['songs']:
+        kind = page_kind(link['url'])
+        if kind == SONG and repository.has_url(link['url']):
+            continue
+        frontier.add(link['url'], depth + 1, kind, link['title'])
+    return links['categories']
+
+def crawl_site(start_url: str = BASE_URL, max_songs: int = 10, max_depth: int = DEFAULT_CRAWL_DEPTH,
+               concurrency: int = DEFAULT_CONCURRENCY, job: Optional[Any] = None, resume: bool = True) -> Dict[str, Any]:
+    """
+    Crawl the whole site from start_url through a deduplicating crawl frontier
+    
+    Listing pages (home, index, category and pagination pages) are followed up
+    to max_depth link hops and every song page found is scraped once. Progress
+    is checkpointed, so a crawl stopped by max_songs, cancellation or a crash
+    continues where it left off the next time it is started from the same URL.
+    
+    Args:
+        start_url: The URL to start crawling from
+        max_songs: Maximum number of new songs to scrape in this run
+        max_depth: Maximum number of link hops from start_url
+        concurrency: Number of pages fetched in parallel
+        job: Optional scrape_jobs.ScrapeJob that receives progress updates and
+             can cancel the crawl between pages
+        resume: Continue from the checkpoint of an earlier crawl of start_url
+    """
+    logger.info(f"Starting crawl from: {start_url}")
+    
+    try:
+        # Validate URL
+        if "songsofpraise.in" not in start_url:
+            return {
+                'success': False,
+                'message': "URL must be from songsofpraise.in domain for safety reasons."
+            }
+        
+        frontier = CrawlFrontier(start_url, max_depth)
+        resumed = resume and frontier.load_checkpoint()
+        if not resumed:
+            frontier.add(start_url, 0, page_kind(start_url))
+        
+        existing_categories = list(repository.categories())
+        existing_category_urls = {cat['url'] for cat in existing_categories}
+        concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+        
+        new_songs_count = 0
+        pages_crawled = 0
+        unsaved_songs = []
+        last_checkpoint = 0
+        
+        def fetch_page(item: Dict[str, Any]) -> Optional[str]:
+            # None means skipped because the job was cancelled, '' a failed download
+            if job and job.is_cancelled():
+                return None
+            return get_webpage_content(item['url']) or ''
+        
+        def flush_songs() -> None:
+            nonlocal unsaved_songs
+            if unsaved_songs:
+                save_new_songs(unsaved_songs)
+                if job:
+                    job.record_saved(len(unsaved_songs))
+                unsaved_songs = []
+        
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while len(frontier) and new_songs_count < max_songs and not (job and job.is_cancelled()):
+                # Take the next batch; songs come first and only as many as
+                # are still wanted
+                batch = []
+                song_slots = max_songs - new_songs_count
+                while len(frontier) and len(batch) < concurrency:
+                    item = frontier.pop()
+                    if item['kind'] == SONG:
+                        if repository.has_url(item['url']):
+                            continue
+                        if song_slots == 0:
+                            frontier.requeue(item)
+                            break
+                        song_slots -= 1
+                    batch.append(item)
+                if not batch:
+                    continue
+                
+                song_count = sum(1 for item in batch if item['kind'] == SONG)
+                # IDs are reserved per batch and handed out in page order
+                next_id = repository.reserve_ids(song_count) if song_count else 0
+                if job:
+                    job.record_queued(len(batch))
+                
+                # Download the batch with the I/O threads (map() yields in
+                # submission order), then parse it in the parse pool
+                pages = []
+                for item, html in zip(batch, executor.map(fetch_page, batch)):
+                    if html is None:
+                        frontier.requeue(item)
+                        continue
+                    
+                    pages_crawled += 1
+                    if job:
+                        job.record_fetch(bool(html))
+                    song_id = None
+                    if item['kind'] == SONG:
+                        song_id = next_id
+                        next_id += 1
+                    pages.append((item, html, song_id))
+                
+                new_categories = False
+                for (item, _, _), (links, song_data) in zip(pages, map_batches(parse_crawl_pages, pages)):
+                    if links is None:
+                        logger.warning(f"Failed to fetch {item['url']}")
+                        continue
+                    
+                    if song_data is not None and 'error' not in song_data:
+                        logger.info(f"Crawled song {new_songs_count + 1}/{max_songs}: {song_data['title']}")
+                        unsaved_songs.append(song_data)
+                        new_songs_count += 1
+                    
+                    for category in queue_page_links(frontier, links, item['depth']):
+                        if category['url'] not in existing_category_urls:
+                            existing_categories.append(category)
+                            existing_category_urls.add(category['url'])
+                            new_categories = True
+                
+                if new_categories:
+                    save_new_songs([], existing_categories)
+                
+                # Save periodically to avoid data loss
+                if len(unsaved_songs) >= 3:
+                    flush_songs()
+                
+                # Songs are saved before the checkpoint that marks their pages done
+                if pages_crawled - last_checkpoint >= CHECKPOINT_INTERVAL:
+                    flush_songs()
+                    frontier.save_checkpoint()
+                    last_checkpoint = pages_crawled
+        
+        flush_songs()
+        if len(frontier):
+            frontier.save_checkpoint()
+        else:
+            frontier.discard_checkpoint()
+        
+        if job and job.is_cancelled():
+            message = f"Crawl cancelled after {new_songs_count} new songs from {start_url}; {len(frontier)} pages left to resume"
+        elif len(frontier):
+            message = f"Successfully crawled {new_songs_count} new songs from {start_url}; {len(frontier)} pages left to resume"
+        else:
+            message = f"Successfully crawled {new_songs_count} new songs from {start_url}; crawl complete"
+        
+        return {
+            'success': True,
+            'songs_count': repository.count(),
+            'categories_count': len(existing_categories),
+            'new_songs_count': new_songs_count,
+            'pages_crawled': pages_crawled,
+            'pages_pending': len(frontier),
+            'resumed': bool(resumed),
+            'message': message
+        }
+        
+    except Exception as e:
+        logger.error(f"Error during crawl: {str(e)}")
+        return {
+            'success': False,
+            'message': f"An error occurred during crawling: {str(e)}"
+        }
+
 if __name__ == "__main__":
     # Test scraping a single page
     result = scrape_site("https://songsofpraise.in/english/")
@@ -0,0 +1,116 @@
+import io
+import re
+import csv
+import zipfile
+from typing import Dict, Iterable, Iterator, Any
+import json_codec
+
+# Number of songs rendered into each chunk of a streamed export
+EXPORT_CHUNK_SONGS = 50
+
+SEPARATOR = "-" * 80
+
+
+def song_to_text(song: Dict[str, Any]) -> str:
+    """
+    Render a song in the plain-text download format
+    """
+    parts = [f"Title: {song.get('title', 'Untitled')}\n", f"URL: {song.get('url', 'No URL')}\n"]
+    if song.get('categories'):
+        parts.append(f"Categories: {', '.join(song.get('categories', []))}\n")
+    parts.append("\n" + song.get('content', '') + "\n\n")
+    parts.append(SEPARATOR + "\n\n")
+    return ''.join(parts)
+
+
+def _chunked(songs: Iterable[Dict[str, Any]], render) -> Iterator[str]:
+    """Render songs and yield the output in chunks of EXPORT_CHUNK_SONGS"""
+    buffer = []
+    for song in songs:
+        buffer.append(render(song))
+        if len(buffer) >= EXPORT_CHUNK_SONGS:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def export_txt(songs: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """All songs as one text document"""
+    return _chunked(songs, song_to_text)
+
+
+def export_jsonl(songs: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """One JSON object per line"""
+    return _chunked(songs, lambda song: json_codec.dumps(song) + "\n")
+
+
+CSV_FIELDS = ('id', 'title', 'url', 'categories', 'timestamp', 'content', 'lyrics')
+
+
+def export_csv(songs: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Songs as CSV rows, categories joined with '; '"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def render(row) -> str:
+        writer.writerow(row)
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    yield render(CSV_FIELDS)
+    yield from _chunked(songs, lambda song: render([
+        '; '.join(song.get(field, [])) if field == 'categories' else song.get(field, '')
+        for field in CSV_FIELDS
+    ]))
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only, unseekable sink that hands zip bytes back to the caller"""
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def song_filename(song: Dict[str, Any]) -> str:
+    """File name for a song inside the zip export"""
+    slug = re.sub(r'[^\w]+', '-', song.get('title', 'untitled').lower()).strip('-')[:60] or 'untitled'
+    return f"{song.get('id', 0):05d}-{slug}.txt"
+
+
+def export_zip(songs: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """
+    A zip archive with one text file per song, produced incrementally: the
+    stream is unseekable, so zipfile writes data descriptors after each entry
+    instead of seeking back to patch headers
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for song in songs:
+            archive.writestr(song_filename(song), song_to_text(song))
+            data = stream.take()
+            if data:
+                yield data
+    yield stream.take()
+
+
+# format name -> (generator, mimetype, download file name)
+EXPORT_FORMATS = {
+    'txt': (export_txt, 'text/plain', 'all_songs.txt'),
+    'jsonl': (export_jsonl, 'application/x-ndjson', 'all_songs.jsonl'),
+    'csv': (export_csv, 'text/csv', 'all_songs.csv'),
+    'zip': (export_zip, 'application/zip', 'all_songs.zip'),
+}
@@ -0,0 +1,271 @@
+import time
+import heapq
+import hashlib
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+import requests
+from song_repository import repository
+from http_cache import http_cache, HttpCache, response_text
+from models import stored_content_hash
+from fetch_log import fetch_log
+from parse_pool import fetch_and_parse
+from metrics import scrape_stage_duration
+from simplified_scraper import (fetcher, song_from_download, BASE_URL, USER_AGENT, DEFAULT_CONCURRENCY,
+                                MAX_CONCURRENCY)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+REFRESH_MIN_AGE = 7 * 24 * 60 * 60  # Seconds since a song was last checked before it is due again
+DEFAULT_REFRESH_SONGS = 100  # Songs checked per refresh run when the request doesn't say
+REFRESH_SAVE_BATCH = 20  # Checked songs written to the catalog together
+GONE_STATUSES = frozenset({404, 410})
+
+# Fields of a song replaced when its page changed
+REFRESHED_FIELDS = ('title', 'content', 'content_html', 'lyrics', 'chords', 'categories', 'content_hash')
+
+# Outcomes of checking a song
+UNCHANGED = 'unchanged'
+CHANGED = 'changed'
+GONE = 'gone'
+FAILED = 'failed'
+
+REQUEST_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': 'text/html,application/xhtml+xml,application/xml',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+
+def page_hash(body: str) -> str:
+    """Hash of a downloaded page, to skip re-extracting byte-identical pages"""
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def song_fetch(song: Dict[str, Any], fetches: Dict[Any, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Fetch metadata of the song's last refresh: from the fetch log, else from
+    the song itself, where refreshes used to store it
+    """
+    return fetches.get(song['id']) or song.get('fetch') or {}
+
+
+def last_checked(song: Dict[str, Any], fetches: Dict[Any, Dict[str, Any]]) -> float:
+    """When the song's page was last fetched: its last refresh, else when it was scraped"""
+    return song_fetch(song, fetches).get('checked_at') or song.get('timestamp') or 0
+
+
+def due_songs(limit: int, min_age: float = REFRESH_MIN_AGE, now: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    The `limit` songs checked longest ago, among those not checked for at
+    least min_age seconds, oldest first. Only the fields a check needs are
+    kept, so the selection stays small on large catalogs.
+    """
+    cutoff = (now or time.time()) - min_age
+    fetches = fetch_log.load()
+    candidates = (
+        (last_checked(song, fetches), song['id'], song) for song in repository.iter_songs()
+        # Fragment URLs are sections of a page stored under its own URL
+        if song.get('url', '').startswith(BASE_URL) and '#' not in song['url']
+        and last_checked(song, fetches) <= cutoff
+    )
+    return [
+        {
+            'id': song_id,
+            'url': song['url'],
+            'fetch': dict(song_fetch(song, fetches)),
+            # Songs scraped without a hash, or with an older one, are hashed now
+            'content_hash': stored_content_hash(song),
+        }
+        for _, song_id, song in heapq.nsmallest(limit, candidates, key=lambda candidate: candidate[:2])
+    ]
+
+
+def conditional_headers(song: Dict[str, Any], cache: HttpCache = http_cache) -> Dict[str, str]:
+    """
+    Validators from the song's last check, or from the HTTP cache for songs
+    never refreshed, so unchanged pages come back as 304 Not Modified
+    """
+    fetch = song['fetch']
+    if fetch.get('etag') or fetch.get('last_modified'):
+        return HttpCache.conditional_headers(fetch)
+    entry = cache.get(song['url'])
+    return HttpCache.conditional_headers(entry) if entry is not None else {}
+
+
+def check_page(song: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str], str, Dict[str, Any]]:
+    """
+    Conditionally re-fetch a song's page. Returns (song, body, outcome,
+    fetch metadata); body is only set when the page has to be re-extracted,
+    i.e. it was downloaded and differs from the last fetched copy.
+    """
+    now = int(time.time())
+    fetch = dict(song['fetch'], checked_at=now)
+    fetch.pop('error', None)
+    headers = dict(REQUEST_HEADERS, **conditional_headers(song))
+    try:
+        with scrape_stage_duration.time('fetch'):
+            response = fetcher.get(song['url'], headers=headers)
+    except requests.exceptions.RequestException as e:
+        fetch['error'] = str(e)
+        return song, None, FAILED, fetch
+
+    fetch['status'] = response.status_code
+    if response.status_code == 304:
+        return song, None, UNCHANGED, fetch
+    if response.status_code in GONE_STATUSES:
+        return song, None, GONE, fetch
+    if response.status_code >= 400:
+        fetch['error'] = f"HTTP {response.status_code}"
+        return song, None, FAILED, fetch
+
+    body = response_text(response)
+    fetch['etag'] = response.headers.get('ETag')
+    fetch['last_modified'] = response.headers.get('Last-Modified')
+    digest = page_hash(body)
+    if digest == fetch.get('page_hash'):
+        return song, None, UNCHANGED, fetch
+    fetch['page_hash'] = digest
+    # Keep the HTTP cache in step for later scrapes of the same URL
+    http_cache.put(song['url'], body, fetch['etag'], fetch['last_modified'])
+    return song, body, CHANGED, fetch
+
+
+def extract_checked_pages(pages: List[Optional[Tuple[Dict[str, Any], Optional[str], str, Dict[str, Any]]]]) -> List[Any]:
+    """
+    Re-extract the changed pages of a batch of checked songs; runs in the
+    parse pool. Each result is (song, outcome, fetch metadata, song record
+    or None), or None for a page skipped by cancellation.
+    """
+    results = []
+    for page in pages:
+        if page is None:
+            results.append(None)
+            continue
+        song, body, outcome, fetch = page
+        record = song_from_download(song['url'], song['id'], body) if body else None
+        results.append((song, outcome, fetch, record))
+    return results
+
+
+def refresh_update(song: Dict[str, Any], outcome: str, fetch: Dict[str, Any],
+                   record: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    The final outcome of a check, the fetch metadata to log, and the
+    re-extracted fields to store when the song itself changed (else None)
+    """
+    if record is None:
+        return outcome, fetch, None
+    if 'error' in record:
+        # Forget the page hash so the same page is extracted again next time
+        fetch = dict(fetch, error=record['error'])
+        fetch.pop('page_hash', None)
+        return FAILED, fetch, None
+    if record['content_hash'] == song['content_hash']:
+        # The page changed around the song (e.g. view counters), not the song
+        return UNCHANGED, fetch, None
+    fields = {field: record[field] for field in REFRESHED_FIELDS}
+    return CHANGED, dict(fetch, changed_at=fetch['checked_at']), fields
+
+
+def refresh_songs(max_songs: int = DEFAULT_REFRESH_SONGS, min_age: float = REFRESH_MIN_AGE,
+                  concurrency: int = DEFAULT_CONCURRENCY, job: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Re-check known songs whose pages were fetched longest ago and update
+    those that changed on the site, in place (same id, URL and timestamp).
+
+    Pages are requested with the validators of the last fetch, so unchanged
+    pages cost a 304; pages downloaded again are only re-extracted when they
+    differ from the last copy, and a song is only rewritten when its content
+    hash changed. Every checked song gets its fetch metadata (checked_at,
+    status, ETag/Last-Modified, page hash) written to the fetch log, which
+    moves it to the back of the refresh queue without touching the catalog.
+
+    Args:
+        max_songs: Maximum number of songs to check
+        min_age: Only songs not checked for this many seconds are due
+        concurrency: Number of pages fetched in parallel
+        job: Optional scrape_jobs.ScrapeJob that receives progress updates and
+             can cancel the refresh between pages
+    """
+    try:
+        songs = due_songs(max_songs, min_age)
+    except Exception as e:
+        logger.error(f"Error selecting songs to refresh: {str(e)}")
+        return {
+            'success': False,
+            'message': f"An error occurred: {str(e)}"
+        }
+
+    if not songs:
+        return {
+            'success': True,
+            'songs_count': repository.count(),
+            'checked_count': 0,
+            'changed_count': 0,
+            'message': "No songs are due for a refresh."
+        }
+
+    logger.info(f"Refreshing {len(songs)} songs")
+    if job:
+        job.record_queued(len(songs))
+
+    def fetch_song(song: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], Optional[str], str, Dict[str, Any]]]:
+        # Pages not yet started when the job is cancelled are skipped
+        if job and job.is_cancelled():
+            return None
+        return check_page(song)
+
+    counts = {UNCHANGED: 0, CHANGED: 0, GONE: 0, FAILED: 0}
+    changed: Dict[int, Dict[str, Any]] = {}
+    fetches: Dict[int, Dict[str, Any]] = {}
+
+    def save_updates() -> None:
+        try:
+            with scrape_stage_duration.time('save'):
+                if changed:
+                    # An error placeholder that now extracts is replaced by the
+                    # song; fetch metadata moves to the fetch log
+                    repository.update_songs(changed, removed=('error', 'fetch'))
+                # Logged only once the songs are saved, or a failed save
+                # would leave their new page hash marking them unchanged
+                fetch_log.update(fetches)
+        except Exception as e:
+            logger.error(f"Error saving refreshed songs: {str(e)}")
+        if job:
+            job.record_saved(len(changed))
+        changed.clear()
+        fetches.clear()
+
+    concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+    for result in fetch_and_parse(songs, fetch_song, extract_checked_pages, concurrency):
+        if result is None:
+            continue
+        song, outcome, fetch, record = result
+        outcome, fetches[song['id']], fields = refresh_update(song, outcome, fetch, record)
+        counts[outcome] += 1
+        if job:
+            job.record_fetch(outcome != FAILED)
+        if outcome == CHANGED:
+            logger.info(f"Song {song['id']} changed on the site: {song['url']}")
+            changed[song['id']] = fields
+        if len(fetches) >= REFRESH_SAVE_BATCH:
+            save_updates()
+    if fetches:
+        save_updates()
+
+    checked_count = sum(counts.values())
+    cancelled = bool(job and job.is_cancelled())
+    message = (f"Checked {checked_count} songs: {counts[CHANGED]} changed, {counts[UNCHANGED]} unchanged, "
+               f"{counts[GONE]} gone, {counts[FAILED]} failed")
+    return {
+        'success': True,
+        'songs_count': repository.count(),
+        'checked_count': checked_count,
+        'changed_count': counts[CHANGED],
+        'unchanged_count': counts[UNCHANGED],
+        'gone_count': counts[GONE],
+        'failed_count': counts[FAILED],
+        'message': f"Refresh cancelled. {message}" if cancelled else message
+    }
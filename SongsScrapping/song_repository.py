@@ -0,0 +1,701 @@
+import os
+import atexit
+import bisect
+import logging
+import threading
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+from search_index import SearchIndex, SEARCH_INDEX_PATH
+from related_songs import RelatedSongsIndex
+from models import Song
+from history_index import HistoryIndex, HISTORY_INDEX_PATH
+from duplicates import DuplicateIndex, DUPLICATE_INDEX_PATH, merged_fields
+from song_store import SongStore, atomic_write_json, LEGACY_SONGS_PATH
+from metrics import json_duration, search_duration
+import json_codec
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Storage paths
+SONGS_PATH = LEGACY_SONGS_PATH  # Imported into the song log (data/songs.jsonl) on first use
+CATEGORIES_PATH = 'data/categories.json'
+
+# Signature that never matches a real file, so the first read always loads
+NOT_LOADED = (-1, -1)
+
+# Seconds after a write before the search, history and duplicate indexes are
+# persisted; writes in between are saved together
+INDEX_SAVE_DELAY = 30.0
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Return (mtime_ns, size) for a file, or None if it does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def as_record(song: Dict[str, Any]) -> Song:
+    """The compact in-memory record for a song dict"""
+    return song if isinstance(song, Song) else Song.from_dict(song)
+
+
+def song_categories(song: Dict[str, Any]) -> List[str]:
+    """A song's categories, lowercased and without repeats"""
+    return list(dict.fromkeys(category.lower() for category in song.get('categories', [])))
+
+
+class SongRepository:
+    """
+    In-process view of the song catalog stored in the append-only song log.
+
+    The log is replayed once into compact models.Song records, which read
+    like the song dicts they came from, and kept in memory together with id,
+    url and category indexes, a full-text search index, a related-songs
+    index, daily history buckets and a near-duplicate (MinHash/LSH) index.
+    The search, history and duplicate indexes are persisted next to the log
+    and reused when they match its signature. They are written a few
+    seconds after the last change, on compaction and at exit rather than on
+    every write, so a crawl saving a few songs at a time doesn't rewrite
+    them each time.
+    Every read checks the file's mtime/size and reloads only when it has changed on disk, e.g.
+    after another process appended new songs. Appends are read from where
+    the last read stopped and applied like this process's own writes, to
+    the changed songs only; the log is loaded in full again only after it
+    was replaced, e.g. compacted by another process.
+    """
+    def __init__(self, store: Optional[SongStore] = None, categories_path: str = CATEGORIES_PATH,
+                 search_index_path: str = SEARCH_INDEX_PATH, history_index_path: str = HISTORY_INDEX_PATH,
+                 duplicate_index_path: str = DUPLICATE_INDEX_PATH):
+        self._store = store or SongStore()
+        self.songs_path = self._store.path
+        self.categories_path = categories_path
+        self.search_index_path = search_index_path
+        self.history_index_path = history_index_path
+        self.duplicate_index_path = duplicate_index_path
+        self._lock = threading.RLock()
+
+        self._songs_signature: Optional[Tuple[int, int]] = NOT_LOADED
+        self._loaded = False
+        self._songs: Optional[List[Dict[str, Any]]] = []  # Built from _by_id when None
+        self._by_id: Dict[int, Dict[str, Any]] = {}
+        self._by_url: Dict[str, Dict[str, Any]] = {}
+        self._by_category: Dict[str, List[Dict[str, Any]]] = {}
+        self._recent: List[Dict[str, Any]] = []
+        self._sorted_ids: List[int] = []
+        self._sequence: Dict[Any, int] = {}  # Song id -> position in the log's replay order
+        self._next_sequence = 0
+        self._search_index = SearchIndex()
+        self._related = RelatedSongsIndex()
+        self._history = HistoryIndex()
+        self._duplicates = DuplicateIndex()
+
+        self._categories_signature: Optional[Tuple[int, int]] = None
+        self._categories: List[Dict[str, Any]] = []
+
+        self._compacting = False
+        self._index_save_timer: Optional[threading.Timer] = None
+        self._indexes_dirty = False
+        atexit.register(self.flush_indexes)
+        self._version = 0  # Moves whenever songs or categories are loaded or written
+
+    # Loading
+
+    def _refresh_songs(self) -> None:
+        """Reload songs from disk if the file changed since the last load"""
+        signature = file_signature(self.songs_path)
+        if signature == self._songs_signature:
+            return
+
+        with self._lock:
+            signature = file_signature(self.songs_path)
+            if signature == self._songs_signature:
+                return
+
+            if self._loaded:
+                records = self._store.read_new()
+                if records is not None:
+                    self._apply_records(records)
+                    self._adopt_signature(self._store_signature())
+                    return
+
+            try:
+                songs = [Song.from_dict(song) for song in self._store.load()]
+                logger.info(f"Loaded {len(songs)} songs from {self.songs_path}")
+            except Exception as e:
+                logger.error(f"Error loading songs data: {str(e)}")
+                raise
+            # Loading may have migrated the legacy file or dropped a torn
+            # record, and others may have appended while it ran
+            signature = self._store_signature()
+
+            self._build_indexes(songs)
+            self._songs_signature = signature
+            self._load_search_index(songs, signature)
+            self._load_history_index(songs, signature)
+            self._load_duplicate_index(songs, signature)
+            self._related.rebuild(songs)
+            self._loaded = True
+
+    def _apply_records(self, records: List[Dict[str, Any]]) -> None:
+        """Apply log records another process appended, in the order they were written"""
+        if not records:
+            return
+        changed: Dict[Any, Dict[str, Any]] = {}
+        deleted_ids = set()
+        for record in records:
+            if record.get('op') == 'delete':
+                changed.pop(record.get('id'), None)
+                deleted_ids.add(record.get('id'))
+            else:
+                song = record['song']
+                changed[song.get('id')] = song
+        # A song deleted and then written again moves to the end, as when the
+        # log is replayed from the start
+        self._apply_changes([Song.from_dict(song) for song in changed.values()], list(deleted_ids))
+        logger.info(f"Loaded {len(changed)} changed and {len(deleted_ids)} deleted songs from {self.songs_path}")
+
+    def _store_signature(self) -> Optional[Tuple[int, int]]:
+        """
+        Signature of the song log if it holds exactly the records loaded or
+        written here (the store's position is its end), else NOT_LOADED so
+        the next read picks up what other processes wrote
+        """
+        try:
+            stat = os.stat(self.songs_path)
+        except OSError:
+            return None
+        if stat.st_ino != self._store.inode or stat.st_size != self._store.offset:
+            return NOT_LOADED
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_search_index(self, songs: List[Dict[str, Any]], signature: Optional[Tuple[int, int]]) -> None:
+        """Use the persisted search index if it matches the catalog, else rebuild it"""
+        index = SearchIndex.load(self.search_index_path)
+        if index is not None and index.signature == signature:
+            self._search_index = index
+            return
+
+        logger.info(f"Rebuilding search index for {len(songs)} songs")
+        index = SearchIndex()
+        index.rebuild(songs)
+        index.signature = signature
+        self._search_index = index
+        if signature is not None:
+            self._save_search_index()
+
+    def _save_search_index(self) -> None:
+        """Persist the search index, logging rather than failing on errors"""
+        try:
+            self._search_index.save(self.search_index_path)
+        except Exception as e:
+            logger.error(f"Error saving search index: {str(e)}")
+
+    def _load_history_index(self, songs: List[Dict[str, Any]], signature: Optional[Tuple[int, int]]) -> None:
+        """Use the persisted history index if it matches the catalog, else rebuild it"""
+        index = HistoryIndex.load(self.history_index_path)
+        if index is not None and index.signature == signature:
+            self._history = index
+            return
+
+        index = HistoryIndex()
+        index.rebuild(songs)
+        index.signature = signature
+        self._history = index
+        if signature is not None:
+            self._save_history_index()
+
+    def _save_history_index(self) -> None:
+        """Persist the history index, logging rather than failing on errors"""
+        try:
+            self._history.save(self.history_index_path)
+        except Exception as e:
+            logger.error(f"Error saving history index: {str(e)}")
+
+    def _load_duplicate_index(self, songs: List[Dict[str, Any]], signature: Optional[Tuple[int, int]]) -> None:
+        """Use the persisted duplicate index if it matches the catalog, else rebuild it"""
+        index = DuplicateIndex.load(self.duplicate_index_path)
+        if index is not None and index.signature == signature:
+            self._duplicates = index
+            return
+
+        logger.info(f"Rebuilding duplicate index for {len(songs)} songs")
+        index = DuplicateIndex()
+        index.rebuild(songs)
+        index.signature = signature
+        self._duplicates = index
+        if signature is not None:
+            self._save_duplicate_index()
+
+    def _save_duplicate_index(self) -> None:
+        """Persist the duplicate index, logging rather than failing on errors"""
+        try:
+            self._duplicates.save(self.duplicate_index_path)
+        except Exception as e:
+            logger.error(f"Error saving duplicate index: {str(e)}")
+
+    def _refresh_categories(self) -> None:
+        """Reload categories from disk if the file changed since the last load"""
+        signature = file_signature(self.categories_path)
+        if signature == self._categories_signature:
+            return
+
+        with self._lock:
+            categories = []
+            if signature is not None:
+                with open(self.categories_path, 'rb') as f, json_duration.time('load', 'categories'):
+                    categories = json_codec.load(f)
+            self._categories = categories
+            self._categories_signature = signature
+            self._version += 1
+
+    def _build_indexes(self, songs: List[Dict[str, Any]]) -> None:
+        """Rebuild the in-memory lookup tables for a list of songs"""
+        by_id = {}
+        by_url = {}
+        by_category: Dict[str, List[Dict[str, Any]]] = {}
+
+        for song in songs:
+            by_id[song.get('id')] = song
+            if song.get('url'):
+                by_url[song['url']] = song
+            # URLs of duplicates merged into the song
+            for url in song.get('aliases') or []:
+                by_url.setdefault(url, song)
+            for category in song_categories(song):
+                by_category.setdefault(category, []).append(song)
+
+        sorted_ids = sorted(song_id for song_id in by_id if song_id is not None)
+
+        self._songs = songs
+        self._by_id = by_id
+        self._sequence = {song_id: i for i, song_id in enumerate(by_id)}
+        self._next_sequence = len(by_id)
+        self._by_url = by_url
+        self._by_category = by_category
+        self._recent = sorted(songs, key=self._recency_key)
+        self._sorted_ids = sorted_ids
+        self._version += 1
+
+    def _file_order_key(self, song: Dict[str, Any]) -> int:
+        """Sort key keeping songs in the order they were first written to the log"""
+        return self._sequence[song.get('id')]
+
+    def _recency_key(self, song: Dict[str, Any]) -> Tuple[int, int]:
+        """Sort key putting the most recently added songs first, then file order"""
+        return -song.get('timestamp', 0), self._sequence[song.get('id')]
+
+    def _apply_changes(self, changed: List[Dict[str, Any]], deleted_ids: List[Any]) -> None:
+        """
+        Bring the lookup tables and indexes up to date for changed and
+        deleted songs only, keeping them in the order a full load gives.
+        Lists handed out to readers (recent songs, a category's songs) are
+        replaced by updated copies rather than edited.
+        """
+        by_id = self._by_id
+        recent = list(self._recent)
+        categories: Dict[str, List[Dict[str, Any]]] = {}  # Updated copies of the lists changed
+
+        def category_songs(category: str) -> List[Dict[str, Any]]:
+            if category not in categories:
+                categories[category] = list(self._by_category.get(category, ()))
+            return categories[category]
+
+        def unindex(song: Dict[str, Any]) -> None:
+            for category in song_categories(song):
+                songs = category_songs(category)
+                del songs[bisect.bisect_left(songs, self._file_order_key(song), key=self._file_order_key)]
+            for url in [song.get('url')] + list(song.get('aliases') or []):
+                if url and self._by_url.get(url) is song:
+                    del self._by_url[url]
+            del recent[bisect.bisect_left(recent, self._recency_key(song), key=self._recency_key)]
+
+        for song_id in deleted_ids:
+            song = by_id.get(song_id)
+            if song is not None:
+                unindex(song)
+                del by_id[song_id]
+                del self._sequence[song_id]
+                if song_id is not None:
+                    del self._sorted_ids[bisect.bisect_left(self._sorted_ids, song_id)]
+            self._search_index.remove(song_id)
+            self._related.remove(song_id)
+            self._history.remove(song_id)
+            self._duplicates.remove(song_id)
+
+        for song in changed:
+            song_id = song.get('id')
+            previous = by_id.get(song_id)
+            if previous is not None:
+                unindex(previous)
+            else:
+                self._sequence[song_id] = self._next_sequence
+                self._next_sequence += 1
+                if song_id is not None:
+                    bisect.insort(self._sorted_ids, song_id)
+            by_id[song_id] = song
+
+            for category in song_categories(song):
+                bisect.insort(category_songs(category), song, key=self._file_order_key)
+            if song.get('url'):
+                self._by_url[song['url']] = song
+            for url in song.get('aliases') or []:
+                self._by_url.setdefault(url, song)
+            bisect.insort(recent, song, key=self._recency_key)
+
+            self._search_index.add(song)
+            self._related.add(song)
+            self._history.add(song)
+            self._duplicates.add(song)
+
+        for category, songs in categories.items():
+            if songs:
+                self._by_category[category] = songs
+            else:
+                self._by_category.pop(category, None)
+        self._recent = recent
+        self._songs = None
+        self._version += 1
+
+    def _adopt_signature(self, signature: Optional[Tuple[int, int]]) -> None:
+        """Record the song log signature the songs and indexes in memory now match"""
+        self._songs_signature = signature
+        self._search_index.signature = signature
+        self._history.signature = signature
+        self._duplicates.signature = signature
+        self._schedule_index_save()
+
+    # Reads
+
+    def exists(self) -> bool:
+        """Whether song data is available"""
+        return self._store.exists()
+
+    def version(self) -> int:
+        """
+        Catalog version; changes whenever songs or categories are written,
+        here or by another process
+        """
+        self._refresh_songs()
+        self._refresh_categories()
+        return self._version
+
+    def all(self) -> List[Dict[str, Any]]:
+        """All songs in file order. Callers must not mutate the result."""
+        self._refresh_songs()
+        songs = self._songs
+        if songs is None:
+            songs = self._songs = list(self._by_id.values())
+        return songs
+
+    def iter_songs(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over a snapshot of all songs, e.g. for streaming exports"""
+        return iter(self.all())
+
+    def page(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Songs ordered by id, starting after `after_id`"""
+        self._refresh_songs()
+        start = 0 if after_id is None else bisect.bisect_right(self._sorted_ids, after_id)
+        end = None if limit is None else start + limit
+        return [self._by_id[song_id] for song_id in self._sorted_ids[start:end]]
+
+    def get(self, song_id: int) -> Optional[Dict[str, Any]]:
+        """Look up a song by id"""
+        self._refresh_songs()
+        return self._by_id.get(song_id)
+
+    def count(self) -> int:
+        """Number of songs in the catalog"""
+        self._refresh_songs()
+        return len(self._by_id)
+
+    def max_id(self) -> int:
+        """Highest song id in the catalog, or 0 if it is empty"""
+        self._refresh_songs()
+        return self._sorted_ids[-1] if self._sorted_ids else 0
+
+    def has_url(self, url: str) -> bool:
+        """Whether a song with this source URL is stored"""
+        self._refresh_songs()
+        return url in self._by_url
+
+    def get_by_url(self, url: str) -> Optional[Dict[str, Any]]:
+        """Look up a song by its source URL"""
+        self._refresh_songs()
+        return self._by_url.get(url)
+
+    def by_category(self, category_name: str) -> List[Dict[str, Any]]:
+        """Songs tagged with a category (case-insensitive)"""
+        self._refresh_songs()
+        return self._by_category.get(category_name.lower(), [])
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Songs ordered by most recently added"""
+        self._refresh_songs()
+        if limit is None:
+            return self._recent
+        return self._recent[:limit]
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Songs matching a full-text query, best match first"""
+        self._refresh_songs()
+        by_id = self._by_id
+        with search_duration.time():
+            return [by_id[song_id] for song_id, _ in self._search_index.search(query, limit)
+                    if song_id in by_id]
+
+    def neighbors(self, song_id: int) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Return the (previous, next) songs by id"""
+        self._refresh_songs()
+        position = bisect.bisect_left(self._sorted_ids, song_id)
+        if position == len(self._sorted_ids) or self._sorted_ids[position] != song_id:
+            return None, None
+
+        prev_song = self._by_id[self._sorted_ids[position - 1]] if position > 0 else None
+        next_song = None
+        if position < len(self._sorted_ids) - 1:
+            next_song = self._by_id[self._sorted_ids[position + 1]]
+        return prev_song, next_song
+
+    def related(self, song_id: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Songs most related to a song by shared categories and lyrics, best first"""
+        self._refresh_songs()
+        by_id = self._by_id
+        return [by_id[other_id] for other_id in self._related.related(song_id, limit) if other_id in by_id]
+
+    def duplicates(self, song_id: int) -> List[Tuple[Dict[str, Any], float]]:
+        """(song, similarity) of the near-duplicates of a song, most similar first"""
+        self._refresh_songs()
+        by_id = self._by_id
+        return [(by_id[other_id], score) for other_id, score in self._duplicates.duplicates_of(song_id)
+                if other_id in by_id]
+
+    def duplicate_clusters(self) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        Clusters of near-duplicate songs, largest first; each lists (song,
+        similarity to the cluster's first song) by id
+        """
+        self._refresh_songs()
+        by_id = self._by_id
+        clusters = []
+        for cluster in self._duplicates.clusters():
+            songs = [(by_id[song_id], score) for song_id, score in cluster if song_id in by_id]
+            if len(songs) > 1:
+                clusters.append(songs)
+        return clusters
+
+    def history(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                offset: int = 0, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Days with scraped songs in an inclusive YYYY-MM-DD range, newest
+        first, as {'date', 'count', 'songs'} with the songs sorted by title.
+        Returns one page of days and the total number of matching days.
+        """
+        self._refresh_songs()
+        days = self._history.days(start_date, end_date)
+        page = days[offset:] if limit is None else days[offset:offset + limit]
+        by_id = self._by_id
+        return [{
+            'date': day,
+            'count': count,
+            'songs': [by_id[song_id] for song_id in self._history.song_ids(day) if song_id in by_id],
+        } for day, count in page], len(days)
+
+    def categories(self) -> List[Dict[str, Any]]:
+        """All categories"""
+        self._refresh_categories()
+        return self._categories
+
+    # Writes
+
+    def reserve_ids(self, count: int) -> int:
+        """
+        Reserve `count` consecutive new song ids and return the first one, so
+        concurrent scrapes never hand out the same id, in this process or
+        any other sharing the song log
+        """
+        with self._lock:
+            return self._store.reserve_ids(count, self.max_id())
+
+    def add_songs(self, songs: List[Dict[str, Any]]) -> None:
+        """Append newly scraped songs to the catalog"""
+        if not songs:
+            return
+        records = [as_record(song) for song in songs]
+        with self._lock:
+            self._refresh_songs()
+            self._commit(records, [])
+
+    def save(self, songs: List[Dict[str, Any]]) -> None:
+        """
+        Persist a full song list.
+
+        Songs that are the same objects as the ones already loaded, or equal
+        to them, are unchanged, so only new or edited songs are appended to
+        the log and re-indexed, and missing ids are recorded as deletions.
+        """
+        records = [as_record(song) for song in songs]
+        with self._lock:
+            self._refresh_songs()
+            previous_by_id = self._by_id
+            new_ids = {record.get('id') for record in records}
+
+            changed = []
+            for record in records:
+                previous = previous_by_id.get(record.get('id'))
+                if previous is not record and previous != record:
+                    changed.append(record)
+            deleted_ids = [song_id for song_id in previous_by_id if song_id not in new_ids]
+            self._commit(changed, deleted_ids)
+
+    def save_categories(self, categories: List[Dict[str, Any]]) -> None:
+        """Write the category list"""
+        with self._lock:
+            atomic_write_json(self.categories_path, categories, target='categories')
+            self._categories = categories
+            self._categories_signature = file_signature(self.categories_path)
+            self._version += 1
+            logger.info(f"Saved {len(categories)} categories to {self.categories_path}")
+
+    def update_song(self, song_id: int, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update fields of a stored song and persist the change"""
+        with self._lock:
+            self._refresh_songs()
+            song = self._by_id.get(song_id)
+            if song is None:
+                return None
+            # Edited as a copy that replaces the stored song only once it is
+            # written, so a failed write leaves memory matching the log
+            song = Song.from_dict(song)
+            song.update(fields)
+            self._commit([song], [])
+            return song
+
+    def update_songs(self, updates: Dict[int, Dict[str, Any]], removed: Iterable[str] = ()) -> int:
+        """
+        Update fields of several stored songs, dropping the `removed` keys
+        from each, and persist them in one write. Returns how many songs were
+        found and updated.
+        """
+        removed = tuple(removed)
+        with self._lock:
+            self._refresh_songs()
+            changed = []
+            for song_id, fields in updates.items():
+                song = self._by_id.get(song_id)
+                if song is None:
+                    continue
+                song = Song.from_dict(song)
+                song.update(fields)
+                for key in removed:
+                    song.pop(key, None)
+                changed.append(song)
+            if changed:
+                self._commit(changed, [])
+            return len(changed)
+
+    def merge_songs(self, keep_id: int, duplicate_ids: Iterable[int]) -> Optional[Dict[str, Any]]:
+        """
+        Merge duplicates into the song kept: it gains their categories and
+        their URLs as aliases, and the duplicates are deleted. Returns the
+        kept song, or None if it doesn't exist.
+        """
+        with self._lock:
+            self._refresh_songs()
+            keep = self._by_id.get(keep_id)
+            if keep is None:
+                return None
+            duplicates = [self._by_id[song_id] for song_id in dict.fromkeys(duplicate_ids)
+                          if song_id != keep_id and song_id in self._by_id]
+            deleted_ids = [song.get('id') for song in duplicates]
+            keep = Song.from_dict(keep)
+            keep.update(merged_fields(keep, duplicates))
+            self._commit([keep], deleted_ids)
+            return keep
+
+    def _commit(self, changed: List[Dict[str, Any]], deleted_ids: List[Any]) -> None:
+        """Append changes to the store and bring the in-memory indexes up to date"""
+        self._store.append(changed, deleted_ids)
+        self._apply_changes(changed, deleted_ids)
+        # If another process appended since our last load, its records aren't
+        # in memory: the signature then stays unmatched, so the next read
+        # loads them instead of taking them as seen
+        self._adopt_signature(self._store_signature())
+        logger.info(f"Saved {len(changed)} changed and {len(deleted_ids)} deleted songs to {self.songs_path}")
+
+        if not self._compacting and self._store.needs_compaction(len(self._by_id)):
+            self._compacting = True
+            threading.Thread(target=self._compact, name='song-store-compaction', daemon=True).start()
+
+    def _schedule_index_save(self) -> None:
+        """Persist the indexes INDEX_SAVE_DELAY seconds from now, unless a save is already due"""
+        self._indexes_dirty = True
+        if self._index_save_timer is None:
+            self._index_save_timer = threading.Timer(INDEX_SAVE_DELAY, self.flush_indexes)
+            self._index_save_timer.name = 'song-index-save'
+            self._index_save_timer.daemon = True
+            self._index_save_timer.start()
+
+    def flush_indexes(self) -> None:
+        """Persist the search, history and duplicate indexes if they changed since the last save"""
+        with self._lock:
+            if self._index_save_timer is not None:
+                self._index_save_timer.cancel()
+                self._index_save_timer = None
+            if not self._indexes_dirty:
+                return
+            self._indexes_dirty = False
+            self._save_search_index()
+            self._save_history_index()
+            self._save_duplicate_index()
+
+    def _compact(self) -> None:
+        """Rewrite the song log without superseded records, off the request path"""
+        try:
+            with self._lock:
+                # Records other processes appended since our last load must be
+                # in the snapshot: only records after the store's position,
+                # up to which we hold every record, are copied over
+                self._refresh_songs()
+                if self._songs_signature is None:
+                    return
+                songs = list(self.all())
+                inode, offset = self._store.inode, self._store.offset
+            tmp_path = self._store.write_snapshot(songs)
+
+            with self._lock:
+                if self._store.swap_snapshot(tmp_path, offset, len(songs), inode) is None:
+                    return
+                # Only adopt the new file as our own if nothing was written
+                # after the snapshot; otherwise the next read reloads it
+                signature = self._store_signature()
+                if signature != NOT_LOADED:
+                    self._adopt_signature(signature)
+                    self.flush_indexes()
+            logger.info(f"Compacted {self.songs_path} to {len(songs)} songs")
+        except Exception as e:
+            logger.error(f"Error compacting song log: {str(e)}")
+        finally:
+            self._compacting = False
+
+
+# Storage engine: 'jsonl' (append-only log with in-memory indexes) or 'sqlite'
+STORAGE_ENGINE = os.environ.get('SONG_STORAGE_ENGINE', 'jsonl')
+
+
+def create_repository(engine: str = STORAGE_ENGINE):
+    """
+    Create the song repository for a storage engine
+    """
+    if engine == 'sqlite':
+        from sqlite_store import SQLiteSongRepository
+        return SQLiteSongRepository()
+    return SongRepository()
+
+
+# Shared repository used by the web app and scrapers
+repository = create_repository()
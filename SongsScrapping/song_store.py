@@ -0,0 +1,351 @@
+import os
+import fcntl
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, List, Any, Iterable, Iterator, Optional, Tuple
+from metrics import json_duration
+import json_codec
+from json_codec import PRETTY_ON_DISK
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Storage paths
+SONGS_LOG_PATH = 'data/songs.jsonl'
+LEGACY_SONGS_PATH = 'data/songs.json'
+
+# Compact once the log holds this many more records than live songs
+COMPACTION_MIN_GARBAGE = 500
+
+# Bytes read at a time when looking back for the end of the last complete line
+TAIL_CHUNK_SIZE = 64 * 1024
+
+
+def atomic_write_json(path: str, data: Any, target: str = 'file', indent: bool = PRETTY_ON_DISK) -> None:
+    """
+    Write JSON to a temporary file and rename it over the target, so readers
+    never see a half-written file. `target` names the file in the JSON metrics.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f, json_duration.time('dump', target):
+        json_codec.dump(data, f, indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _encode(record: Dict[str, Any]) -> bytes:
+    return json_codec.dumps_bytes(record) + b'\n'
+
+
+class SongStore:
+    """
+    Append-only JSON Lines log of song records.
+
+    Each line is either {"op": "put", "song": {...}} or {"op": "delete",
+    "id": ...}; replaying the log gives the catalog, with the last record
+    for an id winning. New and edited songs are appended, so a save costs
+    O(changed songs) bytes. Superseded records are removed by compaction,
+    which rewrites the live songs to a new file and renames it into place.
+
+    Every write (appends, migration, compaction swaps and crash repair)
+    holds an exclusive flock shared by all processes using the log, so
+    under the lock every line is complete. An unterminated final line seen
+    under the lock is therefore left by a crash and is cut off; one seen
+    while reading may be an append in progress and is only skipped. A
+    corrupt line elsewhere is skipped and logged, never truncated.
+    """
+    def __init__(self, path: str = SONGS_LOG_PATH, legacy_path: str = LEGACY_SONGS_PATH):
+        self.path = path
+        self.ids_path = f"{path}.ids"  # Last song id handed out by reserve_ids()
+        # Locked rather than the log itself, which compaction replaces
+        self.lock_path = f"{path}.lock"
+        self.legacy_path = legacy_path
+        self.record_count = 0
+        # Position up to which this store's caller has every record: the
+        # log file's inode and a byte offset in it. Compaction copies what
+        # follows it, and appends tell whether others wrote since.
+        self.inode: Optional[int] = None
+        self.offset = 0
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path) or os.path.exists(self.legacy_path)
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """Hold the log's write lock, against other threads and other processes"""
+        with self._lock, open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    # Migration
+
+    def migrate_legacy(self) -> bool:
+        """
+        Import data/songs.json into the log the first time the store is used.
+        Returns True if a migration happened.
+        """
+        if os.path.exists(self.path) or not os.path.exists(self.legacy_path):
+            return False
+
+        with self._exclusive():
+            # Another process may have migrated while we waited for the lock
+            if os.path.exists(self.path):
+                return False
+            with open(self.legacy_path, 'rb') as f, json_duration.time('load', 'legacy_songs'):
+                songs = json_codec.load(f)
+            tmp_path = self._write_snapshot_file(f"{self.path}.migrate", songs)
+            os.replace(tmp_path, self.path)
+        logger.info(f"Migrated {len(songs)} songs from {self.legacy_path} to {self.path}")
+        return True
+
+    # Reading
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Replay the log and return the live songs in insertion order"""
+        self.migrate_legacy()
+        songs: Dict[Any, Dict[str, Any]] = {}
+        record_count = 0
+        offset = 0
+
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            self.record_count = 0
+            self.inode = None
+            self.offset = 0
+            return []
+        with f, json_duration.time('load', 'song_log'):
+            inode = os.fstat(f.fileno()).st_ino
+            for offset, record in self._read_records(f, offset):
+                record_count += 1
+                if record is None:
+                    continue
+                if record.get('op') == 'delete':
+                    songs.pop(record.get('id'), None)
+                else:
+                    song = record['song']
+                    songs[song.get('id')] = song
+            unterminated = offset < os.fstat(f.fileno()).st_size
+
+        if unterminated:
+            self._drop_torn_tail(inode)
+
+        self.record_count = record_count
+        self.inode = inode
+        self.offset = offset
+        return list(songs.values())
+
+    def read_new(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Return the records appended since the last load or read, in order,
+        or None if the log was replaced (compacted, or removed) since and
+        has to be loaded again
+        """
+        if self.inode is None:
+            return None
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return None
+        records = []
+        with f, json_duration.time('load', 'song_log'):
+            stat = os.fstat(f.fileno())
+            if stat.st_ino != self.inode or stat.st_size < self.offset:
+                return None
+            f.seek(self.offset)
+            offset = self.offset
+            for offset, record in self._read_records(f, offset):
+                self.record_count += 1
+                if record is not None:
+                    records.append(record)
+            unterminated = offset < os.fstat(f.fileno()).st_size
+
+        if unterminated:
+            self._drop_torn_tail(self.inode)
+        self.offset = offset
+        return records
+
+    def _read_records(self, f: BinaryIO, offset: int) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+        """
+        Yield (offset after the line, record) for each complete line from the
+        file's position, which is `offset`, with None for corrupt records.
+        Stops at an unterminated line.
+        """
+        for raw_line in f:
+            if not raw_line.endswith(b'\n'):
+                return
+            offset += len(raw_line)
+            try:
+                record = json_codec.loads(raw_line)
+            except ValueError:
+                logger.warning(f"Skipping corrupt record at byte {offset - len(raw_line)} of {self.path}")
+                record = None
+            yield offset, record
+
+    def _drop_torn_tail(self, inode: int) -> None:
+        """
+        Cut off an unterminated final line if it is still there under the
+        write lock, i.e. it was left by a crash rather than being an append
+        in progress when it was read
+        """
+        with self._exclusive():
+            try:
+                f = open(self.path, 'r+b')
+            except FileNotFoundError:
+                return
+            with f:
+                # Compacted in the meantime: the new file has no torn tail
+                if os.fstat(f.fileno()).st_ino == inode:
+                    self._truncate_torn_tail(f)
+
+    def _truncate_torn_tail(self, f: BinaryIO) -> None:
+        """Truncate a file, opened for writing under the write lock, after its last complete line"""
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+
+        end = size
+        complete = 0
+        while end > 0:
+            start = max(0, end - TAIL_CHUNK_SIZE)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                complete = start + newline + 1
+                break
+            end = start
+        logger.warning(f"Dropping incomplete record at byte {complete} of {self.path}")
+        f.truncate(complete)
+
+    # Writing
+
+    def reserve_ids(self, count: int, floor: int = 0) -> int:
+        """
+        Reserve `count` consecutive song ids above `floor` (the highest stored
+        id) and above every id reserved before, by any process, and return the
+        first one. The last reserved id is kept in a counter file updated
+        under an exclusive lock, so web workers and scrape jobs running in
+        separate processes never hand out the same id.
+        """
+        with self._lock, open(self.ids_path, 'a+', encoding='utf-8') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                text = f.read().strip()
+                start = max(int(text) if text else 0, floor) + 1
+                f.truncate(0)
+                f.write(str(start + count - 1))
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return start
+
+    def append(self, songs: Iterable[Dict[str, Any]] = (), deleted_ids: Iterable[Any] = ()) -> None:
+        """Durably append put records for songs and delete records for ids"""
+        with json_duration.time('dump', 'song_log'):
+            lines = [_encode({'op': 'put', 'song': song}) for song in songs]
+            lines.extend(_encode({'op': 'delete', 'id': song_id}) for song_id in deleted_ids)
+        if not lines:
+            return
+
+        data = b''.join(lines)
+        with self._exclusive():
+            with open(self.path, 'a+b') as f:
+                # A record cut short by a crash would swallow the first new line
+                self._truncate_torn_tail(f)
+                start = f.seek(0, os.SEEK_END)
+                inode = os.fstat(f.fileno()).st_ino
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self.record_count += len(lines)
+            # Nobody else wrote since our position: it now includes our records
+            if (inode == self.inode and start == self.offset) or (self.inode is None and start == 0):
+                self.inode = inode
+                self.offset = start + len(data)
+
+    def needs_compaction(self, live_count: int) -> bool:
+        return self.record_count - live_count >= max(COMPACTION_MIN_GARBAGE, live_count)
+
+    def write_snapshot(self, songs: List[Dict[str, Any]]) -> str:
+        """
+        First compaction step: write the live songs to a temporary file of
+        their own, so concurrent compactions don't write over each other
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.',
+                                        prefix=f"{os.path.basename(self.path)}.compact-")
+        os.close(fd)
+        return self._write_snapshot_file(tmp_path, songs)
+
+    def swap_snapshot(self, tmp_path: str, offset: int, snapshot_count: int, inode: Optional[int]) -> Optional[int]:
+        """
+        Second compaction step: copy records appended after `offset` (when the
+        snapshot of the log file `inode` was taken) onto the snapshot and
+        rename it over the log, all under the write lock so no append can
+        fall between the copy and the rename.
+
+        Returns the number of records copied, or None if another process
+        replaced the log since the snapshot was taken, in which case the
+        snapshot is discarded.
+        """
+        with self._exclusive():
+            try:
+                current_inode = os.stat(self.path).st_ino
+            except FileNotFoundError:
+                current_inode = None
+            if current_inode is None or current_inode != inode:
+                os.remove(tmp_path)
+                logger.info(f"{self.path} was compacted by another process, discarding snapshot")
+                return None
+
+            appended = 0
+            snapshot_size = os.path.getsize(tmp_path)
+            with open(self.path, 'rb') as src, open(tmp_path, 'ab') as dst:
+                src.seek(offset)
+                for raw_line in src:
+                    if not raw_line.endswith(b'\n'):
+                        break
+                    dst.write(raw_line)
+                    appended += 1
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(tmp_path, self.path)
+            self.record_count = snapshot_count + appended
+            # The caller has the snapshot's records; the copied ones may be new to it
+            self.inode = os.stat(self.path).st_ino
+            self.offset = snapshot_size
+        return appended
+
+    def _write_snapshot_file(self, tmp_path: str, songs: List[Dict[str, Any]]) -> str:
+        with open(tmp_path, 'wb') as f, json_duration.time('dump', 'song_log'):
+            for song in songs:
+                f.write(_encode({'op': 'put', 'song': song}))
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp_path
+
+
+if __name__ == "__main__":
+    # One-time import of data/songs.json
+    store = SongStore()
+    if store.migrate_legacy():
+        print(f"Migrated songs to {store.path}")
+    else:
+        print(f"Nothing to migrate ({store.path} already exists or {store.legacy_path} is missing)")
@@ -0,0 +1,590 @@
+import os
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+from models import Category
+from search_index import tokenize
+from related_songs import rank_related, RELATED_LIMIT, MAX_RELATED_CANDIDATES
+from duplicates import minhash_signature, band_keys, similarity, cluster_candidates, merged_fields, DUPLICATE_THRESHOLD
+from song_store import SongStore
+from metrics import json_duration, search_duration
+import json_codec
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Storage paths
+SQLITE_PATH = 'data/songs.db'
+CATEGORIES_JSON_PATH = 'data/categories.json'
+
+# Columns stored for each song; any other keys (e.g. 'error') go into `extra`
+SONG_COLUMNS = ('id', 'url', 'title', 'content', 'content_html', 'lyrics', 'timestamp')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL DEFAULT '',
+    title TEXT NOT NULL DEFAULT '',
+    content TEXT NOT NULL DEFAULT '',
+    content_html TEXT NOT NULL DEFAULT '',
+    lyrics TEXT NOT NULL DEFAULT '',
+    timestamp INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_songs_url ON songs(url);
+CREATE INDEX IF NOT EXISTS idx_songs_timestamp ON songs(timestamp DESC, id);
+
+CREATE TABLE IF NOT EXISTS song_categories (
+    song_id INTEGER NOT NULL REFERENCES songs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    PRIMARY KEY (song_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_song_categories_name ON song_categories(name_lower, song_id);
+
+CREATE TABLE IF NOT EXISTS categories (
+    position INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5(
+    title, content, lyrics,
+    content='songs', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 0'
+);
+
+CREATE TRIGGER IF NOT EXISTS songs_fts_insert AFTER INSERT ON songs BEGIN
+    INSERT INTO songs_fts(rowid, title, content, lyrics) VALUES (new.id, new.title, new.content, new.lyrics);
+END;
+CREATE TRIGGER IF NOT EXISTS songs_fts_delete AFTER DELETE ON songs BEGIN
+    INSERT INTO songs_fts(songs_fts, rowid, title, content, lyrics) VALUES ('delete', old.id, old.title, old.content, old.lyrics);
+END;
+CREATE TRIGGER IF NOT EXISTS songs_fts_update AFTER UPDATE ON songs BEGIN
+    INSERT INTO songs_fts(songs_fts, rowid, title, content, lyrics) VALUES ('delete', old.id, old.title, old.content, old.lyrics);
+    INSERT INTO songs_fts(rowid, title, content, lyrics) VALUES (new.id, new.title, new.content, new.lyrics);
+END;
+
+CREATE TABLE IF NOT EXISTS history_days (
+    day TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS history_days_insert AFTER INSERT ON songs WHEN new.timestamp > 0 BEGIN
+    INSERT INTO history_days (day, count) VALUES (date(new.timestamp, 'unixepoch', 'localtime'), 1)
+        ON CONFLICT(day) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS history_days_delete AFTER DELETE ON songs WHEN old.timestamp > 0 BEGIN
+    UPDATE history_days SET count = count - 1 WHERE day = date(old.timestamp, 'unixepoch', 'localtime');
+    DELETE FROM history_days WHERE count <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS history_days_update AFTER UPDATE OF timestamp ON songs BEGIN
+    UPDATE history_days SET count = count - 1
+        WHERE old.timestamp > 0 AND day = date(old.timestamp, 'unixepoch', 'localtime');
+    DELETE FROM history_days WHERE count <= 0;
+    INSERT INTO history_days (day, count) SELECT date(new.timestamp, 'unixepoch', 'localtime'), 1 WHERE new.timestamp > 0
+        ON CONFLICT(day) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TABLE IF NOT EXISTS song_aliases (
+    url TEXT PRIMARY KEY,
+    song_id INTEGER NOT NULL REFERENCES songs(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_song_aliases_song ON song_aliases(song_id);
+
+CREATE TABLE IF NOT EXISTS song_minhash (
+    song_id INTEGER PRIMARY KEY REFERENCES songs(id) ON DELETE CASCADE,
+    signature BLOB
+);
+CREATE TABLE IF NOT EXISTS song_lsh (
+    bucket INTEGER NOT NULL,
+    song_id INTEGER NOT NULL REFERENCES songs(id) ON DELETE CASCADE,
+    PRIMARY KEY (bucket, song_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_song_lsh_song ON song_lsh(song_id);
+
+CREATE TABLE IF NOT EXISTS id_sequence (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_id INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO id_sequence (id, last_id) VALUES (1, 0);
+
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS catalog_version_song_insert AFTER INSERT ON songs BEGIN
+    UPDATE catalog_version SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS catalog_version_song_update AFTER UPDATE ON songs BEGIN
+    UPDATE catalog_version SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS catalog_version_song_delete AFTER DELETE ON songs BEGIN
+    UPDATE catalog_version SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS catalog_version_category_insert AFTER INSERT ON categories BEGIN
+    UPDATE catalog_version SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS catalog_version_category_delete AFTER DELETE ON categories BEGIN
+    UPDATE catalog_version SET version = version + 1;
+END;
+"""
+
+# Column weights for bm25(): title, content, lyrics
+FTS_WEIGHTS = (3.0, 1.0, 1.0)
+
+
+def fts_query(query: str) -> str:
+    """
+    Turn free text into an FTS5 query that ANDs every token as a prefix
+    """
+    return ' '.join('"{}"*'.format(token.replace('"', '""')) for token in tokenize(query))
+
+
+class SQLiteSongRepository:
+    """
+    Song catalog stored in SQLite, with the same interface as SongRepository.
+
+    Lookups by id, url, category and timestamp use B-tree indexes and search
+    uses an FTS5 table kept in sync by triggers, so nothing is held in memory
+    and reads stay O(log n) as the catalog grows. Near-duplicates are found
+    through MinHash signatures and LSH buckets stored with each song. The database runs in WAL
+    mode so scrapes can write while the web app reads.
+    """
+    def __init__(self, path: str = SQLITE_PATH, categories_path: str = CATEGORIES_JSON_PATH):
+        self.path = path
+        self.categories_path = categories_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    # Connections
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA foreign_keys=ON')
+            self._local.connection = connection
+        if not self._initialized:
+            self._initialize(connection)
+        return connection
+
+    def _initialize(self, connection: sqlite3.Connection) -> None:
+        """Create the schema and import existing JSON data into an empty database"""
+        with self._init_lock:
+            if self._initialized:
+                return
+            connection.executescript(SCHEMA)
+            if connection.execute('SELECT COUNT(*) FROM songs').fetchone()[0] == 0:
+                self._import_json(connection)
+            elif connection.execute('SELECT COUNT(*) FROM history_days').fetchone()[0] == 0:
+                # Database created before the history table existed
+                with connection:
+                    connection.execute(
+                        "INSERT INTO history_days (day, count) SELECT date(timestamp, 'unixepoch', 'localtime'), COUNT(*) "
+                        "FROM songs WHERE timestamp > 0 GROUP BY 1")
+            self._index_missing_duplicates(connection)
+            self._initialized = True
+
+    def _index_missing_duplicates(self, connection: sqlite3.Connection) -> None:
+        """MinHash songs stored before the duplicate tables existed"""
+        rows = connection.execute(
+            'SELECT id, content, lyrics FROM songs WHERE id NOT IN (SELECT song_id FROM song_minhash)').fetchall()
+        if not rows:
+            return
+        with connection:
+            for row in rows:
+                self._index_duplicates(connection, row['id'], dict(row))
+        logger.info(f"Indexed {len(rows)} songs for duplicate detection")
+
+    def _import_json(self, connection: sqlite3.Connection) -> None:
+        store = SongStore()
+        if store.exists():
+            songs = store.load()
+            with connection:
+                self._upsert(connection, songs)
+            logger.info(f"Imported {len(songs)} songs into {self.path}")
+
+        if os.path.exists(self.categories_path):
+            with open(self.categories_path, 'rb') as f, json_duration.time('load', 'categories'):
+                categories = json_codec.load(f)
+            with connection:
+                self._replace_categories(connection, categories)
+
+    # Row conversion
+
+    def _songs_from_rows(self, rows: Iterable[sqlite3.Row]) -> List[Dict[str, Any]]:
+        rows = list(rows)
+        if not rows:
+            return []
+
+        categories: Dict[int, List[str]] = {row['id']: [] for row in rows}
+        ids = list(categories)
+        connection = self._connection()
+        # Chunk to stay under SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for category_row in connection.execute(
+                    f'SELECT song_id, name FROM song_categories WHERE song_id IN ({placeholders}) '
+                    f'ORDER BY song_id, position', chunk):
+                categories[category_row['song_id']].append(category_row['name'])
+
+        songs = []
+        for row in rows:
+            # Rows are turned into plain dicts: nothing is kept in memory, so
+            # the compact models.Song record would only add conversion work
+            data = {column: row[column] for column in SONG_COLUMNS if column != 'timestamp'}
+            data['categories'] = categories[row['id']]
+            data['timestamp'] = row['timestamp']
+            if row['extra']:
+                data.update(json_codec.loads(row['extra']))
+            songs.append(data)
+        return songs
+
+    def _query_songs(self, sql: str, params: Tuple = ()) -> List[Dict[str, Any]]:
+        return self._songs_from_rows(self._connection().execute(sql, params))
+
+    def _upsert(self, connection: sqlite3.Connection, songs: Iterable[Dict[str, Any]]) -> None:
+        for song in songs:
+            song_id = song.get('id', 0)
+            extra = {key: value for key, value in song.items() if key not in SONG_COLUMNS and key != 'categories'}
+            connection.execute(
+                'INSERT INTO songs (id, url, title, content, content_html, lyrics, timestamp, extra) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET url=excluded.url, title=excluded.title, '
+                'content=excluded.content, content_html=excluded.content_html, lyrics=excluded.lyrics, '
+                'timestamp=excluded.timestamp, extra=excluded.extra',
+                (song_id, song.get('url', ''), song.get('title', 'Unknown'), song.get('content', ''),
+                 song.get('content_html', ''), song.get('lyrics', ''),
+                 song.get('timestamp') or int(datetime.now().timestamp()),
+                 json_codec.dumps(extra) if extra else None))
+            connection.execute('DELETE FROM song_categories WHERE song_id = ?', (song_id,))
+            connection.executemany(
+                'INSERT INTO song_categories (song_id, position, name, name_lower) VALUES (?, ?, ?, ?)',
+                [(song_id, i, name, name.lower()) for i, name in enumerate(song.get('categories') or [])])
+            connection.execute('DELETE FROM song_aliases WHERE song_id = ?', (song_id,))
+            connection.executemany('INSERT OR REPLACE INTO song_aliases (url, song_id) VALUES (?, ?)',
+                                   [(url, song_id) for url in song.get('aliases') or []])
+            self._index_duplicates(connection, song_id, song)
+
+    def _index_duplicates(self, connection: sqlite3.Connection, song_id: int, song: Dict[str, Any]) -> None:
+        """Store a song's MinHash signature (NULL if too short to compare) and LSH buckets"""
+        signature = minhash_signature(song)
+        connection.execute('INSERT OR REPLACE INTO song_minhash (song_id, signature) VALUES (?, ?)',
+                           (song_id, signature))
+        connection.execute('DELETE FROM song_lsh WHERE song_id = ?', (song_id,))
+        if signature is not None:
+            connection.executemany('INSERT OR IGNORE INTO song_lsh (bucket, song_id) VALUES (?, ?)',
+                                   [(key, song_id) for key in band_keys(signature)])
+
+    def _signatures(self, song_ids: Iterable[int]) -> Dict[int, bytes]:
+        ids = list(song_ids)
+        signatures = {}
+        connection = self._connection()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for row in connection.execute(
+                    f'SELECT song_id, signature FROM song_minhash WHERE song_id IN ({placeholders}) '
+                    f'AND signature IS NOT NULL', chunk):
+                signatures[row['song_id']] = row['signature']
+        return signatures
+
+    def _songs_by_id(self, song_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        ids = list(song_ids)
+        songs = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for song in self._query_songs(f'SELECT * FROM songs WHERE id IN ({placeholders})', tuple(chunk)):
+                songs[song['id']] = song
+        return songs
+
+    def _replace_categories(self, connection: sqlite3.Connection, categories: List[Dict[str, Any]]) -> None:
+        connection.execute('DELETE FROM categories')
+        connection.executemany(
+            'INSERT INTO categories (position, name, url) VALUES (?, ?, ?)',
+            [(i, category.name, category.url) for i, category in enumerate(map(Category.from_dict, categories))])
+
+    # Reads
+
+    def exists(self) -> bool:
+        """Whether song data is available"""
+        return os.path.exists(self.path) or SongStore().exists()
+
+    def all(self) -> List[Dict[str, Any]]:
+        """All songs ordered by id"""
+        return self._query_songs('SELECT * FROM songs ORDER BY id')
+
+    def iter_songs(self, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Iterate over all songs by id, fetching one batch at a time"""
+        last_id = None
+        while True:
+            if last_id is None:
+                batch = self._query_songs('SELECT * FROM songs ORDER BY id LIMIT ?', (batch_size,))
+            else:
+                batch = self._query_songs('SELECT * FROM songs WHERE id > ? ORDER BY id LIMIT ?', (last_id, batch_size))
+            if not batch:
+                return
+            yield from batch
+            last_id = batch[-1]['id']
+
+    def page(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Songs ordered by id, starting after `after_id`"""
+        return self._query_songs('SELECT * FROM songs WHERE id > ? ORDER BY id LIMIT ?',
+                                 (-1 if after_id is None else after_id, -1 if limit is None else limit))
+
+    def get(self, song_id: int) -> Optional[Dict[str, Any]]:
+        """Look up a song by id"""
+        songs = self._query_songs('SELECT * FROM songs WHERE id = ?', (song_id,))
+        return songs[0] if songs else None
+
+    def count(self) -> int:
+        """Number of songs in the catalog"""
+        return self._connection().execute('SELECT COUNT(*) FROM songs').fetchone()[0]
+
+    def max_id(self) -> int:
+        """Highest song id in the catalog, or 0 if it is empty"""
+        return self._connection().execute('SELECT COALESCE(MAX(id), 0) FROM songs').fetchone()[0]
+
+    def has_url(self, url: str) -> bool:
+        """Whether a song with this source URL (or a duplicate merged into one) is stored"""
+        return self._connection().execute(
+            'SELECT 1 FROM songs WHERE url = ? UNION ALL SELECT 1 FROM song_aliases WHERE url = ? LIMIT 1',
+            (url, url)).fetchone() is not None
+
+    def version(self) -> int:
+        """
+        Catalog version; moved by triggers on every write to songs or
+        categories, from any process
+        """
+        return self._connection().execute('SELECT version FROM catalog_version').fetchone()[0]
+
+    def get_by_url(self, url: str) -> Optional[Dict[str, Any]]:
+        """Look up a song by its source URL"""
+        songs = self._query_songs('SELECT * FROM songs WHERE url = ? ORDER BY id DESC LIMIT 1', (url,))
+        if not songs:
+            songs = self._query_songs(
+                'SELECT songs.* FROM song_aliases JOIN songs ON songs.id = song_aliases.song_id '
+                'WHERE song_aliases.url = ?', (url,))
+        return songs[0] if songs else None
+
+    def by_category(self, category_name: str) -> List[Dict[str, Any]]:
+        """Songs tagged with a category (case-insensitive)"""
+        return self._query_songs(
+            'SELECT DISTINCT songs.* FROM song_categories JOIN songs ON songs.id = song_categories.song_id '
+            'WHERE song_categories.name_lower = ? ORDER BY songs.id', (category_name.lower(),))
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Songs ordered by most recently added"""
+        return self._query_songs('SELECT * FROM songs ORDER BY timestamp DESC, id LIMIT ?',
+                                 (-1 if limit is None else limit,))
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Songs matching a full-text query, best match first"""
+        match = fts_query(query)
+        if not match:
+            return []
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        with search_duration.time():
+            return self._query_songs(
+                f'SELECT songs.* FROM songs_fts JOIN songs ON songs.id = songs_fts.rowid '
+                f'WHERE songs_fts MATCH ? ORDER BY bm25(songs_fts, {weights}), songs.id LIMIT ?',
+                (match, -1 if limit is None else limit))
+
+    def neighbors(self, song_id: int) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Return the (previous, next) songs by id"""
+        prev_songs = self._query_songs('SELECT * FROM songs WHERE id < ? ORDER BY id DESC LIMIT 1', (song_id,))
+        next_songs = self._query_songs('SELECT * FROM songs WHERE id > ? ORDER BY id LIMIT 1', (song_id,))
+        return (prev_songs[0] if prev_songs else None), (next_songs[0] if next_songs else None)
+
+    def related(self, song_id: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Songs most related to a song, best first: the songs sharing the most
+        categories are found through the category index and re-ranked by
+        lyric similarity
+        """
+        song = self.get(song_id)
+        if song is None:
+            return []
+        candidates = self._query_songs(
+            'SELECT songs.* FROM ('
+            '  SELECT other.song_id AS id, COUNT(DISTINCT other.name_lower) AS overlap'
+            '  FROM song_categories AS mine JOIN song_categories AS other ON other.name_lower = mine.name_lower'
+            '  WHERE mine.song_id = ? AND other.song_id != ?'
+            '  GROUP BY other.song_id ORDER BY overlap DESC, other.song_id LIMIT ?'
+            ') AS ranked JOIN songs ON songs.id = ranked.id',
+            (song_id, song_id, MAX_RELATED_CANDIDATES))
+        return rank_related(song, candidates, limit or RELATED_LIMIT)
+
+    def duplicates(self, song_id: int) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        (song, similarity) of the near-duplicates of a song, most similar
+        first; candidates are the songs sharing one of its LSH buckets
+        """
+        signature = self._signatures([song_id]).get(song_id)
+        if signature is None:
+            return []
+        candidate_ids = [row[0] for row in self._connection().execute(
+            'SELECT DISTINCT other.song_id FROM song_lsh AS mine JOIN song_lsh AS other ON other.bucket = mine.bucket '
+            'WHERE mine.song_id = ? AND other.song_id != ?', (song_id, song_id))]
+        scored = [(other_id, similarity(signature, other_signature))
+                  for other_id, other_signature in self._signatures(candidate_ids).items()]
+        scored = sorted((entry for entry in scored if entry[1] >= DUPLICATE_THRESHOLD),
+                        key=lambda entry: (-entry[1], entry[0]))
+        songs = self._songs_by_id(other_id for other_id, _ in scored)
+        return [(songs[other_id], score) for other_id, score in scored if other_id in songs]
+
+    def duplicate_clusters(self) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        Clusters of near-duplicate songs, largest first; each lists (song,
+        similarity to the cluster's first song) by id. Only songs sharing an
+        LSH bucket are compared.
+        """
+        groups = [[int(song_id) for song_id in row[0].split(',')] for row in self._connection().execute(
+            'SELECT group_concat(song_id) FROM song_lsh GROUP BY bucket HAVING COUNT(*) > 1')]
+        signatures = self._signatures({song_id for group in groups for song_id in group})
+        clusters = cluster_candidates(groups, signatures)
+        songs = self._songs_by_id(song_id for cluster in clusters for song_id, _ in cluster)
+        return [[(songs[song_id], score) for song_id, score in cluster if song_id in songs] for cluster in clusters]
+
+    def history(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                offset: int = 0, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Days with scraped songs in an inclusive YYYY-MM-DD range, newest
+        first, as {'date', 'count', 'songs'} with the songs sorted by title.
+        Returns one page of days and the total number of matching days.
+        """
+        connection = self._connection()
+        start_date = start_date or '0000-00-00'
+        end_date = end_date or '9999-99-99'
+        total = connection.execute('SELECT COUNT(*) FROM history_days WHERE day BETWEEN ? AND ?',
+                                   (start_date, end_date)).fetchone()[0]
+        days = connection.execute(
+            'SELECT day, count FROM history_days WHERE day BETWEEN ? AND ? ORDER BY day DESC LIMIT ? OFFSET ?',
+            (start_date, end_date, -1 if limit is None else limit, offset)).fetchall()
+
+        sessions = []
+        for row in days:
+            # Local-time day boundaries, so the timestamp index can be used
+            day_start = datetime.strptime(row['day'], '%Y-%m-%d')
+            songs = self._query_songs(
+                'SELECT * FROM songs WHERE timestamp >= ? AND timestamp < ? ORDER BY lower(title), id',
+                (int(day_start.timestamp()), int((day_start + timedelta(days=1)).timestamp())))
+            sessions.append({'date': row['day'], 'count': row['count'], 'songs': songs})
+        return sessions, total
+
+    def categories(self) -> List[Dict[str, Any]]:
+        """All categories"""
+        rows = self._connection().execute('SELECT name, url FROM categories ORDER BY position')
+        return [Category(row['name'], row['url']).to_dict() for row in rows]
+
+    # Writes
+
+    def reserve_ids(self, count: int) -> int:
+        """
+        Reserve `count` consecutive new song ids and return the first one, so
+        concurrent scrapes never hand out the same id, in this process or any
+        other using the database: the last reserved id is kept in the
+        id_sequence table and moved in a single write
+        """
+        connection = self._connection()
+        with self._write_lock, connection:
+            last_id = connection.execute(
+                'UPDATE id_sequence SET last_id = MAX(last_id, (SELECT COALESCE(MAX(id), 0) FROM songs)) + ? '
+                'WHERE id = 1 RETURNING last_id', (count,)).fetchone()[0]
+        return last_id - count + 1
+
+    def add_songs(self, songs: List[Dict[str, Any]]) -> None:
+        """Insert newly scraped songs"""
+        if not songs:
+            return
+        connection = self._connection()
+        with self._write_lock, connection:
+            self._upsert(connection, songs)
+        logger.info(f"Saved {len(songs)} new songs to {self.path}")
+
+    def save(self, songs: List[Dict[str, Any]]) -> None:
+        """
+        Persist a full song list.
+
+        Songs whose ids are not stored yet are inserted and stored ids missing
+        from the list are deleted. Edits to existing songs go through
+        update_song().
+        """
+        connection = self._connection()
+        with self._write_lock, connection:
+            stored_ids = {row[0] for row in connection.execute('SELECT id FROM songs')}
+            new_ids = {song.get('id') for song in songs}
+            self._upsert(connection, [song for song in songs if song.get('id') not in stored_ids])
+            deleted_ids = [(song_id,) for song_id in stored_ids - new_ids]
+            connection.executemany('DELETE FROM songs WHERE id = ?', deleted_ids)
+        logger.info(f"Saved {len(new_ids - stored_ids)} new and deleted {len(deleted_ids)} songs in {self.path}")
+
+    def save_categories(self, categories: List[Dict[str, Any]]) -> None:
+        """Write the category list"""
+        connection = self._connection()
+        with self._write_lock, connection:
+            self._replace_categories(connection, categories)
+        logger.info(f"Saved {len(categories)} categories to {self.path}")
+
+    def update_song(self, song_id: int, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update fields of a stored song and persist the change"""
+        connection = self._connection()
+        with self._write_lock, connection:
+            song = self.get(song_id)
+            if song is None:
+                return None
+            song.update(fields)
+            self._upsert(connection, [song])
+        return song
+
+    def merge_songs(self, keep_id: int, duplicate_ids: Iterable[int]) -> Optional[Dict[str, Any]]:
+        """
+        Merge duplicates into the song kept: it gains their categories and
+        their URLs as aliases, and the duplicates are deleted, in one
+        transaction. Returns the kept song, or None if it doesn't exist.
+        """
+        connection = self._connection()
+        with self._write_lock, connection:
+            keep = self.get(keep_id)
+            if keep is None:
+                return None
+            duplicates = list(self._songs_by_id(song_id for song_id in set(duplicate_ids) if song_id != keep_id).values())
+            keep.update(merged_fields(keep, sorted(duplicates, key=lambda song: song['id'])))
+            connection.executemany('DELETE FROM songs WHERE id = ?', [(song['id'],) for song in duplicates])
+            self._upsert(connection, [keep])
+        logger.info(f"Merged {len(duplicates)} duplicates into song {keep_id} in {self.path}")
+        return keep
+
+    def update_songs(self, updates: Dict[int, Dict[str, Any]], removed: Iterable[str] = ()) -> int:
+        """
+        Update fields of several stored songs, dropping the `removed` keys
+        from each, in one transaction. Returns how many songs were found and
+        updated.
+        """
+        connection = self._connection()
+        changed = []
+        with self._write_lock, connection:
+            for song_id, fields in updates.items():
+                song = self.get(song_id)
+                if song is None:
+                    continue
+                song.update(fields)
+                for key in removed:
+                    song.pop(key, None)
+                changed.append(song)
+            self._upsert(connection, changed)
+        return len(changed)
@@ -25,32 +25,8 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
     }
-    
-    // Format song content to highlight chords
-    formatSongContent();
 });
 
-/**
- * Format song content to highlight chords
- */
-function formatSongContent() {
-    const songContent = document.querySelector('.song-content');
-    if (!songContent) return;
-    
-    // Simple chord detection regex
-    // This is a basic implementation and might need refinement based on actual content
-    const chordRegex = /\b[A-G][#b]?(?:maj|min|m|sus|aug|dim)?[0-9]?(?:\/[A-G][#b]?)?\b/g;
-    
-    // Get the text content
-    let content = songContent.textContent;
-    
-    // Replace chords with marked spans
-    content = content.replace(chordRegex, match => `<span class="chord">${match}</span>`);
-    
-    // Update the content
-    songContent.innerHTML = content;
-}
-
 /**
  * Initiate the scraping process
  */
@@ -64,7 +40,7 @@ function initiateScrape() {
     scrapeBtn.disabled = true;
     scrapeBtn.classList.add('running');
     scrapeBtn.innerHTML = '<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> Scraping...';
-    scrapeStatus.innerHTML = 'Scraping in progress. This may take several minutes...';
+    scrapeStatus.innerHTML = 'Starting scrape...';
     scrapeStatus.classList.remove('d-none');
     
     // Get the URL from the input field
@@ -73,6 +49,10 @@ function initiateScrape() {
     // Get the follow links option
     const followLinks = document.getElementById('follow-links').checked;
     
+    // Get the full-site crawl option
+    const fullSiteCheckbox = document.getElementById('full-site');
+    const fullSite = fullSiteCheckbox ? fullSiteCheckbox.checked : false;
+    
     // Validate URL
     if (!scrapeUrl) {
         showNotification('Please enter a valid URL', 'warning');
@@ -82,7 +62,7 @@ function initiateScrape() {
         return;
     }
     
-    // Make API request to start scraping
+    // Make API request to start a background scrape job
     fetch('/api/scrape', {
         method: 'POST',
         headers: {
@@ -90,73 +70,115 @@ function initiateScrape() {
         },
         body: JSON.stringify({
             url: scrapeUrl,
-            follow_links: followLinks
+            follow_links: followLinks,
+            full_site: fullSite
         })
     })
     .then(response => {
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
         return response.json().catch(err => {
             console.error('JSON parsing error:', err);
             throw new Error('Failed to parse response from server');
         });
     })
     .then(data => {
-        // Update UI with scraping results
-        if (data.success) {
-            scrapeStatus.innerHTML = `<div class="alert alert-success">${data.message}</div>`;
-            showNotification('Scraping completed successfully!', 'success');
-            // Redirect to results page if available, otherwise reload
-            if (data.redirect_url) {
-                setTimeout(() => {
-                    window.location.href = data.redirect_url;
-                }, 1500);
-            } else {
-                // Fallback to reload if redirect URL isn't provided
-                setTimeout(() => {
-                    window.location.reload();
-                }, 2000);
-            }
-        } else {
-            // More informative error message
-            scrapeStatus.innerHTML = `
-                <div class="alert alert-danger">
-                    <h5><i class="fas fa-exclamation-triangle me-2"></i> Scraping failed</h5>
-                    <p>${data.message}</p>
-                    <p class="mb-0 mt-2">Tips:</p>
-                    <ul class="mb-0">
-                        <li>Make sure the URL is from songsofpraise.in</li>
-                        <li>Try using a more specific page URL (e.g. a category page)</li>
-                        <li>Check your internet connection</li>
-                    </ul>
-                </div>`;
-            showNotification('Scraping failed', 'danger');
+        if (!data.success) {
+            showScrapeFailure(data.message);
+            resetScrapeButton();
+            return;
         }
+        pollScrapeJob(data.status_url, data.cancel_url);
     })
     .catch(error => {
         console.error('Scraping error:', error);
-        scrapeStatus.innerHTML = `
-            <div class="alert alert-danger">
-                <h5><i class="fas fa-exclamation-triangle me-2"></i> Scraping failed</h5>
-                <p>Error: ${error.message}</p>
-                <p class="mb-0 mt-2">Tips:</p>
-                <ul class="mb-0">
-                    <li>Try using a more specific URL from songsofpraise.in</li>
-                    <li>Try scraping a category page instead of the main page</li>
-                    <li>Scraping large pages may cause timeouts</li>
-                </ul>
-            </div>`;
-        showNotification('Scraping failed', 'danger');
+        showScrapeFailure(`Error: ${error.message}`);
+        resetScrapeButton();
+    });
+}
+
+/**
+ * Poll a scrape job until it finishes, showing its progress
+ */
+function pollScrapeJob(statusUrl, cancelUrl) {
+    const scrapeStatus = document.getElementById('scrape-status');
+    
+    fetch(statusUrl)
+    .then(response => response.json())
+    .then(job => {
+        if (!job.success) {
+            showScrapeFailure(job.message);
+            resetScrapeButton();
+            return;
+        }
+        
+        if (job.status === 'queued' || job.status === 'running') {
+            scrapeStatus.innerHTML = `
+                <div class="alert alert-info">
+                    <p class="mb-1">${job.status === 'queued' ? 'Waiting to start...' : 'Scraping in progress...'}</p>
+                    <small>
+                        Fetched ${job.urls_fetched} of ${job.urls_queued} pages
+                        (${job.urls_failed} failed), ${job.songs_saved} songs saved,
+                        ${job.pages_per_second} pages/sec
+                    </small>
+                    <div class="mt-2">
+                        <button class="btn btn-sm btn-outline-light" id="cancel-scrape-button">Cancel</button>
+                    </div>
+                </div>`;
+            document.getElementById('cancel-scrape-button').addEventListener('click', function() {
+                this.disabled = true;
+                fetch(cancelUrl, { method: 'POST' });
+            });
+            setTimeout(() => pollScrapeJob(statusUrl, cancelUrl), 1500);
+            return;
+        }
+        
+        resetScrapeButton();
+        if (job.status === 'completed' || job.status === 'cancelled') {
+            scrapeStatus.innerHTML = `<div class="alert alert-success">${job.message}</div>`;
+            showNotification(job.status === 'completed' ? 'Scraping completed successfully!' : 'Scraping cancelled', 'success');
+            // Redirect to results page if available, otherwise reload
+            setTimeout(() => {
+                window.location.href = job.redirect_url || window.location.href;
+            }, 1500);
+        } else {
+            showScrapeFailure(job.message);
+        }
     })
-    .finally(() => {
-        // Reset button state
-        scrapeBtn.disabled = false;
-        scrapeBtn.classList.remove('running');
-        scrapeBtn.innerHTML = 'Scrape Songs';
+    .catch(error => {
+        console.error('Scrape status error:', error);
+        showScrapeFailure(`Error: ${error.message}`);
+        resetScrapeButton();
     });
 }
 
+/**
+ * Show a scraping error with troubleshooting tips
+ */
+function showScrapeFailure(message) {
+    const scrapeStatus = document.getElementById('scrape-status');
+    scrapeStatus.innerHTML = `
+        <div class="alert alert-danger">
+            <h5><i class="fas fa-exclamation-triangle me-2"></i> Scraping failed</h5>
+            <p>${message}</p>
+            <p class="mb-0 mt-2">Tips:</p>
+            <ul class="mb-0">
+                <li>Make sure the URL is from songsofpraise.in</li>
+                <li>Try using a more specific page URL (e.g. a category page)</li>
+                <li>Check your internet connection</li>
+            </ul>
+        </div>`;
+    showNotification('Scraping failed', 'danger');
+}
+
+/**
+ * Restore the scrape button after a job finishes
+ */
+function resetScrapeButton() {
+    const scrapeBtn = document.getElementById('scrape-button');
+    scrapeBtn.disabled = false;
+    scrapeBtn.classList.remove('running');
+    scrapeBtn.innerHTML = 'Scrape Songs';
+}
+
 /**
  * Show a notification toast
  */
@@ -0,0 +1,114 @@
+"""
+End-to-end crawl of the benchmark fixtures with async_scraper.scrape_site,
+against the local stand-in server instead of songsofpraise.in.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import unittest
+from urllib.parse import urlparse
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.join(APP_DIR, 'benchmarks'))
+
+from fixtures import load_fixtures
+
+# The app keeps its data under data/ relative to the working directory, so
+# the crawl runs in a scratch directory and never touches the real catalog
+WORK_DIR = tempfile.mkdtemp(prefix='songs-test-')
+ORIGINAL_DIR = os.getcwd()
+
+
+def setUpModule():
+    os.makedirs(os.path.join(WORK_DIR, 'data'))
+    os.chdir(WORK_DIR)
+    logging.disable(logging.ERROR)
+
+
+def tearDownModule():
+    # The JSONL repository saves its indexes lazily; write them here rather
+    # than at exit, when the working directory is the real one again
+    from song_repository import repository
+    if hasattr(repository, 'flush_indexes'):
+        repository.flush_indexes()
+    logging.disable(logging.NOTSET)
+    os.chdir(ORIGINAL_DIR)
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+class ScrapeStandInTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from stand_in_server import start_server
+        cls.server, cls.origin = start_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    @staticmethod
+    def songs_after(song_id: int):
+        from song_repository import repository
+        return [song for song in repository.all() if song['id'] > song_id]
+
+    def scrape(self, start_url: str, **kwargs):
+        import async_scraper
+        return async_scraper.scrape_site(start_url, transport=async_scraper.HostRewriteTransport(self.origin),
+                                         **kwargs)
+
+    def test_scrapes_listing_and_skips_stored_songs(self):
+        from song_repository import repository
+        last_id = repository.max_id()
+
+        result = self.scrape('https://songsofpraise.in/', max_songs=3)
+        self.assertTrue(result['success'], result['message'])
+        self.assertEqual(result['new_songs_count'], 3)
+
+        songs = self.songs_after(last_id)
+        self.assertEqual(len(songs), 3)
+        self.assertTrue(all(song['url'].startswith('https://songsofpraise.in/') for song in songs))
+        self.assertTrue(all('error' not in song for song in songs), songs)
+        self.assertTrue(all(song.get('content_hash') for song in songs))
+        self.assertEqual(len({song['id'] for song in songs}), 3)
+
+        # The same listing again only queues songs that aren't stored yet
+        stored_urls = {song['url'] for song in songs}
+        last_id = repository.max_id()
+        result = self.scrape('https://songsofpraise.in/', max_songs=3)
+        self.assertTrue(result['success'], result['message'])
+        self.assertFalse(stored_urls & {song['url'] for song in self.songs_after(last_id)})
+
+    def test_follows_index_links(self):
+        from song_repository import repository
+        last_id = repository.max_id()
+
+        result = self.scrape('https://songsofpraise.in/hindi/', max_songs=5, follow_links=True)
+        self.assertTrue(result['success'], result['message'])
+        self.assertEqual(result['new_songs_count'], 5)
+        songs = self.songs_after(last_id)
+        self.assertEqual(len(songs), 5)
+
+        # Pages the stand-in serves are parsed; the rest are stored as failed downloads
+        served = {urlparse(page['url']).path for page in load_fixtures()}
+        for song in songs:
+            if urlparse(song['url']).path in served:
+                self.assertNotIn('error', song)
+                self.assertTrue(song['content'])
+            else:
+                self.assertEqual(song['error'], 'Failed to download page')
+        self.assertTrue(any('error' not in song for song in songs))
+
+    def test_rejects_other_domains(self):
+        result = self.scrape(self.origin + '/')
+        self.assertFalse(result['success'])
+
+
+if __name__ == '__main__':
+    unittest.main()
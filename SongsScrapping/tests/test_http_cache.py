@@ -0,0 +1,67 @@
+"""
+http_cache.cached_fetch: pages without a charset decode as UTF-8, and a 304
+for a page that isn't cached is not stored as the page.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import unittest
+from unittest import mock
+
+import requests
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, APP_DIR)
+
+from http_cache import HttpCache, cached_fetch
+
+URL = 'https://songsofpraise.in/aadar-aur-mahima/'
+PAGE = '<html><body><h1>आदर और महिमा</h1></body></html>'
+
+
+def response(status_code: int, body: bytes = b'', content_type: str = 'text/html') -> requests.Response:
+    """A response as requests builds it, with the encoding taken from the headers"""
+    result = requests.Response()
+    result.status_code = status_code
+    result._content = body
+    result.headers['Content-Type'] = content_type
+    result.encoding = requests.utils.get_encoding_from_headers(result.headers)
+    return result
+
+
+class CachedFetchTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='songs-test-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.cache = HttpCache(self.directory, ttl=0)
+        self.session = mock.Mock()
+
+    def fetch(self, *responses):
+        self.session.get.side_effect = list(responses)
+        return cached_fetch(URL, {}, cache=self.cache, session=self.session)
+
+    def test_page_without_charset_is_decoded_as_utf8(self):
+        self.assertEqual(self.fetch(response(200, PAGE.encode('utf-8'))), PAGE)
+        self.assertEqual(self.cache.get(URL)['body'], PAGE)
+
+    def test_declared_charset_is_used(self):
+        self.assertEqual(self.fetch(response(200, PAGE.encode('utf-16'), 'text/html; charset=utf-16')), PAGE)
+
+    def test_304_for_an_uncached_page_is_a_miss(self):
+        logging.disable(logging.ERROR)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.assertIsNone(self.fetch(response(304)))
+        self.assertIsNone(self.cache.get(URL))
+
+        # Once cached, a 304 revalidates the stored copy
+        self.fetch(response(200, PAGE.encode('utf-8')))
+        self.assertEqual(self.fetch(response(304)), PAGE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+models.Song: derived lyrics are cached only when read through song.lyrics.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, APP_DIR)
+
+from chords import lyrics_from_content
+from models import Song
+from song_store import SongStore
+from song_repository import SongRepository
+
+CONTENT = "G        D\nAmazing grace how sweet the sound\nEm       C\nThat saved a wretch like me"
+
+
+def catalog_song(song_id: int) -> dict:
+    content = f"{CONTENT}\nVerse {song_id}"
+    return {'id': song_id, 'url': f"https://songsofpraise.in/song-{song_id}/", 'title': f"Song {song_id}",
+            'content': content, 'lyrics': lyrics_from_content(content), 'chords': [],
+            'categories': ['Hindi', 'Worship'], 'timestamp': 1700000000 + song_id}
+
+
+class DerivedLyricsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='songs-test-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def test_loading_a_catalog_caches_no_derived_lyrics(self):
+        store = SongStore(self.path('songs.jsonl'), self.path('songs.json'))
+        store.append([catalog_song(song_id) for song_id in range(1, 21)])
+
+        repository = SongRepository(store, categories_path=self.path('categories.json'),
+                                    search_index_path=self.path('search_index.json'),
+                                    history_index_path=self.path('history_index.json'),
+                                    duplicate_index_path=self.path('duplicate_index.json'))
+        self.addCleanup(repository.flush_indexes)
+        songs = repository.all()
+        self.assertEqual(len(songs), 20)
+        # Building the search, related, history and duplicate indexes reads
+        # every song's lyrics
+        self.assertTrue(repository.related(1))
+        self.assertTrue(repository.search('amazing'))
+        # ...and so does saving an unchanged catalog, which compares songs
+        repository.save([dict(song) for song in songs])
+
+        for song in repository.all():
+            self.assertIsNone(song._derived_lyrics, song)
+            self.assertEqual(song['lyrics'], lyrics_from_content(song['content']))
+
+    def test_attribute_reads_cache_until_content_changes(self):
+        song = Song.from_dict(catalog_song(1))
+        lyrics = song.lyrics
+        self.assertIs(song._derived_lyrics, lyrics)
+        self.assertIs(song.lyrics, lyrics)
+        self.assertIs(song['lyrics'], lyrics)
+
+        song['content'] = "Am\nNew words"
+        self.assertIsNone(song._derived_lyrics)
+        # Lyrics don't follow the content
+        self.assertEqual(song['lyrics'], lyrics)
+
+        song['lyrics'] = 'New words'
+        self.assertEqual(song.lyrics, 'New words')
+        self.assertEqual(dict(song), dict(Song.from_dict(dict(song))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+scrape_jobs: jobs can be followed and cancelled from any web worker, and
+only one worker runs the refresh schedule.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, APP_DIR)
+
+from scrape_jobs import ScrapeJobManager, RUNNING, CANCELLED
+
+
+def scrape_until_cancelled(job):
+    """Stands in for a scrape: reports progress until the job is cancelled"""
+    while not job.is_cancelled():
+        job.record_fetch(True)
+        time.sleep(0.01)
+    return {'success': True, 'message': 'Stopped'}
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('Timed out')
+        time.sleep(0.01)
+
+
+class ScrapeJobManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='songs-test-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def manager(self) -> ScrapeJobManager:
+        """A job manager as each web worker process has one"""
+        return ScrapeJobManager(directory=os.path.join(self.directory, 'scrape_jobs'))
+
+    @mock.patch.object(ScrapeJobManager, '_scrape', staticmethod(scrape_until_cancelled))
+    def test_job_is_followed_and_cancelled_from_another_worker(self):
+        running_worker, other_worker = self.manager(), self.manager()
+        job = running_worker.submit('https://songsofpraise.in/', 10)
+        wait_for(lambda: job.status == RUNNING)
+
+        status = other_worker.get(job.id)
+        self.assertEqual(status.status, RUNNING)
+        self.assertEqual(status.url, 'https://songsofpraise.in/')
+
+        other_worker.cancel(job.id)
+        wait_for(lambda: job.finished)
+        self.assertEqual(job.status, CANCELLED)
+        self.assertEqual(other_worker.get(job.id).to_dict(), job.to_dict())
+
+    def test_unknown_jobs_are_not_found(self):
+        manager = self.manager()
+        self.assertIsNone(manager.get('0' * 32))
+        self.assertIsNone(manager.get('../../songs'))
+        self.assertIsNone(manager.cancel('0' * 32))
+
+    def test_one_worker_runs_the_refresh_schedule(self):
+        lock_path = os.path.join(self.directory, 'refresh_scheduler.lock')
+        workers = [self.manager() for _ in range(3)]
+        submitted = []
+        for worker in workers:
+            job = mock.Mock(finished=True)
+            worker.submit = mock.Mock(side_effect=lambda *args, worker=worker, job=job, **kwargs:
+                                      submitted.append(worker) or job)
+            worker.schedule_refresh(0.01, lock_path=lock_path)
+
+        wait_for(lambda: len(submitted) >= 10)
+        self.assertEqual(len(set(submitted)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
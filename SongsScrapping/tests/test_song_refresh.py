@@ -0,0 +1,151 @@
+"""
+song_refresh: content hashes agree between the two scrapers, and checking
+pages keeps fetch metadata in the fetch log rather than in the catalog.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import unittest
+from unittest import mock
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.join(APP_DIR, 'benchmarks'))
+
+from fixtures import load_fixtures
+import parse_pool
+import scraper
+import simplified_scraper
+import song_refresh
+from fetch_log import FetchLog
+from http_cache import HttpCache
+from models import content_hash
+from song_store import SongStore
+from song_repository import SongRepository
+
+# Inline markup that BeautifulSoup's get_text('\n') breaks into lines and
+# trafilatura doesn't
+INLINE_MARKUP = '<p>Am      Dm<br/>\n<strong>Aadar</strong> aur   <em>mahima</em><br/>\n</p><p>'
+
+
+def song_page() -> dict:
+    page = next(page for page in load_fixtures() if page['kind'] == 'song')
+    return dict(page, html=page['html'].replace('<p>', INLINE_MARKUP, 1))
+
+
+class Response:
+    def __init__(self, status_code: int, text: str = ''):
+        self.status_code = status_code
+        self.content = text.encode('utf-8')
+        self.headers = {'Content-Type': 'text/html'}
+
+
+class ContentHashTest(unittest.TestCase):
+    def test_both_scrapers_hash_an_unchanged_page_alike(self):
+        page = song_page()
+        with mock.patch.object(scraper, 'make_request', return_value=page['html']):
+            scraped = scraper.parse_song_page(page['url'], 1)
+        extracted = simplified_scraper.song_from_download(page['url'], 1, page['html'])
+
+        self.assertNotEqual(scraped['content'], extracted['content'])
+        self.assertEqual(scraped['content_hash'], extracted['content_hash'])
+        self.assertNotEqual(content_hash(dict(scraped, title='Renamed')), scraped['content_hash'])
+
+
+class FetchLogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='songs-test-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'song_fetches.jsonl')
+
+    def test_last_record_wins_and_compaction_keeps_it(self):
+        log = FetchLog(self.path)
+        log.update({1: {'checked_at': 1}, 2: {'checked_at': 1}})
+        log.load()
+        # A record cut short by a crash doesn't swallow the next one
+        with open(self.path, 'ab') as f:
+            f.write(b'{"id": 3, "fe')
+        with mock.patch('fetch_log.COMPACTION_MIN_GARBAGE', 3):
+            for checked_at in range(2, 6):
+                log.update({1: {'checked_at': checked_at}})
+
+        self.assertEqual(FetchLog(self.path).load(), {1: {'checked_at': 5}, 2: {'checked_at': 1}})
+        with open(self.path, 'rb') as f:
+            self.assertLess(len(f.readlines()), 5)
+
+
+class RefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='songs-test-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        logging.disable(logging.ERROR)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+        self.repository = SongRepository(SongStore(self.path('songs.jsonl'), self.path('songs.json')),
+                                         categories_path=self.path('categories.json'),
+                                         search_index_path=self.path('search_index.json'),
+                                         history_index_path=self.path('history_index.json'),
+                                         duplicate_index_path=self.path('duplicate_index.json'))
+        self.addCleanup(self.repository.flush_indexes)
+        self.fetch_log = FetchLog(self.path('song_fetches.jsonl'))
+        self.responses = {}
+        for target, value in [('repository', self.repository), ('fetch_log', self.fetch_log),
+                              ('http_cache', HttpCache(self.path('http_cache')))]:
+            patcher = mock.patch.object(song_refresh, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for patcher in [mock.patch.object(parse_pool, 'PARSE_WORKERS', 1),
+                        mock.patch.object(song_refresh.fetcher, 'get',
+                                          side_effect=lambda url, **kwargs: self.responses[url])]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # Saved by scraper.py, then re-extracted by the refresh with trafilatura
+        self.page = song_page()
+        with mock.patch.object(scraper, 'make_request', return_value=self.page['html']):
+            self.song = scraper.parse_song_page(self.page['url'], 1)
+        self.song['timestamp'] = 1700000000
+        self.repository.add_songs([self.song])
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def test_checked_songs_are_logged_without_rewriting_them(self):
+        size = os.path.getsize(self.path('songs.jsonl'))
+        version = self.repository.version()
+
+        for response in [Response(200, self.page['html']), Response(304)]:
+            self.responses[self.page['url']] = response
+            result = song_refresh.refresh_songs(10, min_age=0)
+            self.assertEqual((result['checked_count'], result['unchanged_count']), (1, 1), result)
+
+        self.assertEqual(os.path.getsize(self.path('songs.jsonl')), size)
+        self.assertEqual(self.repository.version(), version)
+        fetch = self.fetch_log.load()[1]
+        self.assertEqual(fetch['status'], 304)
+        self.assertTrue(fetch['page_hash'])
+        # Checked just now: not due again
+        self.assertEqual(song_refresh.refresh_songs(10)['checked_count'], 0)
+
+    def test_changed_song_is_rewritten_and_its_fetch_logged(self):
+        html = self.page['html'].replace('Aadar</strong> aur', 'Aadar</strong> aur sab')
+        self.responses[self.page['url']] = Response(200, html)
+
+        result = song_refresh.refresh_songs(10, min_age=0)
+
+        self.assertEqual(result['changed_count'], 1, result)
+        song = self.repository.get(1)
+        self.assertIn('aur sab', song['content'])
+        self.assertNotIn('fetch', song)
+        self.assertEqual(song['timestamp'], 1700000000)
+        fetch = self.fetch_log.load()[1]
+        self.assertEqual(fetch['changed_at'], fetch['checked_at'])
+
+
+if __name__ == '__main__':
+    unittest.main()
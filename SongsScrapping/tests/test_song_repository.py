@@ -0,0 +1,128 @@
+"""
+song_repository.SongRepository: writes stay consistent with the song log when
+other processes write to it too, and when a write fails, and the tables
+updated song by song match those of a full load.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, APP_DIR)
+
+from song_store import SongStore
+from song_repository import SongRepository
+
+
+def make_song(song_id: int, **fields) -> dict:
+    song = {'id': song_id, 'url': f"https://songsofpraise.in/song-{song_id}/", 'title': f"Song {song_id}",
+            'content': f"Words of song {song_id}", 'categories': ['Hindi'], 'timestamp': 1700000000 + song_id}
+    song.update(fields)
+    return song
+
+
+def tables(repository: SongRepository) -> dict:
+    """Everything a repository serves, by song id"""
+    def ids(songs):
+        return [song['id'] for song in songs]
+
+    songs = repository.all()
+    categories = {category for song in songs for category in song['categories']}
+    return {
+        'all': ids(songs),
+        'page': ids(repository.page()),
+        'recent': ids(repository.recent()),
+        'categories': {category.lower(): ids(repository.by_category(category)) for category in categories},
+        'urls': {url: repository.get_by_url(url)['id']
+                 for song in songs for url in [song['url']] + song.get('aliases', [])},
+        'neighbors': {song['id']: [other and other['id'] for other in repository.neighbors(song['id'])]
+                      for song in songs},
+        'related': {song['id']: ids(repository.related(song['id'])) for song in songs},
+        'search': ids(repository.search('words')),
+        'songs': [dict(song) for song in songs],
+    }
+
+
+class SongRepositoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='songs-test-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def repository(self) -> SongRepository:
+        """A repository over the shared song log, as one worker process holds it"""
+        repository = SongRepository(SongStore(self.path('songs.jsonl'), self.path('songs.json')),
+                                    categories_path=self.path('categories.json'),
+                                    search_index_path=self.path('search_index.json'),
+                                    history_index_path=self.path('history_index.json'),
+                                    duplicate_index_path=self.path('duplicate_index.json'))
+        self.addCleanup(repository.flush_indexes)
+        return repository
+
+    def test_songs_another_process_appends_just_before_a_write_are_loaded(self):
+        repository = self.repository()
+        repository.add_songs([make_song(1)])
+
+        other = SongStore(self.path('songs.jsonl'), self.path('songs.json'))
+        append = repository._store.append
+
+        def append_after_another_process(*args):
+            # Lands after this repository's last read, right before its write
+            other.append([make_song(2)])
+            return append(*args)
+
+        with mock.patch.object(repository._store, 'append', side_effect=append_after_another_process):
+            repository.update_song(1, {'title': 'Renamed'})
+
+        self.assertEqual([song['id'] for song in repository.all()], [1, 2])
+        self.assertEqual(repository.get(1)['title'], 'Renamed')
+        self.assertEqual(self.repository().get(1)['title'], 'Renamed')
+
+    def test_failed_write_leaves_stored_songs_unchanged(self):
+        repository = self.repository()
+        repository.add_songs([make_song(1), make_song(2)])
+
+        with mock.patch.object(SongStore, 'append', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                repository.update_song(1, {'title': 'Renamed'})
+            with self.assertRaises(OSError):
+                repository.update_songs({2: {'title': 'Renamed'}})
+
+        self.assertEqual(repository.get(1)['title'], 'Song 1')
+        self.assertEqual(repository.get(2)['title'], 'Song 2')
+        self.assertEqual(repository.search('renamed'), [])
+
+    def test_changes_applied_song_by_song_match_a_full_load(self):
+        writer, reader = self.repository(), self.repository()
+        # Equal timestamps and categories in mixed case, to check the order of ties
+        writer.add_songs([make_song(song_id, timestamp=1700000000 + song_id // 3,
+                                    categories=['Hindi', 'Worship'] if song_id % 2 else ['hindi', 'English'])
+                          for song_id in range(1, 21)])
+        reader.all()
+
+        with mock.patch.object(reader._store, 'load', wraps=reader._store.load) as load:
+            for change in [
+                lambda: writer.update_song(4, {'categories': ['Christmas', 'Hindi'], 'timestamp': 1700000001}),
+                lambda: writer.update_songs({2: {'title': 'Renamed'}, 9: {'categories': []}, 12: {'url': 'x'}}),
+                lambda: writer.merge_songs(5, [7, 11]),
+                lambda: writer.add_songs([make_song(7, categories=['Worship']), make_song(30)]),
+                lambda: writer.save([song for song in writer.all() if song['id'] != 3] + [make_song(31)]),
+                lambda: writer.update_song(5, {'content': 'New words', 'timestamp': 1700000100}),
+            ]:
+                change()
+                self.assertEqual(tables(writer), tables(self.repository()))
+                self.assertEqual(tables(reader), tables(self.repository()))
+        # The reader only read what was appended, never the whole log again
+        load.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
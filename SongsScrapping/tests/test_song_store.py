@@ -0,0 +1,186 @@
+"""
+song_store.SongStore: crash recovery, corrupt records, compaction racing
+appends from other processes, and migration of the legacy songs.json.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+import multiprocessing
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, APP_DIR)
+
+from song_store import SongStore
+
+
+def make_song(song_id: int) -> dict:
+    return {'id': song_id, 'url': f"https://songsofpraise.in/song-{song_id}/", 'title': f"Song {song_id}",
+            'content': f"Words of song {song_id}", 'categories': ['Hindi'], 'timestamp': 1700000000 + song_id}
+
+
+def append_songs(path: str, legacy_path: str, first_id: int, count: int) -> None:
+    """Append songs one at a time, as another worker process would"""
+    store = SongStore(path, legacy_path)
+    for song_id in range(first_id, first_id + count):
+        store.append([make_song(song_id)])
+
+
+class SongStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='songs-test-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'songs.jsonl')
+        self.legacy_path = os.path.join(self.directory, 'songs.json')
+
+    def store(self) -> SongStore:
+        return SongStore(self.path, self.legacy_path)
+
+    def write_raw(self, data: bytes) -> None:
+        with open(self.path, 'ab') as f:
+            f.write(data)
+
+    def ids(self, store: SongStore = None) -> list:
+        return [song['id'] for song in (store or self.store()).load()]
+
+    # Crash recovery
+
+    def test_torn_tail_is_dropped_and_appends_continue(self):
+        store = self.store()
+        store.append([make_song(1), make_song(2)])
+        complete_size = os.path.getsize(self.path)
+        self.write_raw(b'{"op": "put", "song": {"id": 3, "ti')
+
+        self.assertEqual(self.ids(store), [1, 2])
+        self.assertEqual(os.path.getsize(self.path), complete_size)
+
+        store.append([make_song(3)])
+        self.assertEqual(self.ids(), [1, 2, 3])
+
+    def test_append_repairs_a_torn_tail_before_writing(self):
+        store = self.store()
+        store.append([make_song(1)])
+        self.write_raw(b'{"op": "put", "so')
+
+        store.append([make_song(2)])
+        self.assertEqual(self.ids(), [1, 2])
+
+    def test_corrupt_line_in_the_middle_is_skipped_not_truncated(self):
+        store = self.store()
+        store.append([make_song(1), make_song(2)])
+        self.write_raw(b'{"op": "put", "song": {"id": 9\n')
+        store.append([make_song(3), make_song(4)])
+        size = os.path.getsize(self.path)
+
+        self.assertEqual(self.ids(), [1, 2, 3, 4])
+        self.assertEqual(os.path.getsize(self.path), size)
+
+    def test_unfinished_append_of_another_process_is_not_truncated(self):
+        writer = self.store()
+        writer.append([make_song(1)])
+        line = json.dumps({'op': 'put', 'song': make_song(2)}).encode('utf-8') + b'\n'
+
+        loaded = []
+        with writer._exclusive():
+            # Half of a record is on disk while the writer holds the lock
+            self.write_raw(line[:10])
+            reader = threading.Thread(target=lambda: loaded.append(self.ids()))
+            reader.start()
+            reader.join(0.2)
+            self.write_raw(line[10:])
+        reader.join()
+
+        self.assertEqual(loaded, [[1]])
+        self.assertEqual(self.ids(), [1, 2])
+
+    # Reading appends
+
+    def test_read_new_returns_only_records_appended_since(self):
+        reader = self.store()
+        self.store().append([make_song(1)])
+        self.assertEqual(self.ids(reader), [1])
+
+        writer = self.store()
+        writer.append([make_song(2)], [1])
+        self.write_raw(b'{"op": "put", "so')
+        self.assertEqual(reader.read_new(), [{'op': 'put', 'song': make_song(2)}, {'op': 'delete', 'id': 1}])
+        self.assertEqual(reader.read_new(), [])
+        self.assertEqual(reader.offset, os.path.getsize(self.path))
+
+        # A compacted log is a new file: it has to be loaded again
+        songs = writer.load()
+        writer.swap_snapshot(writer.write_snapshot(songs), writer.offset, len(songs), writer.inode)
+        self.assertIsNone(reader.read_new())
+
+    # Compaction
+
+    def test_swap_keeps_records_appended_after_the_snapshot(self):
+        compactor = self.store()
+        compactor.append([make_song(1), make_song(2)])
+        compactor.append([make_song(1)])
+        songs = compactor.load()
+
+        tmp_path = compactor.write_snapshot(songs)
+        self.store().append([make_song(3)])
+        appended = compactor.swap_snapshot(tmp_path, compactor.offset, len(songs), compactor.inode)
+
+        self.assertEqual(appended, 1)
+        self.assertEqual(self.ids(), [1, 2, 3])
+        self.assertEqual(compactor.record_count, 3)
+        self.assertFalse(os.path.exists(tmp_path))
+
+    def test_swap_is_abandoned_after_another_compaction(self):
+        first, second = self.store(), self.store()
+        first.append([make_song(1), make_song(2)])
+        songs = first.load()
+        second.load()
+
+        tmp_path = first.write_snapshot(songs)
+        second_tmp_path = second.write_snapshot(songs)
+        self.assertEqual(second.swap_snapshot(second_tmp_path, second.offset, len(songs), second.inode), 0)
+        second.append([make_song(3)])
+
+        self.assertIsNone(first.swap_snapshot(tmp_path, first.offset, len(songs), first.inode))
+        self.assertFalse(os.path.exists(tmp_path))
+        self.assertEqual(self.ids(), [1, 2, 3])
+
+    def test_compaction_loses_no_appends_from_another_process(self):
+        store = self.store()
+        store.append([make_song(song_id) for song_id in range(1, 51)])
+
+        writer = multiprocessing.get_context('fork').Process(
+            target=append_songs, args=(self.path, self.legacy_path, 1000, 200))
+        writer.start()
+        while writer.is_alive():
+            songs = store.load()
+            store.swap_snapshot(store.write_snapshot(songs), store.offset, len(songs), store.inode)
+        writer.join()
+
+        self.assertEqual(writer.exitcode, 0)
+        self.assertEqual(sorted(self.ids()), list(range(1, 51)) + list(range(1000, 1200)))
+
+    # Migration
+
+    def test_legacy_songs_are_migrated_once(self):
+        with open(self.legacy_path, 'w', encoding='utf-8') as f:
+            json.dump([make_song(1), make_song(2)], f)
+
+        store = self.store()
+        self.assertEqual(self.ids(store), [1, 2])
+        self.assertTrue(os.path.exists(self.legacy_path))
+        self.assertEqual(sorted(os.listdir(self.directory)), ['songs.json', 'songs.jsonl', 'songs.jsonl.lock'])
+
+        # The log exists now: later loads replay it rather than the legacy file
+        store.append([make_song(3)])
+        self.assertFalse(self.store().migrate_legacy())
+        self.assertEqual(self.ids(), [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()